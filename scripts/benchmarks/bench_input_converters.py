@@ -0,0 +1,137 @@
+"""Compare per-request input mapping against converters compiled once at wrap time.
+
+The per-request baseline is a copy of `map_inputs` as it was before the converters were compiled,
+it reflects on the function for every request. It only converted top-level dataclasses and models,
+so it does less work than the compiled converters on nested containers such as `list[Element]`
+and the two are only like for like on the top-level case.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/bench_input_converters.py [--items N] [--rounds N]
+"""
+
+import argparse
+import inspect
+import timeit
+from dataclasses import dataclass, is_dataclass
+from enum import EnumMeta
+from types import GenericAlias
+from typing import Any, Callable
+
+from dataclasses_json import DataClassJsonMixin
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.converters import compile_input_converters
+from unstructured_platform_plugins.type_hints import get_type_hints
+
+
+@dataclass
+class Element:
+    element_id: str
+    text: str
+    score: float
+
+
+class Settings(BaseModel):
+    strategy: str
+    options: dict[str, Any]
+
+
+def plugin(elements: list[Element], lookup: dict[str, Settings], settings: Settings) -> None:
+    pass
+
+
+def reflect_per_request(func: Callable, raw_inputs: dict[str, Any]) -> dict[str, Any]:
+    # The original `map_inputs`, copied as is, with the repo's own type hint resolution
+    raw_inputs = raw_inputs.copy()
+    type_info = get_type_hints(func)
+    type_info.pop("return", None)
+    for field_name, type_data in type_info.items():
+        if field_name not in raw_inputs:
+            continue
+        field_value = raw_inputs[field_name]
+        try:
+            if (
+                hasattr(type_data, "__origin__")
+                and type_data.__origin__ is dict
+                and isinstance(raw_inputs[field_name], dict)
+            ):
+                continue
+            elif (
+                inspect.isclass(type_data)
+                and issubclass(type_data, DataClassJsonMixin)
+                and isinstance(field_value, dict)
+            ):
+                raw_inputs[field_name] = type_data.from_dict(raw_inputs[field_name])
+            elif is_dataclass(type_data) and isinstance(field_value, dict):
+                raw_inputs[field_name] = type_data(**raw_inputs[field_name])
+            elif isinstance(type_data, EnumMeta):
+                raw_inputs[field_name] = raw_inputs[field_name]
+            elif (
+                inspect.isclass(type_data)
+                and not isinstance(type_data, GenericAlias)
+                and issubclass(type_data, BaseModel)
+            ):
+                field_value = raw_inputs[field_name]
+                if isinstance(field_value, BaseModel):
+                    field_value = field_value.model_dump()
+                raw_inputs[field_name] = type_data.model_validate(field_value)
+        except Exception as e:
+            raise ValueError(f"failed to map input for field {field_name}: {field_value}") from e
+    return raw_inputs
+
+
+def build_inputs(items: int) -> dict[str, Any]:
+    return {
+        "elements": [
+            {"element_id": str(i), "text": "x" * 64, "score": i / 3} for i in range(items)
+        ],
+        "lookup": {str(i): {"strategy": "fast", "options": {"i": i}} for i in range(items)},
+        "settings": {"strategy": "hi_res", "options": {}},
+    }
+
+
+def flat_plugin(element: Element, settings: Settings, name: str) -> None:
+    pass
+
+
+def build_flat_inputs() -> dict[str, Any]:
+    return {
+        "element": {"element_id": "0", "text": "x" * 64, "score": 0.5},
+        "settings": {"strategy": "hi_res", "options": {}},
+        "name": "doc",
+    }
+
+
+def report(title: str, func: Callable, inputs: dict[str, Any], rounds: int) -> None:
+    converters = compile_input_converters(func)
+    per_request = timeit.timeit(
+        lambda: reflect_per_request(func=func, raw_inputs=inputs), number=rounds
+    )
+    compiled = timeit.timeit(lambda: converters.convert(inputs.copy()), number=rounds)
+    reflection_only = timeit.timeit(lambda: compile_input_converters(func), number=rounds)
+
+    print(title)
+    print(f"  reflect per request (original): {per_request / rounds * 1e6:10.1f} us/request")
+    print(f"  precompiled converters:         {compiled / rounds * 1e6:10.1f} us/request")
+    print(f"  reflection alone:               {reflection_only / rounds * 1e6:10.1f} us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Both paths do the same conversions here, the difference is the reflection
+    report("top-level dataclass and model", flat_plugin, build_flat_inputs(), args.rounds)
+    # The original left the nested elements as dicts, the compiled converters convert them
+    report(
+        f"nested containers, {args.items} items each",
+        plugin,
+        build_inputs(args.items),
+        args.rounds,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Compare the default schema decode path against the native single-pass decoder.
+
+Reports latency and peak allocations for decoding a large `FileData` and `BatchFileData` body.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmarks/bench_request_decoding.py [--entries N] [--rounds N]
+"""
+
+import argparse
+import json
+import timeit
+import tracemalloc
+from typing import Any, Callable, Union
+
+from unstructured_ingest.data_types.file_data import (
+    BatchFileData,
+    BatchItem,
+    FileData,
+    FileDataSourceMetadata,
+    SourceIdentifiers,
+    file_data_from_dict,
+)
+
+from unstructured_platform_plugins.etl_uvicorn.converters import compile_input_converters
+from unstructured_platform_plugins.etl_uvicorn.decoding import NativeDecoder
+from unstructured_platform_plugins.etl_uvicorn.invocation import INJECTABLES
+from unstructured_platform_plugins.etl_uvicorn.utils import get_input_schema
+from unstructured_platform_plugins.schema.json_schema import schema_to_base_model
+
+
+def plugin(file_data: Union[FileData, BatchFileData], settings: dict[str, Any]) -> None:
+    pass
+
+
+def build_bodies(entries: int) -> dict[str, bytes]:
+    metadata = FileDataSourceMetadata(
+        url="s3://bucket/key",
+        version="v1",
+        record_locator={
+            f"key_{i}": {"path": f"/a/b/{i}", "values": list(range(8))} for i in range(entries)
+        },
+    )
+    file_data = FileData(
+        identifier="large",
+        connector_type="s3",
+        source_identifiers=SourceIdentifiers(filename="f.pdf", fullpath="a/f.pdf"),
+        metadata=metadata,
+        additional_metadata={f"extra_{i}": "x" * 32 for i in range(entries)},
+    )
+    batch_file_data = BatchFileData(
+        identifier="large-batch",
+        connector_type="s3",
+        metadata=metadata,
+        batch_items=[BatchItem(identifier=str(i), version="1") for i in range(entries)],
+    )
+    settings = {"strategy": "hi_res"}
+    return {
+        "FileData": json.dumps(
+            {"file_data": file_data.model_dump(), "settings": settings}
+        ).encode(),
+        "BatchFileData": json.dumps(
+            {"file_data": batch_file_data.model_dump(), "settings": settings}
+        ).encode(),
+    }
+
+
+def build_schema_decoder() -> Callable[[bytes], dict]:
+    input_schema_model = schema_to_base_model(get_input_schema(plugin, omit=list(INJECTABLES)))
+    converters = compile_input_converters(plugin)
+
+    # The same steps the default `/invoke` route takes, minus the http plumbing
+    def decode(body: bytes) -> dict:
+        request = input_schema_model.model_validate_json(body)
+        request_dict = {f: getattr(request, f) for f in type(request).model_fields}
+        file_data = request_dict.get("file_data")
+        if file_data is not None:
+            request_dict["file_data"] = file_data_from_dict(file_data.model_dump())
+        return converters.convert(request_dict)
+
+    return decode
+
+
+def peak_allocations(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    decoders = {
+        "schema": build_schema_decoder(),
+        "native": NativeDecoder(plugin, omit=list(INJECTABLES)).decode,
+    }
+    for payload, body in build_bodies(args.entries).items():
+        print(f"{payload}: {len(body) / 1024:.0f} KiB body, {args.rounds} rounds")
+        results = {}
+        for name, decode in decoders.items():
+            latency = timeit.timeit(lambda: decode(body), number=args.rounds) / args.rounds
+            peak = peak_allocations(lambda: decode(body))
+            results[name] = (latency, peak)
+            print(f"  {name:<7} {latency * 1e3:8.2f} ms/request {peak / 1024:10.0f} KiB peak")
+        (schema_latency, schema_peak), (native_latency, native_peak) = results.values()
+        print(
+            f"  saved   {(1 - native_latency / schema_latency) * 100:7.1f}% latency "
+            f"{(1 - native_peak / schema_peak) * 100:9.1f}% peak allocations"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Optional, Union
 
 import pytest
 from fastapi.testclient import TestClient
 from pydantic import BaseModel
+from typing_extensions import TypedDict
 from unstructured_ingest.data_types.file_data import (
     BatchFileData,
     BatchItem,
@@ -14,8 +21,16 @@ from unstructured_ingest.data_types.file_data import (
 from unstructured_platform_plugins.etl_uvicorn.api_generator import (
     EtlApiException,
     UsageData,
+    generate_fast_api,
     wrap_in_fastapi,
 )
+from unstructured_platform_plugins.etl_uvicorn.batching import MicroBatchConfig
+from unstructured_platform_plugins.etl_uvicorn.concurrency import (
+    AdaptiveLimitConfig,
+    AdmissionConfig,
+)
+from unstructured_platform_plugins.etl_uvicorn.executors import ExecutorConfig
+from unstructured_platform_plugins.etl_uvicorn.process_pool import ProcessPoolConfig
 from unstructured_platform_plugins.schema.filedata_meta import FileDataMeta
 
 
@@ -581,3 +596,516 @@ def test_no_param_plugin_still_accepts_a_bodyless_post():
 
     assert resp.status_code == 200
     assert InvokeResponse.model_validate(resp.json()).output["received"] == "ok"
+
+
+# --- native decode mode -----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "file_data", mock_file_data, ids=[type(fd).__name__ for fd in mock_file_data]
+)
+def test_native_decode_file_data(file_data):
+    from test.assets.dataclass_response import sample_function_with_path as test_fn
+
+    client = TestClient(
+        wrap_in_fastapi(func=test_fn, plugin_id="mock_plugin", decode_mode="native")
+    )
+    current_path = Path(__file__)
+
+    post_body = {"file_data": file_data.model_dump(), "c": 1, "b": "2", "a": str(current_path)}
+    resp = client.post("/invoke", json=post_body)
+    invoke_response = InvokeResponse.model_validate(resp.json())
+    invoke_response.generic_validation()
+    assert invoke_response.output["t"] == "PosixPath"
+    assert invoke_response.output["p"] is not isinstance(file_data, BatchFileData)
+    assert type(invoke_response.file_data) is type(file_data)
+
+
+def test_native_decode_passes_declared_types():
+    from test.assets.filedata_meta import Input
+
+    seen = {}
+
+    def _record(file_data: FileData, i: Input) -> None:
+        seen["file_data"] = file_data
+        seen["i"] = i
+
+    client = TestClient(
+        wrap_in_fastapi(func=_record, plugin_id="mock_plugin", decode_mode="native")
+    )
+
+    resp = client.post("/invoke", json={"file_data": mock_file_data[1].model_dump(), "i": {"m": 3}})
+    InvokeResponse.model_validate(resp.json()).generic_validation()
+    # A plain `FileData` annotation still receives the batch variant, as with the schema path
+    assert isinstance(seen["file_data"], BatchFileData)
+    assert seen["i"] == Input(m=3)
+
+
+def test_native_decode_rejects_invalid_body():
+    client = TestClient(
+        wrap_in_fastapi(func=_has_required, plugin_id="mock_plugin", decode_mode="native")
+    )
+
+    assert client.post("/invoke").status_code == 422
+    assert client.post("/invoke", json={}).status_code == 422
+    assert client.post("/invoke", content=b"{not json").status_code == 422
+    assert client.post("/invoke", json={"element_dicts": "x"}).status_code == 200
+
+
+@pytest.mark.parametrize("body", [None, {}])
+def test_native_decode_optional_body(body):
+    client = TestClient(
+        wrap_in_fastapi(func=_optional_file_data, plugin_id="mock_plugin", decode_mode="native")
+    )
+
+    kwargs = {} if body is None else {"json": body}
+    resp = client.post("/invoke", **kwargs)
+
+    assert resp.status_code == 200
+    assert InvokeResponse.model_validate(resp.json()).output == {"identifier": None}
+
+
+def test_native_decode_documents_the_request_body():
+    def _record(file_data: FileData, b: int = 1) -> None:
+        pass
+
+    app = wrap_in_fastapi(func=_record, plugin_id="mock_plugin", decode_mode="native")
+    openapi = app.openapi()
+    request_body = openapi["paths"]["/invoke"]["post"]["requestBody"]
+    assert request_body["required"] is True
+    name = request_body["content"]["application/json"]["schema"]["$ref"].split("/")[-1]
+    schema = openapi["components"]["schemas"][name]
+    assert set(schema["properties"]) == {"file_data", "b"}
+    assert schema["required"] == ["file_data"]
+    assert "FileData" in openapi["components"]["schemas"]
+    batch_body = openapi["paths"]["/invoke/batch"]["post"]["requestBody"]
+    assert batch_body["content"]["application/json"]["schema"]["items"]["$ref"].endswith(name)
+
+
+# --- response encoding ------------------------------------------------------------------------
+
+
+class _Element(BaseModel):
+    text: str
+    score: float = 0.0
+
+
+def _many_elements(n: int) -> list[_Element]:
+    return [_Element(text=str(i), score=i / 2) for i in range(n)]
+
+
+def test_trusted_and_validated_encoding_match():
+    trusted = TestClient(
+        wrap_in_fastapi(func=_many_elements, plugin_id="mock_plugin", encode_mode="trusted")
+    )
+    validated = TestClient(wrap_in_fastapi(func=_many_elements, plugin_id="mock_plugin"))
+
+    trusted_resp = trusted.post("/invoke", json={"n": 100})
+    validated_resp = validated.post("/invoke", json={"n": 100})
+
+    assert trusted_resp.headers["content-type"] == "application/json"
+    assert trusted_resp.json() == validated_resp.json()
+    assert len(trusted_resp.json()["output"]) == 100
+
+
+class _Defaulted(BaseModel):
+    a: int
+    b: str = "x"
+
+
+def _mistyped_output(a: str) -> _Defaulted:
+    return {"a": a}
+
+
+def test_output_is_validated_by_default():
+    client = TestClient(wrap_in_fastapi(func=_mistyped_output, plugin_id="mock_plugin"))
+
+    # Values are coerced to the declared types and defaults filled in
+    assert client.post("/invoke", json={"a": "1"}).json()["output"] == {"a": 1, "b": "x"}
+    resp = client.post("/invoke", json={"a": "not a number"})
+    assert resp.status_code == 200
+    invoke_response = InvokeResponse.model_validate(resp.json())
+    assert invoke_response.status_code == 500
+    assert "ValidationError" in invoke_response.status_code_text
+
+
+def test_trusted_encoding_filedata_meta():
+    from test.assets.filedata_meta import process_input as test_fn
+
+    client = TestClient(
+        wrap_in_fastapi(func=test_fn, plugin_id="mock_plugin", encode_mode="trusted")
+    )
+
+    post_body = {"file_data": mock_file_data[0].model_dump(), "i": {"m": 12}}
+    invoke_response = InvokeResponse.model_validate(client.post("/invoke", json=post_body).json())
+    invoke_response.generic_validation()
+    assert len(invoke_response.filedata_meta.new_records) == 12
+    assert invoke_response.filedata_meta.new_records[0].contents == {"n": 12.0}
+
+
+class _Unserializable:
+    pass
+
+
+class _AnyValue(TypedDict):
+    value: Any
+
+
+def _unserializable_output() -> _AnyValue:
+    return _AnyValue(value=_Unserializable())
+
+
+def test_trusted_encoding_failure_is_reported():
+    client = TestClient(
+        wrap_in_fastapi(func=_unserializable_output, plugin_id="mock_plugin", encode_mode="trusted")
+    )
+
+    resp = client.post("/invoke")
+
+    assert resp.status_code == 200
+    invoke_response = InvokeResponse.model_validate(resp.json())
+    assert invoke_response.status_code == 500
+    assert "PydanticSerializationError" in invoke_response.status_code_text
+
+
+def test_incremental_list_encoding_matches_the_full_encoding():
+    full = TestClient(
+        wrap_in_fastapi(func=_many_elements, plugin_id="mock_plugin", encode_mode="trusted")
+    )
+    incremental = TestClient(
+        wrap_in_fastapi(
+            func=_many_elements,
+            plugin_id="mock_plugin",
+            encode_mode="trusted",
+            stream_list_output=True,
+        )
+    )
+
+    full_resp = full.post("/invoke", json={"n": 5000})
+    incremental_resp = incremental.post("/invoke", json={"n": 5000})
+
+    assert incremental_resp.headers["content-type"] == "application/json"
+    assert "content-length" not in incremental_resp.headers
+    assert incremental_resp.content == full_resp.content
+
+
+def _unserializable_elements() -> list[_AnyValue]:
+    return [_AnyValue(value=_Unserializable())]
+
+
+def test_incremental_list_encoding_failure_is_reported():
+    client = TestClient(
+        wrap_in_fastapi(
+            func=_unserializable_elements,
+            plugin_id="mock_plugin",
+            encode_mode="trusted",
+            stream_list_output=True,
+        )
+    )
+
+    invoke_response = InvokeResponse.model_validate(client.post("/invoke").json())
+    assert invoke_response.status_code == 500
+    assert "PydanticSerializationError" in invoke_response.status_code_text
+
+
+def test_incremental_list_encoding_needs_a_list_output():
+    with pytest.raises(EtlApiException):
+        wrap_in_fastapi(
+            func=_unserializable_output,
+            plugin_id="mock_plugin",
+            encode_mode="trusted",
+            stream_list_output=True,
+        )
+
+
+def test_incremental_list_encoding_needs_trusted_encoding():
+    with pytest.raises(EtlApiException, match="trusted encode mode"):
+        wrap_in_fastapi(func=_many_elements, plugin_id="mock_plugin", stream_list_output=True)
+
+
+# --- dedicated executor -----------------------------------------------------------------------
+
+
+class _ThreadName(BaseModel):
+    name: str
+
+
+def _thread_name() -> _ThreadName:
+    return _ThreadName(name=threading.current_thread().name)
+
+
+def test_sync_plugin_runs_on_its_own_executor():
+    app = wrap_in_fastapi(
+        func=_thread_name,
+        plugin_id="mock_plugin",
+        executor_config=ExecutorConfig(max_workers=3, thread_name_prefix="dedicated"),
+    )
+    with TestClient(app) as client:
+        invoke_response = InvokeResponse.model_validate(client.post("/invoke").json())
+        invoke_response.generic_validation()
+        assert invoke_response.output["name"].startswith("dedicated")
+        assert app.state.executor.stats().completed == 1
+
+
+# --- process pool execution -------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("payload_size", [10, 64 * 1024], ids=["inline", "shared_memory"])
+def test_process_pool_plugin(payload_size):
+    app = generate_fast_api(
+        app="test.assets.process_pool_plugin:process_payload",
+        process_pool_config=ProcessPoolConfig(max_workers=1, shared_memory_threshold=1024),
+    )
+    with TestClient(app) as client:
+        resp = client.post("/invoke", json={"payload": "x" * payload_size})
+        invoke_response = InvokeResponse.model_validate(resp.json())
+        invoke_response.generic_validation()
+        assert invoke_response.output["pid"] != os.getpid()
+        assert invoke_response.output["size"] == payload_size
+        assert invoke_response.usage == [UsageData(name="characters", value=payload_size)]
+        assert resp.json()["message_channels"]["infos"] == ["processed in worker"]
+        assert invoke_response.filedata_meta.terminate_current
+
+
+def test_process_pool_plugin_error():
+    app = generate_fast_api(
+        app="test.assets.process_pool_plugin:process_failure",
+        process_pool_config=ProcessPoolConfig(max_workers=1),
+    )
+    with TestClient(app) as client:
+        invoke_response = InvokeResponse.model_validate(
+            client.post("/invoke", json={"payload": "abc"}).json()
+        )
+        assert invoke_response.status_code == 500
+        assert invoke_response.status_code_text == "[ValueError] cannot process 3 characters"
+        # Usage recorded before the failure still makes it back to the response
+        assert invoke_response.usage == [UsageData(name="attempts", value=1)]
+
+
+def test_process_pool_class_is_only_instantiated_in_workers():
+    from test.assets.process_pool_plugin import ProcessPoolClass
+
+    app = generate_fast_api(
+        app="test.assets.process_pool_plugin:ProcessPoolClass",
+        method_name="process",
+        process_pool_config=ProcessPoolConfig(max_workers=1),
+    )
+    with TestClient(app) as client:
+        invoke_response = InvokeResponse.model_validate(
+            client.post("/invoke", json={"payload": "abc"}).json()
+        )
+        invoke_response.generic_validation()
+        assert invoke_response.output["pid"] != os.getpid()
+    assert ProcessPoolClass.instances == 0
+
+
+def test_process_pool_worker_death_releases_shared_memory():
+    app = generate_fast_api(
+        app="test.assets.process_pool_plugin:process_exit",
+        process_pool_config=ProcessPoolConfig(max_workers=1, shared_memory_threshold=1024),
+    )
+    before = set(os.listdir("/dev/shm"))
+    with TestClient(app) as client:
+        # The second request is queued for the worker and never loaded by it
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            responses = list(
+                pool.map(
+                    lambda _: client.post("/invoke", json={"payload": "x" * 4096}).json(),
+                    range(2),
+                )
+            )
+        for response in responses:
+            assert InvokeResponse.model_validate(response).status_code == 500
+    assert set(os.listdir("/dev/shm")) <= before
+
+
+def test_process_pool_requires_sync_plugin():
+    from test.assets.async_typed_dict_response import async_sample_function as test_fn
+
+    with pytest.raises(EtlApiException):
+        wrap_in_fastapi(
+            func=test_fn,
+            plugin_id="mock_plugin",
+            process_pool_config=ProcessPoolConfig(app="test.assets.async_typed_dict_response"),
+        )
+
+
+# --- micro-batching ---------------------------------------------------------------------------
+
+
+def test_concurrent_invocations_are_batched():
+    app = generate_fast_api(
+        app="test.assets.batch_plugin:Embedder",
+        method_name="embed",
+        batch_method="embed_batch",
+        batch_config=MicroBatchConfig(max_batch_size=4, max_wait_ms=200),
+    )
+    texts = ["a", "bb", "ccc", "dddd", "fail", "ffffff", "ggggggg", "hhhhhhhh"]
+    with TestClient(app) as client, ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        responses = list(
+            pool.map(lambda text: client.post("/invoke", json={"text": text}).json(), texts)
+        )
+    stats = app.state.batcher.stats()
+    assert stats.items == len(texts)
+    assert stats.batches < len(texts)
+    assert max(app.state.batcher.batch_func.__self__.batch_sizes) > 1
+    for text, resp in zip(texts, responses):
+        invoke_response = InvokeResponse.model_validate(resp)
+        # Every response only carries the usage of its own input
+        assert invoke_response.usage == [UsageData(name="characters", value=len(text))]
+        if text == "fail":
+            assert invoke_response.status_code == 500
+            assert invoke_response.status_code_text == "[ValueError] cannot embed fail"
+            continue
+        invoke_response.generic_validation()
+        assert invoke_response.output["vector"] == [float(len(text))]
+        assert 1 <= invoke_response.output["batch_size"] <= 4
+
+
+def test_batching_requires_non_streaming_plugin():
+    from test.assets.async_typed_dict_response import async_sample_function as test_fn
+    from test.assets.exception_status_code import (
+        async_gen_function_raises_exception_without_status_code as stream_fn,
+    )
+
+    wrap_in_fastapi(func=test_fn, plugin_id="mock_plugin", batch_func=lambda inputs: inputs)
+    with pytest.raises(EtlApiException):
+        wrap_in_fastapi(func=stream_fn, plugin_id="mock_plugin", batch_func=lambda inputs: inputs)
+
+
+# --- /invoke/batch ----------------------------------------------------------------------------
+
+
+class _Square(BaseModel):
+    value: int
+
+
+async def _square(value: int, usage: list[UsageData]) -> _Square:
+    usage.append(UsageData(name="squares", value=1))
+    if value < 0:
+        raise ValueError(f"negative value {value}")
+    # Larger values finish first so completion order differs from request order
+    await asyncio.sleep(0.01 * (5 - value))
+    return _Square(value=value * value)
+
+
+@pytest.mark.parametrize("decode_mode", ["schema", "native"])
+@pytest.mark.parametrize("encode_mode", ["trusted", "validated"])
+def test_invoke_batch(decode_mode, encode_mode):
+    client = TestClient(
+        wrap_in_fastapi(
+            func=_square, plugin_id="mock_plugin", decode_mode=decode_mode, encode_mode=encode_mode
+        )
+    )
+    resp = client.post("/invoke/batch", json=[{"value": v} for v in [1, -2, 3]])
+    assert resp.status_code == 200
+    responses = [InvokeResponse.model_validate(item) for item in resp.json()]
+    assert [r.status_code for r in responses] == [200, 500, 200]
+    assert responses[0].output == {"value": 1}
+    assert responses[1].status_code_text == "[ValueError] negative value -2"
+    assert responses[2].output == {"value": 9}
+    assert all(r.usage == [UsageData(name="squares", value=1)] for r in responses)
+
+
+def test_invoke_batch_streams_in_completion_order():
+    client = TestClient(
+        wrap_in_fastapi(func=_square, plugin_id="mock_plugin", invoke_batch_concurrency=4)
+    )
+    resp = client.post("/invoke/batch?stream=true", json=[{"value": v} for v in [1, 2, 3, 4]])
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    frames = [json.loads(line) for line in resp.iter_lines() if line]
+    assert [frame["index"] for frame in frames] == [3, 2, 1, 0]
+    for frame in frames:
+        value = frame["index"] + 1
+        assert frame["response"]["output"] == {"value": value * value}
+
+
+@pytest.mark.parametrize("decode_mode", ["schema", "native"])
+def test_invoke_batch_invalid_items_only_fail_their_own_response(decode_mode):
+    client = TestClient(
+        wrap_in_fastapi(func=_square, plugin_id="mock_plugin", decode_mode=decode_mode)
+    )
+    resp = client.post("/invoke/batch", json=[{"value": 1}, {"value": "x"}, {}])
+    assert resp.status_code == 200
+    responses = [InvokeResponse.model_validate(item) for item in resp.json()]
+    assert [r.status_code for r in responses] == [200, 422, 422]
+    assert responses[0].output == {"value": 1}
+    assert "('body', 1, 'value')" in responses[1].status_code_text
+    assert "('body', 2, 'value')" in responses[2].status_code_text
+
+    resp = client.post("/invoke/batch?stream=true", json=[{"value": 2}, {"value": "x"}])
+    frames = {frame["index"]: frame["response"] for frame in map(json.loads, resp.iter_lines())}
+    assert frames[0]["output"] == {"value": 4}
+    assert frames[1]["status_code"] == 422
+
+    # A body that isn't an array of inputs still fails the whole request
+    assert client.post("/invoke/batch", json={"value": 1}).status_code == 422
+
+
+def test_invoke_batch_documents_the_request_body():
+    openapi = wrap_in_fastapi(func=_square, plugin_id="mock_plugin").openapi()
+    batch_body = openapi["paths"]["/invoke/batch"]["post"]["requestBody"]
+    name = batch_body["content"]["application/json"]["schema"]["items"]["$ref"].split("/")[-1]
+    assert set(openapi["components"]["schemas"][name]["properties"]) == {"value"}
+
+
+def test_invoke_batch_not_added_for_streaming_plugins():
+    from test.assets.exception_status_code import (
+        async_gen_function_raises_exception_without_status_code as stream_fn,
+    )
+
+    client = TestClient(wrap_in_fastapi(func=stream_fn, plugin_id="mock_plugin"))
+    assert client.post("/invoke/batch", json=[{}]).status_code == 404
+
+
+# --- admission control ------------------------------------------------------------------------
+
+_release_admitted = threading.Event()
+
+
+def _wait_for_release() -> _ThreadName:
+    _release_admitted.wait(timeout=5)
+    return _ThreadName(name=threading.current_thread().name)
+
+
+def test_requests_over_the_admission_queue_get_429():
+    _release_admitted.clear()
+    app = wrap_in_fastapi(
+        func=_wait_for_release,
+        plugin_id="mock_plugin",
+        admission_config=AdmissionConfig(max_in_flight=1, max_queue_size=1, retry_after=2.5),
+    )
+    controller = app.state.admission_controller
+    with TestClient(app) as client, ThreadPoolExecutor(max_workers=2) as pool:
+        running = pool.submit(client.post, "/invoke")
+        queued = pool.submit(client.post, "/invoke")
+        deadline = time.monotonic() + 5
+        while controller.stats().queued < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        rejected = client.post("/invoke")
+        assert rejected.status_code == 429
+        assert rejected.headers["retry-after"] == "3"
+        # Routes that don't run the plugin are never held back
+        assert client.get("/id").status_code == 200
+
+        _release_admitted.set()
+        for future in [running, queued]:
+            InvokeResponse.model_validate(future.result().json()).generic_validation()
+    stats = controller.stats()
+    assert (stats.in_flight, stats.admitted, stats.rejected) == (0, 2, 1)
+
+
+def test_adaptive_limit_only_samples_successful_invocations():
+    app = wrap_in_fastapi(
+        func=_square,
+        plugin_id="mock_plugin",
+        admission_config=AdmissionConfig(max_in_flight=4, adaptive=AdaptiveLimitConfig()),
+    )
+    client = TestClient(app)
+    adaptive = app.state.admission_controller.adaptive
+    # A failing invocation returns right away, it says nothing about how long the plugin takes
+    assert client.post("/invoke", json={"value": -1}).json()["status_code"] == 500
+    assert adaptive.baseline is None
+    assert client.post("/invoke", json={"value": 4}).json()["status_code"] == 200
+    assert adaptive.baseline >= 0.01
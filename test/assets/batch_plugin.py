@@ -0,0 +1,29 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.schema import UsageData
+
+
+class Embedding(BaseModel):
+    vector: list[float]
+    batch_size: int
+
+
+class Embedder:
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+
+    def embed(self, text: str, usage: list[UsageData]) -> Embedding:
+        return self.embed_batch([{"text": text, "usage": usage}])[0]
+
+    def embed_batch(self, inputs: list[dict[str, Any]]) -> list[Embedding]:
+        self.batch_sizes.append(len(inputs))
+        outputs = []
+        for item in inputs:
+            item["usage"].append(UsageData(name="characters", value=len(item["text"])))
+            if item["text"] == "fail":
+                outputs.append(ValueError("cannot embed fail"))
+            else:
+                outputs.append(Embedding(vector=[float(len(item["text"]))], batch_size=len(inputs)))
+        return outputs
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from pydantic import BaseModel
+
+
+class ParseOutput(BaseModel):
+    instance_id: int
+
+
+class NotThreadSafeParser:
+    thread_safe = False
+    instance_pool_size = 2
+    instances = []
+
+    def __init__(self):
+        self.busy = False
+        self.instances.append(self)
+
+    def _enter(self):
+        if self.busy:
+            raise RuntimeError("instance used concurrently")
+        self.busy = True
+
+    def precheck(self) -> None:
+        self._enter()
+        self.busy = False
+
+    def parse(self, text: str) -> ParseOutput:
+        self._enter()
+        time.sleep(0.02)
+        self.busy = False
+        return ParseOutput(instance_id=id(self))
+
+    async def aparse(self, text: str) -> ParseOutput:
+        self._enter()
+        await asyncio.sleep(0.02)
+        self.busy = False
+        return ParseOutput(instance_id=id(self))
+
+    def iter_parse(self, text: str):
+        self._enter()
+        for _ in range(2):
+            time.sleep(0.01)
+            yield ParseOutput(instance_id=id(self))
+        self.busy = False
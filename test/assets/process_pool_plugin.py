@@ -0,0 +1,43 @@
+import os
+
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.schema import FileDataMeta, MessageChannels, UsageData
+
+
+class ProcessOutput(BaseModel):
+    pid: int
+    size: int
+
+
+def process_payload(
+    payload: str,
+    usage: list[UsageData],
+    message_channels: MessageChannels,
+    filedata_meta: FileDataMeta,
+) -> ProcessOutput:
+    usage.append(UsageData(name="characters", value=len(payload)))
+    message_channels.infos.append("processed in worker")
+    filedata_meta.terminate_current = True
+    return ProcessOutput(pid=os.getpid(), size=len(payload))
+
+
+def process_failure(payload: str, usage: list[UsageData]) -> ProcessOutput:
+    usage.append(UsageData(name="attempts", value=1))
+    raise ValueError(f"cannot process {len(payload)} characters")
+
+
+def process_exit(payload: str) -> ProcessOutput:
+    # The worker dies without ever answering
+    os._exit(1)
+
+
+class ProcessPoolClass:
+    instances = 0
+
+    def __init__(self):
+        ProcessPoolClass.instances += 1
+        self.pid = os.getpid()
+
+    def process(self, payload: str) -> ProcessOutput:
+        return ProcessOutput(pid=self.pid, size=len(payload))
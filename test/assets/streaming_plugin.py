@@ -0,0 +1,59 @@
+from typing import AsyncIterator, Iterator
+
+from pydantic import BaseModel
+from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
+
+from unstructured_platform_plugins.schema import (
+    FileDataMeta,
+    MessageChannels,
+    NewRecord,
+    UsageData,
+)
+
+
+class Chunk(BaseModel):
+    index: int
+
+
+def _chunk(
+    i: int,
+    file_data: FileData,
+    usage: list[UsageData],
+    message_channels: MessageChannels,
+    filedata_meta: FileDataMeta,
+) -> Chunk:
+    usage.append(UsageData(name="chunks", value=1))
+    message_channels.infos.append(f"chunk {i}")
+    filedata_meta.new_records.append(
+        NewRecord(
+            file_data=FileData(
+                identifier=f"{file_data.identifier}-{i}",
+                connector_type=file_data.connector_type,
+                source_identifiers=SourceIdentifiers(filename=f"{i}.txt", fullpath=f"{i}.txt"),
+            ),
+            contents=Chunk(index=i),
+        )
+    )
+    return Chunk(index=i)
+
+
+async def stream_chunks(
+    count: int,
+    file_data: FileData,
+    usage: list[UsageData],
+    message_channels: MessageChannels,
+    filedata_meta: FileDataMeta,
+) -> AsyncIterator[Chunk]:
+    for i in range(count):
+        yield _chunk(i, file_data, usage, message_channels, filedata_meta)
+
+
+def stream_chunks_sync(
+    count: int,
+    file_data: FileData,
+    usage: list[UsageData],
+    message_channels: MessageChannels,
+    filedata_meta: FileDataMeta,
+) -> Iterator[Chunk]:
+    for i in range(count):
+        yield _chunk(i, file_data, usage, message_channels, filedata_meta)
@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import time
+
+import pytest
+
+from unstructured_platform_plugins.etl_uvicorn.batching import MicroBatchConfig, MicroBatcher
+
+
+def test_batcher_fills_batches_up_to_max_size():
+    calls = []
+
+    def batch_fn(inputs):
+        calls.append(len(inputs))
+        return [item["x"] * 2 for item in inputs]
+
+    batcher = MicroBatcher(batch_fn, config=MicroBatchConfig(max_batch_size=3, max_wait_ms=50))
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit({"x": x}) for x in range(7)))
+
+    assert asyncio.run(run()) == [x * 2 for x in range(7)]
+    assert calls == [3, 3, 1]
+    assert batcher.stats().batches == 3
+    assert batcher.stats().items == 7
+
+
+def test_batcher_flushes_partial_batch_after_max_wait():
+    async def batch_fn(inputs):
+        return [item["x"] for item in inputs]
+
+    batcher = MicroBatcher(batch_fn, config=MicroBatchConfig(max_batch_size=100, max_wait_ms=20))
+
+    async def run():
+        start = time.perf_counter()
+        result = await batcher.submit({"x": 1})
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result == 1
+    assert 0.015 <= elapsed < 1
+
+
+def test_batcher_fails_only_the_items_that_failed():
+    def batch_fn(inputs):
+        return [ValueError("bad") if item["x"] < 0 else item["x"] for item in inputs]
+
+    batcher = MicroBatcher(batch_fn, config=MicroBatchConfig(max_batch_size=2))
+
+    async def run():
+        return await asyncio.gather(
+            batcher.submit({"x": 1}), batcher.submit({"x": -1}), return_exceptions=True
+        )
+
+    ok, failed = asyncio.run(run())
+    assert ok == 1
+    assert isinstance(failed, ValueError)
+
+
+def test_batcher_rejects_mismatched_output_count():
+    batcher = MicroBatcher(lambda inputs: [], config=MicroBatchConfig(max_batch_size=1))
+    with pytest.raises(ValueError, match="returned 0 outputs for 1 inputs"):
+        asyncio.run(batcher.submit({"x": 1}))
+
+
+def test_batcher_adapts_batch_size_to_target_latency():
+    delay = 0.1
+
+    async def batch_fn(inputs):
+        await asyncio.sleep(delay)
+        return [None] * len(inputs)
+
+    batcher = MicroBatcher(
+        batch_fn,
+        config=MicroBatchConfig(max_batch_size=8, max_wait_ms=1, target_latency_ms=25),
+    )
+
+    async def run(n):
+        await asyncio.gather(*(batcher.submit({}) for _ in range(n)))
+
+    # Batches slower than the target shrink the batch size
+    asyncio.run(run(8))
+    assert batcher.batch_size_limit == 6
+
+    # Full batches under the target grow it again, up to the configured maximum
+    delay = 0
+    for _ in range(4):
+        asyncio.run(run(batcher.batch_size_limit))
+    assert batcher.batch_size_limit == 8
+
+
+def test_sync_batches_see_the_callers_context():
+    request_id = contextvars.ContextVar("request_id", default=None)
+
+    def batch_fn(inputs):
+        return [request_id.get() for _ in inputs]
+
+    batcher = MicroBatcher(batch_fn, config=MicroBatchConfig(max_batch_size=2, max_wait_ms=50))
+
+    async def run():
+        request_id.set("abc")
+        return await asyncio.gather(batcher.submit({}), batcher.submit({}))
+
+    assert asyncio.run(run()) == ["abc", "abc"]
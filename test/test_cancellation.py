@@ -0,0 +1,285 @@
+import asyncio
+import pickle
+import threading
+import time
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.cancellation import (
+    CancellationTracker,
+    CancelOnDisconnectMiddleware,
+    current_cancellation_token,
+    parse_deadline,
+)
+from unstructured_platform_plugins.schema.cancellation import (
+    CancellationToken,
+    DeadlineExceededError,
+    InvocationCancelledError,
+)
+
+
+def _scope(path: str = "/invoke") -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+
+
+def _disconnecting_client(body: bytes = b"{}", after: float = 0.05):
+    """ASGI receive/send of a client that sends its body and hangs up after `after` seconds."""
+    sent = []
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    return receive, send, sent
+
+
+def test_token_raises_once_cancelled():
+    token = CancellationToken()
+    token.raise_if_cancelled()
+    token.cancel("deadline passed")
+    assert token.cancelled
+    with pytest.raises(InvocationCancelledError, match="deadline passed") as e:
+        token.raise_if_cancelled()
+    assert e.value.status_code == 499
+
+
+def test_coroutine_is_cancelled_on_disconnect():
+    cancelled = []
+
+    async def app(scope, receive, send):
+        await receive()
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(current_cancellation_token().cancelled)
+            raise
+
+    tracker = CancellationTracker()
+    middleware = CancelOnDisconnectMiddleware(app, tracker=tracker)
+    receive, send, sent = _disconnecting_client()
+    asyncio.run(asyncio.wait_for(middleware(_scope(), receive, send), timeout=2))
+    assert cancelled == [True]
+    assert tracker.cancelled == 1
+    assert sent == []
+
+
+def test_body_is_relayed_as_the_app_reads_it():
+    chunks = [{"type": "http.request", "body": b"x", "more_body": True} for _ in range(20)]
+    chunks.append({"type": "http.request", "body": b"", "more_body": False})
+    pulled = []
+    read_ahead = []
+
+    async def receive():
+        if chunks:
+            pulled.append(1)
+            return chunks.pop(0)
+        await asyncio.sleep(5)
+        return {"type": "http.disconnect"}
+
+    async def app(scope, receive, send):
+        more_body = True
+        read = 0
+        while more_body:
+            message = await receive()
+            read += 1
+            more_body = message["more_body"]
+            await asyncio.sleep(0.001)
+            read_ahead.append(len(pulled) - read)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    middleware = CancelOnDisconnectMiddleware(app)
+    asyncio.run(asyncio.wait_for(middleware(_scope(), receive, send), timeout=2))
+    # The watcher is never more than the chunk waiting in its queue and the one it holds ahead
+    assert max(read_ahead) <= 2
+
+
+def test_app_that_never_reads_its_body_is_cancelled_on_disconnect():
+    cancelled = []
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    middleware = CancelOnDisconnectMiddleware(app)
+    receive, send, sent = _disconnecting_client()
+    asyncio.run(asyncio.wait_for(middleware(_scope(), receive, send), timeout=2))
+    assert cancelled == [True]
+
+
+def test_app_waiting_for_the_disconnect_is_told():
+    async def app(scope, receive, send):
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        assert (await receive())["type"] == "http.disconnect"
+        assert (await receive())["type"] == "http.disconnect"
+
+    middleware = CancelOnDisconnectMiddleware(app)
+    receive, send, sent = _disconnecting_client(after=0.01)
+    asyncio.run(asyncio.wait_for(middleware(_scope(), receive, send), timeout=2))
+    assert len(sent) == 2
+
+
+def test_other_routes_are_not_watched():
+    async def app(scope, receive, send):
+        await asyncio.sleep(0.1)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    tracker = CancellationTracker()
+    middleware = CancelOnDisconnectMiddleware(app, tracker=tracker)
+    receive, send, sent = _disconnecting_client(after=0.01)
+    asyncio.run(middleware(_scope("/schema"), receive, send))
+    assert tracker.cancelled == 0
+    assert len(sent) == 2
+
+
+class _Progress(BaseModel):
+    steps: int
+
+
+_sync_plugin_stopped = threading.Event()
+
+
+def _cooperative_sync_plugin() -> _Progress:
+    token = current_cancellation_token()
+    steps = 0
+    while not token.wait(timeout=0.01):
+        steps += 1
+        if steps > 500:
+            break
+    _sync_plugin_stopped.set()
+    token.raise_if_cancelled()
+    return _Progress(steps=steps)
+
+
+def test_sync_plugin_is_signalled_on_disconnect():
+    _sync_plugin_stopped.clear()
+    app = wrap_in_fastapi(
+        func=_cooperative_sync_plugin, plugin_id="mock_plugin", cancel_on_disconnect=True
+    )
+    receive, send, sent = _disconnecting_client()
+    asyncio.run(asyncio.wait_for(app(_scope(), receive, send), timeout=2))
+    assert _sync_plugin_stopped.wait(timeout=2)
+    assert app.state.cancellation_tracker.cancelled == 1
+    assert not any(message["type"] == "http.response.start" for message in sent)
+
+
+def test_completed_invocations_are_not_cancelled():
+    async def plugin() -> _Progress:
+        return _Progress(steps=current_cancellation_token().cancelled)
+
+    app = wrap_in_fastapi(func=plugin, plugin_id="mock_plugin", cancel_on_disconnect=True)
+    with TestClient(app) as client:
+        resp = client.post("/invoke")
+        assert resp.json()["output"] == {"steps": 0}
+    assert app.state.cancellation_tracker.cancelled == 0
+
+
+def test_parse_deadline():
+    assert parse_deadline("1700000000.5") == 1700000000.5
+    assert parse_deadline("2023-11-14T22:13:20Z") == 1700000000
+    # Naive datetimes are taken as UTC
+    assert parse_deadline("2023-11-14T22:13:20") == 1700000000
+    with pytest.raises(ValueError):
+        parse_deadline("tomorrow")
+
+
+def test_token_expires_at_its_deadline():
+    token = CancellationToken(deadline=time.time() + 0.05)
+    assert not token.cancelled
+    assert token.wait(timeout=2)
+    assert token.expired
+    with pytest.raises(DeadlineExceededError) as e:
+        token.raise_if_cancelled()
+    assert e.value.status_code == 504
+    # Worker processes get a copy carrying the same deadline
+    assert pickle.loads(pickle.dumps(token)).deadline == token.deadline
+
+
+class _Deadline(BaseModel):
+    remaining: Optional[float] = None
+
+
+_deadline_plugin_calls = []
+
+
+def _deadline_plugin(text: str, cancellation_token: CancellationToken) -> _Deadline:
+    _deadline_plugin_calls.append(text)
+    if text == "slow":
+        cancellation_token.wait()
+        cancellation_token.raise_if_cancelled()
+    return _Deadline(remaining=cancellation_token.remaining())
+
+
+def test_deadline_is_injected():
+    _deadline_plugin_calls.clear()
+    client = TestClient(wrap_in_fastapi(func=_deadline_plugin, plugin_id="mock_plugin"))
+    assert "cancellation_token" not in client.get("/schema").json()["inputs"]["properties"]
+
+    resp = client.post("/invoke", json={"text": "a"})
+    assert resp.json()["output"] == {"remaining": None}
+
+    resp = client.post(
+        "/invoke",
+        json={"text": "a"},
+        headers={"X-Request-Deadline": str(time.time() + 60)},
+    )
+    assert 0 < resp.json()["output"]["remaining"] <= 60
+
+
+def test_plugin_stopping_at_the_deadline_reports_504():
+    client = TestClient(wrap_in_fastapi(func=_deadline_plugin, plugin_id="mock_plugin"))
+    resp = client.post(
+        "/invoke",
+        json={"text": "slow"},
+        headers={"X-Request-Deadline": str(time.time() + 0.5)},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["status_code"] == 504
+    assert "deadline" in resp.json()["status_code_text"]
+
+
+def test_requests_past_their_deadline_are_rejected():
+    _deadline_plugin_calls.clear()
+    app = wrap_in_fastapi(func=_deadline_plugin, plugin_id="mock_plugin")
+    client = TestClient(app)
+    resp = client.post(
+        "/invoke", json={"text": "late"}, headers={"X-Request-Deadline": str(time.time() - 1)}
+    )
+    assert resp.status_code == 504
+    assert app.state.cancellation_tracker.deadline_exceeded == 1
+
+    resp = client.post("/invoke", json={"text": "bad"}, headers={"X-Request-Deadline": "soon"})
+    assert resp.status_code == 400
+    assert _deadline_plugin_calls == []
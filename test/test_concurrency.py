@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from unstructured_platform_plugins.etl_uvicorn.concurrency import (
+    AdaptiveLimit,
+    AdaptiveLimitConfig,
+    AdmissionConfig,
+    AdmissionController,
+    AdmissionRejectedError,
+)
+
+
+def test_admission_queues_then_rejects():
+    controller = AdmissionController(AdmissionConfig(max_in_flight=1, max_queue_size=1))
+
+    async def run():
+        await controller.acquire()
+        queued = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.stats().queued == 1
+        with pytest.raises(AdmissionRejectedError) as e:
+            await controller.acquire()
+        assert e.value.status_code == 429
+
+        controller.release()
+        await queued
+        stats = controller.stats()
+        assert (stats.in_flight, stats.queued, stats.admitted, stats.rejected) == (1, 0, 2, 1)
+        controller.release()
+        assert controller.stats().in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    controller = AdmissionController(AdmissionConfig(max_in_flight=1, max_queue_size=2))
+
+    async def run():
+        await controller.acquire()
+        cancelled = asyncio.ensure_future(controller.acquire())
+        waiting = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        # The slot is offered to the first waiter, which is cancelled before it resumes
+        controller.release()
+        cancelled.cancel()
+        await waiting
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert controller.stats().in_flight == 1
+        assert controller.stats().queued == 0
+        controller.release()
+        assert controller.stats().in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_adaptive_limit_grows_while_latency_is_near_baseline():
+    limit = AdaptiveLimit(AdaptiveLimitConfig(max_limit=5), initial_limit=2)
+    for _ in range(50):
+        limit.on_sample(0.01, in_flight=limit.limit - 1)
+    assert limit.limit == 5
+    assert limit.baseline == pytest.approx(0.01)
+
+
+def test_adaptive_limit_backs_off_on_high_latency():
+    limit = AdaptiveLimit(AdaptiveLimitConfig(backoff=0.5), initial_limit=16)
+    limit.on_sample(0.01, in_flight=0)
+    limit.on_sample(0.1, in_flight=0)
+    assert limit.limit == 8
+    # Only once per round trip, the other slow requests of the same burst don't count again
+    limit.on_sample(0.1, in_flight=0)
+    assert limit.limit == 8
+
+
+def test_adaptive_limit_baseline_follows_recent_latencies():
+    limit = AdaptiveLimit(
+        AdaptiveLimitConfig(baseline_window=10, baseline_percentile=0.2), initial_limit=4
+    )
+    # One unusually fast call doesn't set the baseline on its own
+    limit.on_sample(0.001, in_flight=0)
+    for _ in range(9):
+        limit.on_sample(0.05, in_flight=0)
+    assert limit.baseline == pytest.approx(0.05)
+    # A plugin that became slower for good gets a new baseline once the window has moved on
+    for _ in range(10):
+        limit.on_sample(0.2, in_flight=0)
+    assert limit.baseline == pytest.approx(0.2)
+
+
+def test_adaptive_limit_backs_off_on_event_loop_lag():
+    limit = AdaptiveLimit(
+        AdaptiveLimitConfig(backoff=0.5, max_event_loop_lag_ms=5), initial_limit=16
+    )
+    limit.event_loop_lag = 0.01
+    limit.on_sample(0.001, in_flight=0)
+    assert limit.limit == 8
+
+
+def test_event_loop_lag_is_sampled():
+    limit = AdaptiveLimit(AdaptiveLimitConfig(lag_sample_interval_ms=0), initial_limit=1)
+
+    async def run():
+        limit.sample_event_loop_lag()
+        # Block the loop so the sampling callback runs late
+        time.sleep(0.02)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert limit.event_loop_lag > 0.004
+
+
+def test_controller_admits_waiters_when_the_limit_grows():
+    controller = AdmissionController(
+        AdmissionConfig(
+            max_in_flight=1, max_queue_size=2, adaptive=AdaptiveLimitConfig(max_limit=4)
+        )
+    )
+
+    async def run():
+        await controller.acquire()
+        waiters = [asyncio.ensure_future(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        controller.adaptive._limit = 3
+        controller.release()
+        await asyncio.gather(*waiters)
+        assert controller.stats().in_flight == 2
+
+    asyncio.run(run())
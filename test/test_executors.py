@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+import pytest
+
+from unstructured_platform_plugins.etl_uvicorn.executors import (
+    ExecutorConfig,
+    ExecutorQueueFullError,
+    PluginExecutor,
+)
+
+
+def test_executor_uses_configured_threads():
+    executor = PluginExecutor(ExecutorConfig(max_workers=2, thread_name_prefix="my-plugin"))
+    try:
+        name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+        assert name.startswith("my-plugin")
+        assert executor.stats().max_workers == 2
+        assert executor.stats().completed == 1
+    finally:
+        executor.shutdown()
+
+
+def test_executor_rejects_beyond_queue_bound():
+    executor = PluginExecutor(ExecutorConfig(max_workers=1, max_queue_size=1))
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait)
+        waiting = executor.submit(lambda: "queued")
+        stats = executor.stats()
+        assert stats.active_threads + stats.queue_depth == 2
+        with pytest.raises(ExecutorQueueFullError):
+            executor.submit(lambda: "rejected")
+        assert executor.stats().rejected == 1
+
+        release.set()
+        running.result(timeout=5)
+        assert waiting.result(timeout=5) == "queued"
+        assert executor.stats().queue_depth == 0
+        assert executor.stats().active_threads == 0
+    finally:
+        release.set()
+        executor.shutdown()
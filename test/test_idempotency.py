@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.idempotency import (
+    IDEMPOTENT_REPLAYED_HEADER,
+    IdempotencyConfig,
+    IdempotencyKeyConflictError,
+    IdempotencyKeyReusedError,
+    IdempotencyStore,
+)
+
+
+class Doubled(BaseModel):
+    value: int
+
+
+def _plugin(calls: list):
+    def double(x: int, fail: bool = False) -> Doubled:
+        calls.append(x)
+        if fail:
+            raise ValueError("failed")
+        return Doubled(value=x * 2)
+
+    return double
+
+
+def test_responses_survive_a_restart(tmp_path):
+    config = IdempotencyConfig(path=str(tmp_path / "store.db"))
+
+    async def run():
+        store = IdempotencyStore("plugin", config)
+        await store.put("key", "hash", b"response")
+        store.close()
+        reopened = IdempotencyStore("plugin", config)
+        stored = await reopened.get("key", "hash")
+        # Keys are scoped to the plugin
+        other = await IdempotencyStore("other", config).get("key", "hash")
+        with pytest.raises(IdempotencyKeyReusedError):
+            await reopened.get("key", "different inputs")
+        return stored, other
+
+    assert asyncio.run(run()) == (b"response", None)
+
+
+def test_concurrent_requests_with_the_same_key_conflict(tmp_path):
+    async def run():
+        store = IdempotencyStore("plugin", IdempotencyConfig(path=str(tmp_path / "store.db")))
+        async with store.claim("key"):
+            with pytest.raises(IdempotencyKeyConflictError):
+                async with store.claim("key"):
+                    pass
+        # Released once the first request is done
+        async with store.claim("key"):
+            pass
+        return store.stats().conflicts
+
+    assert asyncio.run(run()) == 1
+
+
+def test_expired_responses_are_compacted(tmp_path):
+    config = IdempotencyConfig(path=str(tmp_path / "store.db"), ttl=0.01, compact_interval=0)
+
+    async def run():
+        store = IdempotencyStore("plugin", config)
+        await store.put("old", "hash", b"x" * 10_000)
+        time.sleep(0.02)
+        expired = await store.get("old", "hash")
+        await store.put("new", "hash", b"response")
+        return expired, store.stats().compacted
+
+    assert asyncio.run(run()) == (None, 1)
+
+
+def test_retries_get_the_stored_response(tmp_path):
+    calls = []
+    config = IdempotencyConfig(path=str(tmp_path / "store.db"))
+    client = TestClient(
+        wrap_in_fastapi(func=_plugin(calls), plugin_id="mock_plugin", idempotency_config=config)
+    )
+    first = client.post("/invoke", json={"x": 2}, headers={"Idempotency-Key": "a"})
+    assert IDEMPOTENT_REPLAYED_HEADER not in first.headers
+
+    # A new app on the same store stands in for the restarted server
+    client = TestClient(
+        wrap_in_fastapi(func=_plugin(calls), plugin_id="mock_plugin", idempotency_config=config)
+    )
+    retry = client.post("/invoke", json={"x": 2}, headers={"Idempotency-Key": "a"})
+    assert retry.content == first.content
+    assert retry.headers[IDEMPOTENT_REPLAYED_HEADER] == "true"
+    assert calls == [2]
+
+    reused = client.post("/invoke", json={"x": 3}, headers={"Idempotency-Key": "a"})
+    assert reused.status_code == 422
+    # Requests without a key, and failures, always run
+    client.post("/invoke", json={"x": 2})
+    for _ in range(2):
+        client.post("/invoke", json={"x": 4, "fail": True}, headers={"Idempotency-Key": "b"})
+    assert calls == [2, 2, 4, 4]
+    assert client.post("/invoke", json={"x": 2}, headers={"Idempotency-Key": ""}).status_code == 400
+
+
+def test_streamed_list_outputs_are_stored_as_sent(tmp_path):
+    calls = []
+
+    def elements(n: int) -> list[Doubled]:
+        calls.append(n)
+        return [Doubled(value=i) for i in range(n)]
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=elements,
+            plugin_id="mock_plugin",
+            encode_mode="trusted",
+            stream_list_output=True,
+            idempotency_config=IdempotencyConfig(path=str(tmp_path / "store.db")),
+        )
+    )
+    first = client.post("/invoke", json={"n": 3}, headers={"Idempotency-Key": "a"})
+    retry = client.post("/invoke", json={"n": 3}, headers={"Idempotency-Key": "a"})
+    assert first.json()["output"] == [{"value": i} for i in range(3)]
+    assert retry.content == first.content
+    assert retry.headers[IDEMPOTENT_REPLAYED_HEADER] == "true"
+    assert calls == [3]
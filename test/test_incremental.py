@@ -0,0 +1,115 @@
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from unstructured_ingest.data_types.file_data import (
+    FileData,
+    FileDataSourceMetadata,
+    SourceIdentifiers,
+)
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.incremental import (
+    INCREMENTAL_HEADER,
+    IncrementalConfig,
+    get_file_version,
+)
+from unstructured_platform_plugins.schema import UsageData
+
+
+class Counted(BaseModel):
+    calls: int
+
+
+def _file_data(version: str = "1", reprocess: bool = False) -> dict:
+    return _make_file_data(version=version, reprocess=reprocess).model_dump()
+
+
+def _make_file_data(reprocess: bool = False, **metadata) -> FileData:
+    return FileData(
+        identifier="doc",
+        connector_type="CON",
+        source_identifiers=SourceIdentifiers(filename="doc.txt", fullpath="doc.txt"),
+        metadata=FileDataSourceMetadata(**metadata),
+        reprocess=reprocess,
+    )
+
+
+def _plugin(calls: list):
+    def process(file_data: FileData, strategy: str = "fast") -> Counted:
+        calls.append(file_data.identifier)
+        return Counted(calls=len(calls))
+
+    return process
+
+
+def test_file_versions():
+    def version(**metadata):
+        kwargs = {"file_data": _make_file_data(**metadata), "strategy": "fast"}
+        return get_file_version("p", kwargs)
+
+    assert version(version="1", date_modified="2") == version(version="1", date_modified="3")
+    assert version(date_modified="2").tag == "date_modified:2"
+    assert version() is None
+    assert get_file_version("p", {"file_data": None}) is None
+
+
+def test_unchanged_files_get_their_previous_response(tmp_path):
+    calls = []
+    config = IncrementalConfig(path=str(tmp_path / "index.db"))
+    client = TestClient(
+        wrap_in_fastapi(func=_plugin(calls), plugin_id="p", incremental_config=config)
+    )
+    first = client.post("/invoke", json={"file_data": _file_data()})
+    second = client.post("/invoke", json={"file_data": _file_data()})
+    assert second.content == first.content
+    assert INCREMENTAL_HEADER not in first.headers
+    assert second.headers[INCREMENTAL_HEADER] == "unchanged"
+    assert len(calls) == 1
+
+    # A new version, different inputs, or asking for it are all processed again
+    assert client.post("/invoke", json={"file_data": _file_data("2")}).json()["output"] == {
+        "calls": 2
+    }
+    body = {"file_data": _file_data("2"), "strategy": "hi_res"}
+    assert client.post("/invoke", json=body).json()["output"] == {"calls": 3}
+    body = {"file_data": _file_data("2", reprocess=True), "strategy": "hi_res"}
+    assert client.post("/invoke", json=body).json()["output"] == {"calls": 4}
+    stats = client.app.state.incremental_index.stats()
+    assert (stats.unchanged, stats.processed, stats.untracked) == (1, 3, 1)
+
+    # The index outlives the server
+    client = TestClient(
+        wrap_in_fastapi(func=_plugin(calls), plugin_id="p", incremental_config=config)
+    )
+    body = {"file_data": _file_data("2"), "strategy": "hi_res"}
+    response = client.post("/invoke", json=body)
+    assert response.headers[INCREMENTAL_HEADER] == "unchanged"
+    assert len(calls) == 4
+
+
+def test_unchanged_status(tmp_path):
+    calls = []
+    config = IncrementalConfig(path=str(tmp_path / "index.db"), unchanged_response="status")
+    client = TestClient(
+        wrap_in_fastapi(func=_plugin(calls), plugin_id="p", incremental_config=config)
+    )
+    assert client.post("/invoke", json={"file_data": _file_data()}).json()["status_code"] == 200
+    response = client.post("/invoke", json={"file_data": _file_data()}).json()
+    assert response["status_code"] == 304
+    assert response["output"] is None
+    assert response["file_data"]["identifier"] == "doc"
+    assert calls == ["doc"]
+
+
+def test_unchanged_files_report_no_usage(tmp_path):
+    def process(file_data: FileData, usage: list[UsageData]) -> Counted:
+        usage.append(UsageData(name="pages", value=1))
+        return Counted(calls=1)
+
+    config = IncrementalConfig(path=str(tmp_path / "index.db"))
+    client = TestClient(wrap_in_fastapi(func=process, plugin_id="p", incremental_config=config))
+    first = client.post("/invoke", json={"file_data": _file_data()}).json()
+    second = client.post("/invoke", json={"file_data": _file_data()}).json()
+    assert first["usage"] == [{"name": "pages", "value": 1}]
+    # The plugin didn't run for the unchanged file, there is no usage to report
+    assert second["usage"] == []
+    assert second["output"] == first["output"]
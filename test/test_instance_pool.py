@@ -0,0 +1,122 @@
+import asyncio
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from test.assets.pooled_class import NotThreadSafeParser
+from unstructured_platform_plugins.etl_uvicorn import utils
+from unstructured_platform_plugins.etl_uvicorn.api_generator import generate_fast_api
+from unstructured_platform_plugins.etl_uvicorn.executors import ExecutorConfig, PluginExecutor
+from unstructured_platform_plugins.etl_uvicorn.instance_pool import InstancePool
+from unstructured_platform_plugins.etl_uvicorn.invocation import build_invocation_plan
+
+
+def test_get_func_pools_non_thread_safe_class():
+    func = utils.get_func(NotThreadSafeParser, method_name="parse")
+    assert func.instance_pool.size == 2
+    # The pooled callable still looks like the bound method to the wrapper
+    assert list(inspect.signature(func).parameters) == ["text"]
+    assert utils.get_output_sig(func).__name__ == "ParseOutput"
+
+
+def test_get_func_pool_size_override():
+    func = utils.get_func(NotThreadSafeParser, method_name="parse", pool_size=3)
+    assert func.instance_pool.size == 3
+
+
+def test_sync_calls_never_share_an_instance():
+    func = utils.get_func(NotThreadSafeParser, method_name="parse")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outputs = list(executor.map(lambda i: func(text=str(i)), range(16)))
+    assert len({output.instance_id for output in outputs}) == 2
+    assert func.instance_pool.stats().available == 2
+
+
+def test_async_calls_never_share_an_instance():
+    func = utils.get_func(NotThreadSafeParser, method_name="aparse")
+
+    async def run():
+        return await asyncio.gather(*[func(text=str(i)) for i in range(16)])
+
+    outputs = asyncio.run(run())
+    assert len({output.instance_id for output in outputs}) == 2
+    assert func.instance_pool.stats().available == 2
+
+
+def test_sync_generators_hold_their_instance_until_exhausted():
+    func = utils.get_func(NotThreadSafeParser, method_name="iter_parse")
+    assert inspect.isgeneratorfunction(func)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        streams = list(executor.map(lambda i: list(func(text=str(i))), range(8)))
+    assert all(len(outputs) == 2 for outputs in streams)
+    assert func.instance_pool.stats().available == 2
+
+
+def test_cancelled_waiter_does_not_lose_an_instance():
+    pool = InstancePool(factory=object, size=1)
+
+    async def run():
+        held = await pool.acquire_async()
+        waiter = asyncio.ensure_future(pool.acquire_async())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        pool.release(held)
+        await asyncio.sleep(0)
+        return await pool.acquire_async()
+
+    assert asyncio.run(run()) is not None
+    assert pool.stats().waiting == 0
+
+
+def test_invocations_wait_for_an_instance_before_taking_a_thread():
+    release = threading.Event()
+
+    class Blocking:
+        thread_safe = False
+
+        def run(self) -> str:
+            release.wait(timeout=5)
+            return "done"
+
+        def iterate(self):
+            release.wait(timeout=5)
+            yield "done"
+
+    executor = PluginExecutor(ExecutorConfig(max_workers=4))
+    func = utils.get_func(Blocking, method_name="run")
+    plan = build_invocation_plan(func, executor=executor)
+    stream_plan = build_invocation_plan(utils.get_sibling_func(func, "iterate"), executor=executor)
+
+    async def collect(stream):
+        return [item async for item in stream]
+
+    async def run():
+        calls = [asyncio.ensure_future(plan.invoke()) for _ in range(3)]
+        calls.append(asyncio.ensure_future(collect(stream_plan.stream())))
+        await asyncio.sleep(0.05)
+        # One call holds the only instance, the others wait on the event loop
+        busy = executor.stats().active_threads
+        waiting = func.instance_pool.stats().waiting
+        release.set()
+        return busy, waiting, await asyncio.gather(*calls)
+
+    busy, waiting, outputs = asyncio.run(run())
+    assert (busy, waiting) == (1, 3)
+    assert outputs == ["done", "done", "done", ["done"]]
+    assert func.instance_pool.stats().available == 1
+
+
+def test_precheck_shares_the_instance_pool():
+    created = len(NotThreadSafeParser.instances)
+    client = TestClient(
+        generate_fast_api(
+            "test.assets.pooled_class:NotThreadSafeParser",
+            method_name="parse",
+            precheck_method="precheck",
+        )
+    )
+    assert client.get("/precheck").status_code == 200
+    assert client.post("/invoke", json={"text": "a"}).json()["status_code"] == 200
+    assert len(NotThreadSafeParser.instances) - created == NotThreadSafeParser.instance_pool_size
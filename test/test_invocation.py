@@ -0,0 +1,66 @@
+import asyncio
+
+from unstructured_platform_plugins.etl_uvicorn.invocation import (
+    CallStyle,
+    build_invocation_plan,
+)
+
+
+def sync_fn(a: int, usage: list) -> int:
+    return a + 1
+
+
+async def async_fn(a: int, message_channels: dict, filedata_meta: dict) -> int:
+    return a + 2
+
+
+async def async_gen_fn(a: int):
+    for i in range(a):
+        yield i
+
+
+def sync_gen_fn(a: int):
+    for i in range(a):
+        yield i
+
+
+def test_plan_records_call_style():
+    assert build_invocation_plan(sync_fn).call_style is CallStyle.SYNC
+    assert build_invocation_plan(async_fn).call_style is CallStyle.COROUTINE
+    plan = build_invocation_plan(async_gen_fn)
+    assert plan.call_style is CallStyle.ASYNC_GENERATOR
+    assert plan.is_streaming
+    plan = build_invocation_plan(sync_gen_fn)
+    assert plan.call_style is CallStyle.SYNC_GENERATOR
+    assert plan.is_streaming
+
+
+def test_plan_records_injectables():
+    assert build_invocation_plan(sync_fn).injectables == {"usage"}
+    assert build_invocation_plan(async_fn).injectables == {"message_channels", "filedata_meta"}
+    assert not build_invocation_plan(async_gen_fn).injectables
+
+
+def test_plan_only_injects_accepted_parameters():
+    plan = build_invocation_plan(sync_fn)
+    kwargs = plan.inject({"a": 1}, usage=[], message_channels=None, filedata_meta=None)
+    assert kwargs == {"a": 1, "usage": []}
+
+
+def test_plan_invoke():
+    assert asyncio.run(build_invocation_plan(sync_fn).invoke({"a": 1, "usage": []})) == 2
+    assert (
+        asyncio.run(
+            build_invocation_plan(async_fn).invoke(
+                {"a": 1, "message_channels": {}, "filedata_meta": {}}
+            )
+        )
+        == 3
+    )
+
+
+def test_plan_streams_sync_generators():
+    async def run():
+        return [i async for i in build_invocation_plan(sync_gen_fn).stream({"a": 3})]
+
+    assert asyncio.run(run()) == [0, 1, 2]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.replay import (
+    STREAM_ID_HEADER,
+    ReplayConfig,
+    ReplayFramesLostError,
+    ReplayStore,
+)
+
+file_data = FileData(
+    identifier="doc",
+    connector_type="CON",
+    source_identifiers=SourceIdentifiers(filename="doc.txt", fullpath="doc.txt"),
+)
+
+
+async def _frames(count: int, delay: float = 0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield b'{"i":%d}\n' % i
+
+
+async def _read(frames) -> list[dict]:
+    return [json.loads(frame) async for frame in frames]
+
+
+def test_frames_are_numbered():
+    async def run():
+        store = ReplayStore()
+        buffer = store.start(_frames(3))
+        frames = await _read(buffer.read())
+        await store.shutdown()
+        return buffer.stream_id, frames
+
+    stream_id, frames = asyncio.run(run())
+    assert frames == [{"stream_id": stream_id, "seq": i, "i": i} for i in range(3)]
+
+
+def test_resume_only_returns_missed_frames():
+    async def run():
+        store = ReplayStore()
+        buffer = store.start(_frames(5, delay=0.01))
+        # The first reader goes away after two frames, the stream carries on without it
+        first = buffer.read()
+        received = [json.loads(await first.__anext__()) for _ in range(2)]
+        await first.aclose()
+        resumed = await _read(store.resume(buffer.stream_id).read(after=received[-1]["seq"]))
+        stats = store.stats()
+        await store.shutdown()
+        return received, resumed, stats
+
+    received, resumed, stats = asyncio.run(run())
+    assert [frame["i"] for frame in received] == [0, 1]
+    assert [frame["i"] for frame in resumed] == [2, 3, 4]
+    assert stats.resumed == 1
+
+
+def test_frames_over_the_memory_budget_are_dropped():
+    async def run():
+        store = ReplayStore(ReplayConfig(max_memory_bytes=100))
+        buffer = store.start(_frames(20))
+        while not buffer.done:
+            await asyncio.sleep(0)
+        with pytest.raises(ReplayFramesLostError):
+            await _read(buffer.read())
+        remaining = await _read(buffer.read(after=buffer.first_seq - 1))
+        stats = store.stats()
+        await store.shutdown()
+        return remaining, stats
+
+    remaining, stats = asyncio.run(run())
+    assert remaining[-1]["i"] == 19
+    assert stats.dropped_frames == 20 - len(remaining)
+
+
+def test_frames_over_the_memory_budget_are_spilled(tmp_path):
+    async def run():
+        store = ReplayStore(ReplayConfig(max_memory_bytes=100, spill_dir=str(tmp_path)))
+        buffer = store.start(_frames(20))
+        await _read(buffer.read())
+        replayed = await _read(buffer.read())
+        stats = store.stats()
+        await store.shutdown()
+        return replayed, stats
+
+    replayed, stats = asyncio.run(run())
+    assert [frame["i"] for frame in replayed] == list(range(20))
+    assert stats.spilled_bytes > 0
+    assert stats.dropped_frames == 0
+
+
+def test_streams_share_a_total_memory_budget(tmp_path):
+    async def run():
+        config = ReplayConfig(
+            max_memory_bytes=10_000, max_total_memory_bytes=300, spill_dir=str(tmp_path)
+        )
+        store = ReplayStore(config)
+        finished = store.start(_frames(10))
+        await _read(finished.read())
+        running = store.start(_frames(10))
+        await _read(running.read())
+        # The stream that finished first gave up its memory before the one still running
+        memory = (finished.memory_bytes, running.memory_bytes, store.stats().memory_bytes)
+        replayed = [await _read(buffer.read()) for buffer in (finished, running)]
+        await store.shutdown()
+        return memory, replayed, store.stats()
+
+    (finished, running, total), replayed, stats = asyncio.run(run())
+    assert total == finished + running <= 300
+    assert finished == 0
+    assert [[frame["i"] for frame in frames] for frames in replayed] == [list(range(10))] * 2
+    assert stats.memory_bytes == 0
+
+
+def test_finished_streams_expire():
+    async def run():
+        store = ReplayStore(ReplayConfig(retention=0.01))
+        buffer = store.start(_frames(1))
+        await _read(buffer.read())
+        await asyncio.sleep(0.05)
+        return store.resume(buffer.stream_id), store.stats()
+
+    buffer, stats = asyncio.run(run())
+    assert buffer is None
+    assert stats.streams == 0
+
+
+def test_resumable_plugin_stream():
+    from test.assets.streaming_plugin import stream_chunks
+
+    app = wrap_in_fastapi(
+        func=stream_chunks,
+        plugin_id="mock_plugin",
+        stream_protocol="delta",
+        replay_config=ReplayConfig(),
+    )
+    with TestClient(app) as client:
+        resp = client.post("/invoke", json={"count": 3, "file_data": file_data.model_dump()})
+        stream_id = resp.headers[STREAM_ID_HEADER]
+        frames = [json.loads(line) for line in resp.iter_lines() if line]
+        assert [frame["seq"] for frame in frames] == [0, 1, 2, 3]
+        assert all(frame["stream_id"] == stream_id for frame in frames)
+
+        resumed = client.get(f"/invoke/stream/{stream_id}", headers={"Last-Event-ID": "1"})
+        assert [json.loads(line) for line in resumed.iter_lines() if line] == frames[2:]
+
+        assert client.get("/invoke/stream/unknown").status_code == 404
+        invalid = client.get(f"/invoke/stream/{stream_id}", headers={"Last-Event-ID": "last"})
+        assert invalid.status_code == 400
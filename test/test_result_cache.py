@@ -0,0 +1,153 @@
+import time
+from typing import AsyncIterator
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.result_cache import (
+    CACHE_HEADER,
+    ResultCache,
+    ResultCacheConfig,
+    canonical_hash,
+    is_cacheable,
+)
+from unstructured_platform_plugins.schema import UsageData
+
+
+class Doubled(BaseModel):
+    value: int
+
+
+def _plugin(calls: list):
+    def double(x: int, fail: bool = False) -> Doubled:
+        calls.append(x)
+        if fail:
+            raise ValueError("failed")
+        return Doubled(value=x * 2)
+
+    return double
+
+
+def test_hash_ignores_key_order():
+    assert canonical_hash("p", {"a": 1, "b": [1, 2]}) == canonical_hash("p", {"b": [1, 2], "a": 1})
+    assert canonical_hash("p", {"a": 1}) != canonical_hash("q", {"a": 1})
+
+
+def test_inputs_without_a_json_form_have_no_hash():
+    class Opaque:
+        pass
+
+    assert canonical_hash("p", {"a": Opaque()}) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache("p", ResultCacheConfig(max_entries=2))
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    stats = cache.stats()
+    assert (stats.entries, stats.hits, stats.misses, stats.evictions) == (2, 2, 1, 1)
+
+
+def test_memory_budget():
+    cache = ResultCache("p", ResultCacheConfig(max_memory_bytes=10))
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"x" * 6)
+    cache.put("too large", b"x" * 11)
+    assert cache.get("a") is None
+    assert cache.get("too large") is None
+    assert cache.stats().bytes == 6
+
+
+def test_entries_expire():
+    cache = ResultCache("p", ResultCacheConfig(ttl=0.01))
+    cache.put("a", b"1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats().entries == 0
+
+
+def test_repeated_invocations_are_cached():
+    calls = []
+    app = wrap_in_fastapi(
+        func=_plugin(calls), plugin_id="mock_plugin", result_cache_config=ResultCacheConfig()
+    )
+    client = TestClient(app)
+    first = client.post("/invoke", json={"x": 2})
+    second = client.post("/invoke", json={"x": 2})
+    assert second.content == first.content
+    assert CACHE_HEADER not in first.headers
+    assert second.headers[CACHE_HEADER] == "hit"
+    assert calls == [2]
+
+    # Failures are not cached
+    for _ in range(2):
+        assert client.post("/invoke", json={"x": 3, "fail": True}).json()["status_code"] == 500
+    assert calls == [2, 3, 3]
+    assert app.state.result_cache.stats().hits == 1
+
+
+def test_plugins_mark_themselves_cacheable():
+    calls = []
+    func = _plugin(calls)
+    func.cacheable = False
+    app = wrap_in_fastapi(
+        func=func, plugin_id="mock_plugin", result_cache_config=ResultCacheConfig()
+    )
+    assert app.state.result_cache is None
+
+    class Plugin:
+        cacheable = True
+
+        def run(self, x: int) -> Doubled:
+            return Doubled(value=x)
+
+    assert is_cacheable(Plugin().run) is True
+    # Opting in is enough, the cache doesn't also need to be configured
+    app = wrap_in_fastapi(func=Plugin().run, plugin_id="mock_plugin")
+    assert app.state.result_cache is not None
+
+
+def test_cache_hits_carry_no_usage():
+    def double(x: int, usage: list[UsageData]) -> Doubled:
+        usage.append(UsageData(name="doubles", value=1))
+        return Doubled(value=x * 2)
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=double, plugin_id="mock_plugin", result_cache_config=ResultCacheConfig()
+        )
+    )
+    first = client.post("/invoke", json={"x": 2}).json()
+    hit = client.post("/invoke", json={"x": 2}).json()
+    assert first["usage"] == [{"name": "doubles", "value": 1}]
+    # The plugin didn't run for the hit, there is no usage to report
+    assert hit["usage"] == []
+    assert hit["output"] == first["output"]
+
+
+def test_inputs_without_a_json_form_are_never_cached():
+    calls = []
+
+    async def total(values: AsyncIterator[int]) -> Doubled:
+        calls.append(1)
+        return Doubled(value=sum([value async for value in values]))
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=total,
+            plugin_id="mock_plugin",
+            decode_mode="native",
+            result_cache_config=ResultCacheConfig(),
+        )
+    )
+    # A stream has no json form, its repr could even match the one of a different stream
+    for values in ([1, 2], [1, 2], [3, 4], [5, 6]):
+        resp = client.post("/invoke", json={"values": values})
+        assert resp.json()["output"] == {"value": sum(values)}
+        assert CACHE_HEADER not in resp.headers
+    assert len(calls) == 4
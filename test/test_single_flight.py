@@ -0,0 +1,186 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from pydantic import BaseModel
+from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.single_flight import SingleFlight
+from unstructured_platform_plugins.schema import UsageData
+
+file_data = FileData(
+    identifier="doc",
+    connector_type="CON",
+    source_identifiers=SourceIdentifiers(filename="doc.txt", fullpath="doc.txt"),
+)
+
+
+class Doubled(BaseModel):
+    value: int
+
+
+def test_concurrent_callers_share_one_execution():
+    calls = []
+
+    async def invoke():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        flights = SingleFlight()
+        outcomes = await asyncio.gather(*(flights.run("key", invoke) for _ in range(3)))
+        # Once finished, the next caller runs it again
+        outcomes.append(await flights.run("key", invoke))
+        return outcomes, flights.stats()
+
+    outcomes, stats = asyncio.run(run())
+    assert outcomes == [("result", True), ("result", False), ("result", False), ("result", True)]
+    assert len(calls) == 2
+    assert (stats.in_flight, stats.started, stats.coalesced) == (0, 2, 2)
+
+
+def test_execution_is_cancelled_once_every_caller_left():
+    async def invoke():
+        await asyncio.sleep(10)
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.run("key", invoke))
+        second = asyncio.ensure_future(flights.run("key", invoke))
+        await asyncio.sleep(0)
+        flight = flights._flights["key"]
+        first.cancel()
+        await asyncio.sleep(0)
+        still_running = not flight.task.done()
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return still_running, flight.token.cancelled, flights.stats().in_flight
+
+    still_running, cancelled, in_flight = asyncio.run(run())
+    assert still_running
+    assert cancelled
+    assert in_flight == 0
+
+
+def test_late_subscribers_get_the_whole_stream():
+    async def frames():
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield b"%d" % i
+
+    async def invoke():
+        return frames()
+
+    async def read(stream) -> list[bytes]:
+        return [frame async for frame in stream]
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(read(flights.stream("key", invoke)))
+        await asyncio.sleep(0.015)
+        second = await read(flights.stream("key", invoke))
+        return await first, second, flights.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first == second == [b"0", b"1", b"2"]
+    assert stats.started == 1
+
+
+def test_frames_are_dropped_once_past_the_shared_limit():
+    started = []
+
+    async def frames():
+        started.append(1)
+        for i in range(4):
+            await asyncio.sleep(0.01)
+            yield b"%d" % i
+
+    async def invoke():
+        return frames()
+
+    async def run():
+        flights = SingleFlight(max_shared_bytes=2)
+        first = flights.stream("key", invoke)
+        assert await first.__anext__() == b"0"
+        flight = flights._flights["key"]
+        rest = [frame async for frame in first]
+        # Past the limit the stream took no new callers and kept no frame it had sent
+        late = [frame async for frame in flights.stream("key", invoke)]
+        return rest, late, flight, flights.stats()
+
+    rest, late, flight, stats = asyncio.run(run())
+    assert rest == [b"1", b"2", b"3"]
+    assert late == [b"0", b"1", b"2", b"3"]
+    assert (flight.frames, flight.first, flight.buffered_bytes) == ([], 4, 0)
+    assert (stats.started, stats.coalesced) == (2, 0)
+
+
+def test_streams_that_are_never_read_start_nothing():
+    async def invoke():
+        raise AssertionError("not read")
+
+    async def run():
+        flights = SingleFlight()
+        flights.stream("key", invoke)
+        await asyncio.sleep(0)
+        return flights.stats()
+
+    stats = asyncio.run(run())
+    assert (stats.in_flight, stats.started) == (0, 0)
+
+
+def _post_concurrently(app, bodies: list[dict]) -> list[httpx.Response]:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/invoke", json=body) for body in bodies))
+
+    return asyncio.run(run())
+
+
+def test_identical_invocations_are_coalesced():
+    calls = []
+
+    async def double(x: int) -> Doubled:
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return Doubled(value=x * 2)
+
+    app = wrap_in_fastapi(func=double, plugin_id="mock_plugin", single_flight=True)
+    responses = _post_concurrently(app, [{"x": 2}, {"x": 2}, {"x": 3}])
+    assert [r.json()["output"] for r in responses] == [{"value": 4}, {"value": 4}, {"value": 6}]
+    assert sorted(calls) == [2, 3]
+
+
+def test_only_the_caller_that_ran_the_plugin_reports_usage():
+    async def double(x: int, usage: list[UsageData]) -> Doubled:
+        usage.append(UsageData(name="doubles", value=1))
+        await asyncio.sleep(0.05)
+        return Doubled(value=x * 2)
+
+    app = wrap_in_fastapi(func=double, plugin_id="mock_plugin", single_flight=True)
+    responses = [r.json() for r in _post_concurrently(app, [{"x": 2}, {"x": 2}])]
+    assert sorted(len(r["usage"]) for r in responses) == [0, 1]
+    assert responses[0]["output"] == responses[1]["output"] == {"value": 4}
+
+
+@pytest.mark.parametrize("stream_protocol", ["full", "delta"])
+def test_streams_are_fanned_out(stream_protocol):
+    from test.assets.streaming_plugin import stream_chunks
+
+    app = wrap_in_fastapi(
+        func=stream_chunks,
+        plugin_id="mock_plugin",
+        stream_protocol=stream_protocol,
+        single_flight=True,
+    )
+    body = {"count": 3, "file_data": file_data.model_dump()}
+    responses = _post_concurrently(app, [body, body])
+    streams = [[json.loads(line) for line in r.text.splitlines() if line] for r in responses]
+    assert streams[0] == streams[1]
+    assert [frame["output"]["index"] for frame in streams[0][:3]] == [0, 1, 2]
+    assert app.state.single_flight.stats().coalesced == 1
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.stream_input import (
+    StreamedInput,
+    StreamedLineTooLongError,
+    read_lines,
+)
+from unstructured_platform_plugins.etl_uvicorn.utils import get_input_schema
+
+NDJSON = {"content-type": "application/x-ndjson"}
+
+
+class Record(BaseModel):
+    value: int
+
+
+class Total(BaseModel):
+    total: int
+    count: int
+
+
+async def sum_records(records: AsyncIterator[Record], scale: int = 1) -> Total:
+    total = count = 0
+    async for record in records:
+        total += record.value * scale
+        count += 1
+    return Total(total=total, count=count)
+
+
+async def scale_records(records: AsyncIterator[Record], scale: int = 1) -> AsyncIterator[Record]:
+    async for record in records:
+        yield Record(value=record.value * scale)
+
+
+def _ndjson(*lines: dict) -> bytes:
+    return b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(items) -> list:
+    return [item async for item in items]
+
+
+def test_lines_are_split_across_chunks():
+    lines = read_lines(_chunks(b'{"a":', b"1}\n\n{", b'"b":2}\r\n{"c":3}'))
+    assert asyncio.run(_collect(lines)) == [b'{"a":1}', b'{"b":2}', b'{"c":3}']
+
+
+def test_overlong_lines_are_rejected():
+    lines = read_lines(_chunks(b"x" * 8, b"x" * 8), max_line_bytes=10)
+    with pytest.raises(StreamedLineTooLongError):
+        asyncio.run(_collect(lines))
+
+
+def test_items_are_read_as_they_arrive():
+    events = []
+
+    async def chunks():
+        for i in range(3):
+            events.append(f"sent {i}")
+            yield b'{"value":%d}\n' % i
+
+    async def run():
+        head, items = await StreamedInput("records", Record).open(chunks())
+        async for item in items:
+            events.append(f"read {item.value}")
+        return head
+
+    head = asyncio.run(run())
+    # The first line holds the other inputs, every item is read before the next one is sent
+    assert head == b'{"value":0}'
+    assert events == ["sent 0", "sent 1", "read 1", "sent 2", "read 2"]
+
+
+def test_streamed_input_schema():
+    schema = get_input_schema(sum_records)
+    assert schema["properties"]["records"] == {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"value": {"type": "integer"}},
+            "required": ["value"],
+        },
+        "is_stream": True,
+    }
+
+
+@pytest.mark.parametrize("decode_mode", ["schema", "native"])
+def test_ndjson_body_feeds_the_stream(decode_mode):
+    app = wrap_in_fastapi(func=sum_records, plugin_id="mock_plugin", decode_mode=decode_mode)
+    client = TestClient(app)
+    body = _ndjson({"scale": 2}, *({"value": i} for i in range(5)))
+    resp = client.post("/invoke", content=body, headers=NDJSON)
+    assert resp.status_code == 200
+    assert resp.json()["output"] == {"total": 20, "count": 5}
+
+    # A regular json body sends the stream as an array
+    resp = client.post("/invoke", json={"records": [{"value": 1}, {"value": 2}]})
+    assert resp.status_code == 200
+    assert resp.json()["output"] == {"total": 3, "count": 2}
+
+
+@pytest.mark.parametrize("decode_mode", ["schema", "native"])
+def test_invalid_streamed_input(decode_mode):
+    app = wrap_in_fastapi(func=sum_records, plugin_id="mock_plugin", decode_mode=decode_mode)
+    client = TestClient(app)
+    resp = client.post("/invoke", content=_ndjson({"scale": "x"}), headers=NDJSON)
+    assert resp.status_code == 422
+    assert resp.json()["detail"][0]["loc"] == ["body", "scale"]
+
+    # Items are only validated once the plugin reads them, so a bad one fails the invocation
+    resp = client.post("/invoke", content=_ndjson({}, {"value": 1}, {"value": "x"}), headers=NDJSON)
+    assert resp.json()["status_code"] == 422
+    assert "invalid item 1 of records" in resp.json()["status_code_text"]
+
+
+def test_streamed_input_and_output():
+    app = wrap_in_fastapi(func=scale_records, plugin_id="mock_plugin")
+    body = _ndjson({"scale": 3}, *({"value": i} for i in range(3)))
+    resp = TestClient(app).post("/invoke", content=body, headers=NDJSON)
+    frames = [json.loads(line) for line in resp.iter_lines() if line]
+    assert [frame["output"] for frame in frames] == [{"value": 0}, {"value": 3}, {"value": 6}]
+
+
+def test_streamed_input_needs_an_async_plugin():
+    def sync_sum(records: AsyncIterator[Record]) -> Total:
+        return Total(total=0, count=0)
+
+    with pytest.raises(Exception, match="can only be read by async plugins"):
+        wrap_in_fastapi(func=sync_sum, plugin_id="mock_plugin")
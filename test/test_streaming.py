@@ -0,0 +1,369 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Optional
+
+from fastapi.testclient import TestClient
+from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+from unstructured_platform_plugins.etl_uvicorn.executors import ExecutorConfig
+from unstructured_platform_plugins.etl_uvicorn.streaming import (
+    CoalesceConfig,
+    MetadataDelta,
+    StreamPrefetcher,
+    coalesce,
+    iterate_in_thread,
+)
+from unstructured_platform_plugins.schema import FileDataMeta, MessageChannels, UsageData
+
+file_data = FileData(
+    identifier="doc",
+    connector_type="CON",
+    source_identifiers=SourceIdentifiers(filename="doc.txt", fullpath="doc.txt"),
+)
+
+
+def _frames(resp) -> list[dict]:
+    return [json.loads(line) for line in resp.iter_lines() if line]
+
+
+def test_metadata_delta_only_returns_what_is_new():
+    usage = [UsageData(name="a", value=1)]
+    message_channels = MessageChannels(infos=["first"])
+    filedata_meta = FileDataMeta()
+    delta = MetadataDelta()
+    new_usage, new_message_channels, _ = delta.take(usage, message_channels, filedata_meta)
+    assert new_usage == usage
+    assert new_message_channels.infos == ["first"]
+
+    usage.append(UsageData(name="b", value=2))
+    message_channels.warnings.append("careful")
+    filedata_meta.terminate_current = True
+    new_usage, new_message_channels, new_filedata_meta = delta.take(
+        usage, message_channels, filedata_meta
+    )
+    assert new_usage == [UsageData(name="b", value=2)]
+    assert new_message_channels.infos == []
+    assert new_message_channels.warnings == ["careful"]
+    assert new_filedata_meta.terminate_current
+
+
+def test_delta_stream_protocol():
+    from test.assets.streaming_plugin import stream_chunks
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=stream_chunks,
+            plugin_id="mock_plugin",
+            stream_protocol="delta",
+        )
+    )
+    resp = client.post("/invoke", json={"count": 3, "file_data": file_data.model_dump()})
+    *chunks, summary = _frames(resp)
+    assert [chunk["output"] for chunk in chunks] == [{"index": i} for i in range(3)]
+    for i, chunk in enumerate(chunks):
+        assert chunk["usage"] == [{"name": "chunks", "value": 1}]
+        assert chunk["message_channels"]["infos"] == [f"chunk {i}"]
+        assert [r["contents"] for r in chunk["filedata_meta"]["new_records"]] == [{"index": i}]
+        assert chunk["file_data"] is None
+
+    assert summary["status_code"] == 200
+    assert summary["output"] is None
+    assert len(summary["usage"]) == 3
+    assert summary["message_channels"]["infos"] == ["chunk 0", "chunk 1", "chunk 2"]
+    assert len(summary["filedata_meta"]["new_records"]) == 3
+    assert summary["file_data"]["identifier"] == "doc"
+
+
+def test_full_stream_protocol_repeats_metadata():
+    from test.assets.streaming_plugin import stream_chunks
+
+    client = TestClient(wrap_in_fastapi(func=stream_chunks, plugin_id="mock_plugin"))
+    resp = client.post("/invoke", json={"count": 3, "file_data": file_data.model_dump()})
+    frames = _frames(resp)
+    assert len(frames) == 3
+    assert [len(frame["usage"]) for frame in frames] == [1, 2, 3]
+    assert all(frame["file_data"]["identifier"] == "doc" for frame in frames)
+
+
+async def _frames_from(count: int, delay: float = 0, closed: Optional[list] = None):
+    try:
+        for i in range(count):
+            if delay:
+                await asyncio.sleep(delay)
+            yield b'{"i":%d}\n' % i
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def _collect(frames) -> list[bytes]:
+    async def run():
+        return [chunk async for chunk in frames]
+
+    return asyncio.run(run())
+
+
+def test_coalesce_by_item_count():
+    chunks = _collect(coalesce(_frames_from(10), CoalesceConfig(max_items=4)))
+    assert [chunk.count(b"\n") for chunk in chunks] == [4, 4, 2]
+    assert b"".join(chunks) == b"".join(b'{"i":%d}\n' % i for i in range(10))
+
+
+def test_coalesce_by_size():
+    chunks = _collect(coalesce(_frames_from(10), CoalesceConfig(max_bytes=16)))
+    assert [chunk.count(b"\n") for chunk in chunks] == [2, 2, 2, 2, 2]
+
+
+def test_coalesce_flushes_slow_streams_on_the_interval():
+    received = []
+
+    async def run():
+        start = time.perf_counter()
+        config = CoalesceConfig(flush_interval_ms=10)
+        async for chunk in coalesce(_frames_from(3, delay=0.05), config):
+            received.append((chunk, time.perf_counter() - start))
+
+    asyncio.run(run())
+    assert [chunk for chunk, _ in received] == [b'{"i":%d}\n' % i for i in range(3)]
+    # Each frame went out about one interval after it was produced, not with the next one
+    assert received[0][1] < 0.09
+
+
+def test_coalesce_closes_the_source_when_closed_early():
+    closed = []
+
+    async def run():
+        stream = coalesce(_frames_from(100, delay=0.01, closed=closed), CoalesceConfig())
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
+
+
+def test_coalesce_reads_at_most_one_full_chunk_ahead():
+    produced = []
+
+    async def frames():
+        for i in range(20):
+            produced.append(i)
+            yield b"x"
+
+    async def run():
+        stream = coalesce(frames(), CoalesceConfig(max_items=4))
+        first = await stream.__anext__()
+        # The client is slow, the plugin is only let ahead by the next full chunk
+        await asyncio.sleep(0.05)
+        read_ahead = len(produced)
+        await stream.aclose()
+        return first, read_ahead
+
+    first, read_ahead = asyncio.run(run())
+    assert first == b"xxxx"
+    assert read_ahead == 8
+
+
+def test_coalesce_sends_buffered_frames_before_the_error():
+    async def frames():
+        yield b"a"
+        yield b"b"
+        raise ValueError("plugin failed")
+
+    async def run():
+        chunks = []
+        try:
+            async for chunk in coalesce(frames(), CoalesceConfig()):
+                chunks.append(chunk)
+        except ValueError as e:
+            return chunks, e
+
+    chunks, error = asyncio.run(run())
+    assert chunks == [b"ab"]
+    assert str(error) == "plugin failed"
+
+
+def test_coalesced_plugin_stream():
+    from test.assets.streaming_plugin import stream_chunks
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=stream_chunks,
+            plugin_id="mock_plugin",
+            stream_protocol="delta",
+            coalesce_config=CoalesceConfig(max_items=2),
+        )
+    )
+    resp = client.post("/invoke", json={"count": 5, "file_data": file_data.model_dump()})
+    frames = _frames(resp)
+    assert [frame["output"] for frame in frames[:-1]] == [{"index": i} for i in range(5)]
+    assert len(frames[-1]["usage"]) == 5
+
+
+def test_prefetch_keeps_order():
+    prefetcher = StreamPrefetcher(size=4)
+    chunks = _collect(prefetcher.prefetch(_frames_from(10)))
+    assert chunks == [b'{"i":%d}\n' % i for i in range(10)]
+    assert prefetcher.stats().items == 10
+
+
+def test_prefetch_runs_ahead_up_to_its_size():
+    produced = []
+
+    async def frames():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    async def run():
+        stream = StreamPrefetcher(size=3).prefetch(frames())
+        await stream.__anext__()
+        # The client is not reading, the producer stops once the queue is full
+        await asyncio.sleep(0.05)
+        ahead = len(produced)
+        await stream.aclose()
+        return ahead
+
+    # The item handed out, a full queue, and the one waiting to be put
+    assert asyncio.run(run()) == 5
+
+
+def test_prefetch_forwards_producer_errors():
+    async def frames():
+        yield b"first\n"
+        raise RuntimeError("plugin failed")
+
+    received = []
+
+    async def run():
+        async for chunk in StreamPrefetcher(size=2).prefetch(frames()):
+            received.append(chunk)
+
+    try:
+        asyncio.run(run())
+    except RuntimeError as e:
+        assert str(e) == "plugin failed"
+    else:
+        raise AssertionError("the producer error was not raised")
+    assert received == [b"first\n"]
+
+
+def test_prefetch_closes_the_source_when_closed_early():
+    closed = []
+
+    async def run():
+        stream = StreamPrefetcher(size=2).prefetch(_frames_from(100, delay=0.01, closed=closed))
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
+
+
+def test_prefetched_plugin_stream():
+    from test.assets.streaming_plugin import stream_chunks
+
+    app = wrap_in_fastapi(
+        func=stream_chunks,
+        plugin_id="mock_plugin",
+        stream_protocol="delta",
+        stream_prefetch=2,
+    )
+    client = TestClient(app)
+    resp = client.post("/invoke", json={"count": 5, "file_data": file_data.model_dump()})
+    *chunks, summary = _frames(resp)
+    # Frames are encoded before they are queued, each keeps only its own metadata
+    assert [chunk["message_channels"]["infos"] for chunk in chunks] == [
+        [f"chunk {i}"] for i in range(5)
+    ]
+    assert len(summary["usage"]) == 5
+    assert app.state.stream_prefetcher.stats().items == 6
+
+
+def _in_default_executor(fn):
+    return asyncio.get_running_loop().run_in_executor(None, fn)
+
+
+def test_iterate_in_thread_pauses_the_generator_when_the_buffer_is_full():
+    produced = []
+
+    def numbers():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    async def run():
+        stream = iterate_in_thread(numbers, run=_in_default_executor, buffer_size=2)
+        assert await stream.__anext__() == 0
+        await asyncio.sleep(0.05)
+        ahead = len(produced)
+        rest = [i async for i in stream]
+        return ahead, rest
+
+    ahead, rest = asyncio.run(run())
+    # The item handed out, a full buffer, and the one waiting for a free slot
+    assert ahead == 4
+    assert rest == list(range(1, 20))
+
+
+def test_iterate_in_thread_forwards_generator_errors():
+    def numbers():
+        yield 1
+        raise RuntimeError("plugin failed")
+
+    received = []
+
+    async def run():
+        async for i in iterate_in_thread(numbers, run=_in_default_executor):
+            received.append(i)
+
+    try:
+        asyncio.run(run())
+    except RuntimeError as e:
+        assert str(e) == "plugin failed"
+    else:
+        raise AssertionError("the generator error was not raised")
+    assert received == [1]
+
+
+def test_iterate_in_thread_closes_the_generator_when_closed_early():
+    closed = threading.Event()
+
+    def numbers():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.set()
+
+    async def run():
+        stream = iterate_in_thread(numbers, run=_in_default_executor, buffer_size=1)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert closed.wait(timeout=1)
+
+
+def test_sync_generator_plugin_stream():
+    from test.assets.streaming_plugin import stream_chunks_sync
+
+    client = TestClient(
+        wrap_in_fastapi(
+            func=stream_chunks_sync,
+            plugin_id="mock_plugin",
+            stream_protocol="delta",
+            executor_config=ExecutorConfig(max_workers=1),
+        )
+    )
+    resp = client.post("/invoke", json={"count": 3, "file_data": file_data.model_dump()})
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    *chunks, summary = _frames(resp)
+    assert [chunk["output"] for chunk in chunks] == [{"index": i} for i in range(3)]
+    assert [chunk["message_channels"]["infos"] for chunk in chunks] == [
+        [f"chunk {i}"] for i in range(3)
+    ]
+    assert summary["status_code"] == 200
+    assert len(summary["usage"]) == 3
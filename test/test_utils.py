@@ -1,6 +1,7 @@
 import inspect
 from dataclasses import dataclass, is_dataclass
 from enum import Enum
+from typing import Any, Optional
 
 import pytest
 from pydantic import BaseModel
@@ -8,6 +9,7 @@ from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
 from uvicorn.importer import import_from_string
 
 from unstructured_platform_plugins.etl_uvicorn import utils
+from unstructured_platform_plugins.etl_uvicorn.converters import compile_input_converters
 
 
 def test_get_func_simple():
@@ -139,3 +141,46 @@ def test_map_inputs_error():
 
     with pytest.raises(ValueError):
         utils.map_inputs(func=fn, raw_inputs=inputs)
+
+
+def test_map_inputs_nested_containers():
+    def fn(a: list[A], b: dict[str, B], c: Optional[A] = None, d: Optional[A] = None) -> None:
+        pass
+
+    inputs = {
+        "a": [{"b": 1, "c": 1.5}, {"b": 2, "c": 2.5}],
+        "b": {"first": {"d": True, "e": {}}, "second": B(d=False, e={"k": "v"})},
+        "c": {"b": 3, "c": 3.5},
+        "d": None,
+    }
+
+    mapped_inputs = utils.map_inputs(func=fn, raw_inputs=inputs)
+    assert mapped_inputs == {
+        "a": [A(b=1, c=1.5), A(b=2, c=2.5)],
+        "b": {"first": B(d=True, e={}), "second": B(d=False, e={"k": "v"})},
+        "c": A(b=3, c=3.5),
+        "d": None,
+    }
+
+
+def test_compiled_converters_skip_plain_types():
+    def fn(a: int, b: list[str], c: dict[str, Any], d: MyEnum, e: A) -> None:
+        pass
+
+    converters = compile_input_converters(fn)
+    assert set(converters.converters) == {"e"}
+
+
+@dataclass
+class Nested:
+    items: list[A]
+    lookup: dict[str, B]
+
+
+def test_map_inputs_nested_dataclass_fields():
+    def fn(n: Nested) -> None:
+        pass
+
+    inputs = {"n": {"items": [{"b": 1, "c": 2.0}], "lookup": {"x": {"d": True, "e": {}}}}}
+    mapped_inputs = utils.map_inputs(func=fn, raw_inputs=inputs)
+    assert mapped_inputs["n"] == Nested(items=[A(b=1, c=2.0)], lookup={"x": B(d=True, e={})})
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from unstructured_ingest.data_types.file_data import FileData, SourceIdentifiers
+
+from unstructured_platform_plugins.etl_uvicorn.api_generator import wrap_in_fastapi
+
+file_data = FileData(
+    identifier="doc",
+    connector_type="CON",
+    source_identifiers=SourceIdentifiers(filename="doc.txt", fullpath="doc.txt"),
+)
+
+
+class _Square(BaseModel):
+    value: int
+
+
+async def _square(x: int, delay: float = 0) -> _Square:
+    await asyncio.sleep(delay)
+    return _Square(value=x * x)
+
+
+@pytest.mark.parametrize("decode_mode", ["schema", "native"])
+def test_invocations_are_correlated(decode_mode):
+    app = wrap_in_fastapi(
+        func=_square, plugin_id="mock_plugin", decode_mode=decode_mode, websocket=True
+    )
+    with TestClient(app).websocket_connect("/invoke/ws") as ws:
+        ws.send_json({"id": "slow", "body": {"x": 3, "delay": 0.1}})
+        ws.send_json({"id": 2, "body": {"x": 4}})
+        replies = [ws.receive_json() for _ in range(2)]
+
+    # Results come back as they complete, not in the order they were sent
+    assert [reply["id"] for reply in replies] == [2, "slow"]
+    assert all(reply["done"] for reply in replies)
+    assert [reply["response"]["output"]["value"] for reply in replies] == [16, 9]
+    assert all(reply["response"]["status_code"] == 200 for reply in replies)
+
+
+def test_invalid_messages_are_reported():
+    app = wrap_in_fastapi(func=_square, plugin_id="mock_plugin", websocket=True)
+    with TestClient(app).websocket_connect("/invoke/ws") as ws:
+        ws.send_json({"id": "a", "body": {"x": "not a number"}})
+        reply = ws.receive_json()
+        ws.send_text("not json")
+        unidentified = ws.receive_json()
+
+    assert reply["id"] == "a"
+    assert reply["response"]["status_code"] == 422
+    assert unidentified["id"] is None
+    assert unidentified["response"]["status_code"] == 422
+
+
+def test_cancelled_invocations_send_nothing():
+    app = wrap_in_fastapi(func=_square, plugin_id="mock_plugin", websocket=True)
+    with TestClient(app).websocket_connect("/invoke/ws") as ws:
+        ws.send_json({"id": "a", "body": {"x": 3, "delay": 10}})
+        ws.send_json({"id": "a", "cancel": True})
+        ws.send_json({"id": "b", "body": {"x": 2}})
+        reply = ws.receive_json()
+
+    assert reply["id"] == "b"
+    assert reply["response"]["output"] == {"value": 4}
+
+
+def test_streamed_invocations():
+    from test.assets.streaming_plugin import stream_chunks
+
+    app = wrap_in_fastapi(
+        func=stream_chunks, plugin_id="mock_plugin", stream_protocol="delta", websocket=True
+    )
+    with TestClient(app).websocket_connect("/invoke/ws") as ws:
+        ws.send_json({"id": "s", "body": {"count": 2, "file_data": file_data.model_dump()}})
+        replies = [ws.receive_json() for _ in range(4)]
+
+    assert all(reply["id"] == "s" for reply in replies)
+    assert [reply["done"] for reply in replies] == [False, False, False, True]
+    assert [reply["response"]["output"] for reply in replies[:2]] == [{"index": 0}, {"index": 1}]
+    # The summary frame of the delta protocol, then the end of the invocation
+    assert replies[2]["response"]["file_data"]["identifier"] == "doc"
+    assert "response" not in replies[3]
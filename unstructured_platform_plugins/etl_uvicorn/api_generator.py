@@ -3,13 +3,18 @@ import hashlib
 import inspect
 import json
 import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
 from functools import partial
-from typing import Any, Callable, Optional, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union, get_args
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from pydantic import BaseModel, Field, create_model
+from pydantic import BaseModel, Field, ValidationError, create_model
+from pydantic_core import PydanticSerializationError
 from starlette.responses import RedirectResponse
 from typing_extensions import deprecated
 from unstructured_ingest.data_types.file_data import BatchFileData, FileData, file_data_from_dict
@@ -17,16 +22,112 @@ from unstructured_ingest.error import UnstructuredIngestError
 from uvicorn.config import LOG_LEVELS
 from uvicorn.importer import import_from_string
 
-from unstructured_platform_plugins.etl_uvicorn.otel import get_metric_provider, get_trace_provider
+from unstructured_platform_plugins.etl_uvicorn.batching import MicroBatchConfig, MicroBatcher
+from unstructured_platform_plugins.etl_uvicorn.cancellation import (
+    CancellationTracker,
+    CancelOnDisconnectMiddleware,
+    DeadlineMiddleware,
+    current_cancellation_token,
+)
+from unstructured_platform_plugins.etl_uvicorn.concurrency import (
+    AdmissionConfig,
+    AdmissionController,
+    AdmissionMiddleware,
+)
+from unstructured_platform_plugins.etl_uvicorn.converters import compile_input_converters
+from unstructured_platform_plugins.etl_uvicorn.decoding import (
+    DecodeMode,
+    NativeDecoder,
+    decode_json_array,
+    request_validation_error,
+    validate_batch_item,
+)
+from unstructured_platform_plugins.etl_uvicorn.encoding import (
+    EncodeMode,
+    ListOutputEncoder,
+    ResponseEncoder,
+    get_list_element_type,
+)
+from unstructured_platform_plugins.etl_uvicorn.executors import ExecutorConfig, PluginExecutor
+from unstructured_platform_plugins.etl_uvicorn.idempotency import (
+    IDEMPOTENT_REPLAYED_HEADER,
+    IdempotencyConfig,
+    IdempotencyKeyConflictError,
+    IdempotencyKeyMiddleware,
+    IdempotencyKeyReusedError,
+    IdempotencyStore,
+    current_idempotency_key,
+)
+from unstructured_platform_plugins.etl_uvicorn.incremental import (
+    INCREMENTAL_HEADER,
+    IncrementalConfig,
+    IncrementalIndex,
+)
+from unstructured_platform_plugins.etl_uvicorn.invocation import (
+    INJECTABLES,
+    STREAMING_CALL_STYLES,
+    CallStyle,
+    InvocationPlan,
+    build_invocation_plan,
+    get_call_style,
+)
+from unstructured_platform_plugins.etl_uvicorn.otel import (
+    get_meter,
+    get_metric_provider,
+    get_trace_provider,
+)
+from unstructured_platform_plugins.etl_uvicorn.process_pool import (
+    PluginProcessPool,
+    ProcessPoolConfig,
+)
+from unstructured_platform_plugins.etl_uvicorn.replay import (
+    LAST_EVENT_ID_HEADER,
+    STREAM_ID_HEADER,
+    ReplayConfig,
+    ReplayFramesLostError,
+    ReplayStore,
+)
+from unstructured_platform_plugins.etl_uvicorn.result_cache import (
+    CACHE_HEADER,
+    ResultCache,
+    ResultCacheConfig,
+    canonical_hash,
+    is_cacheable,
+)
+from unstructured_platform_plugins.etl_uvicorn.single_flight import SingleFlight
+from unstructured_platform_plugins.etl_uvicorn.stream_input import (
+    DuplexStreamingResponse,
+    NdjsonRoute,
+    get_streamed_input,
+)
+from unstructured_platform_plugins.etl_uvicorn.streaming import (
+    CoalesceConfig,
+    MetadataDelta,
+    StreamPrefetcher,
+    StreamProtocol,
+    capture_body,
+    coalesce,
+)
 from unstructured_platform_plugins.etl_uvicorn.utils import (
     get_func,
+    get_func_reference,
     get_input_schema,
     get_output_sig,
     get_plugin_id,
     get_schema_dict,
-    map_inputs,
+    get_sibling_func,
+)
+from unstructured_platform_plugins.etl_uvicorn.websocket import (
+    WebSocketSession,
+    invocation_message_model,
+)
+from unstructured_platform_plugins.schema import (
+    CancellationToken,
+    FileDataMeta,
+    MessageChannels,
+    NewRecord,
+    UsageData,
 )
-from unstructured_platform_plugins.schema import FileDataMeta, NewRecord, UsageData
 from unstructured_platform_plugins.schema.json_schema import (
     schema_to_base_model,
 )
@@ -41,12 +142,7 @@ class EtlApiException(Exception):
 logger = logging.getLogger("uvicorn.error")
 
 
-class MessageChannels(BaseModel):
-    infos: list[str] = Field(default_factory=list)
-    warnings: list[str] = Field(default_factory=list)
-
-
-def log_func_and_body(func: Callable, body: Optional[str] = None) -> None:
+def log_func_and_body(func: Callable, body: Optional[Union[str, bytes]] = None) -> None:
     msg = None
     if logger.level == LOG_LEVELS.get("debug", logging.NOTSET):
         if not body:
@@ -62,12 +158,10 @@ def log_func_and_body(func: Callable, body: Optional[str] = None) -> None:
         logger.log(level=logger.level, msg=msg)
 
 
-async def invoke_func(func: Callable, kwargs: Optional[dict[str, Any]] = None) -> Any:
-    kwargs = kwargs or {}
-    if inspect.iscoroutinefunction(func):
-        return await func(**kwargs)
-    else:
-        return await asyncio.get_event_loop().run_in_executor(None, partial(func, **kwargs))
+def json_request_body(schema: dict[str, Any], required: bool = True) -> dict[str, Any]:
+    # Documents the body of a route that reads the raw request, as FastAPI would from its signature
+    content = {"application/json": {"schema": schema}}
+    return {"requestBody": {"content": content, "required": required}}
 
 
 def check_precheck_func(precheck_func: Callable):
@@ -117,9 +211,51 @@ def wrap_in_fastapi(
     func: Callable,
     plugin_id: str,
     precheck_func: Optional[Callable] = None,
+    decode_mode: DecodeMode = "schema",
+    encode_mode: EncodeMode = "validated",
+    executor_config: Optional[ExecutorConfig] = None,
+    process_pool_config: Optional[ProcessPoolConfig] = None,
+    batch_func: Optional[Callable] = None,
+    batch_config: Optional[MicroBatchConfig] = None,
+    invoke_batch_concurrency: int = 16,
+    admission_config: Optional[AdmissionConfig] = None,
+    cancel_on_disconnect: bool = False,
+    stream_protocol: StreamProtocol = "full",
+    coalesce_config: Optional[CoalesceConfig] = None,
+    stream_prefetch: Optional[int] = None,
+    stream_list_output: bool = False,
+    replay_config: Optional[ReplayConfig] = None,
+    websocket: bool = False,
+    result_cache_config: Optional[ResultCacheConfig] = None,
+    single_flight: bool = False,
+    idempotency_config: Optional[IdempotencyConfig] = None,
+    incremental_config: Optional[IncrementalConfig] = None,
 ) -> FastAPI:
     try:
-        return _wrap_in_fastapi(func=func, plugin_id=plugin_id, precheck_func=precheck_func)
+        return _wrap_in_fastapi(
+            func=func,
+            plugin_id=plugin_id,
+            precheck_func=precheck_func,
+            decode_mode=decode_mode,
+            encode_mode=encode_mode,
+            executor_config=executor_config,
+            process_pool_config=process_pool_config,
+            batch_func=batch_func,
+            batch_config=batch_config,
+            invoke_batch_concurrency=invoke_batch_concurrency,
+            admission_config=admission_config,
+            cancel_on_disconnect=cancel_on_disconnect,
+            stream_protocol=stream_protocol,
+            coalesce_config=coalesce_config,
+            stream_prefetch=stream_prefetch,
+            stream_list_output=stream_list_output,
+            replay_config=replay_config,
+            websocket=websocket,
+            result_cache_config=result_cache_config,
+            single_flight=single_flight,
+            idempotency_config=idempotency_config,
+            incremental_config=incremental_config,
+        )
     except Exception as e:
         logger.error(f"failed to wrap function in FastAPI: {e}", exc_info=True)
         raise EtlApiException(e) from e
@@ -129,14 +265,65 @@ def _wrap_in_fastapi(
     func: Callable,
     plugin_id: str,
     precheck_func: Optional[Callable] = None,
+    decode_mode: DecodeMode = "schema",
+    encode_mode: EncodeMode = "validated",
+    executor_config: Optional[ExecutorConfig] = None,
+    process_pool_config: Optional[ProcessPoolConfig] = None,
+    batch_func: Optional[Callable] = None,
+    batch_config: Optional[MicroBatchConfig] = None,
+    invoke_batch_concurrency: int = 16,
+    admission_config: Optional[AdmissionConfig] = None,
+    cancel_on_disconnect: bool = False,
+    stream_protocol: StreamProtocol = "full",
+    coalesce_config: Optional[CoalesceConfig] = None,
+    stream_prefetch: Optional[int] = None,
+    stream_list_output: bool = False,
+    replay_config: Optional[ReplayConfig] = None,
+    websocket: bool = False,
+    result_cache_config: Optional[ResultCacheConfig] = None,
+    single_flight: bool = False,
+    idempotency_config: Optional[IdempotencyConfig] = None,
+    incremental_config: Optional[IncrementalConfig] = None,
 ) -> FastAPI:
     if precheck_func is not None:
         check_precheck_func(precheck_func=precheck_func)
 
     logger.debug(f"set static id response to: {plugin_id}")
 
-    fastapi_app = FastAPI()
+    # Resources owned by the app, released in reverse order when it shuts down
+    shutdown_callbacks: list[Callable[[], Any]] = []
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        for callback in reversed(shutdown_callbacks):
+            result = callback()
+            if inspect.isawaitable(result):
+                await result
+
+    fastapi_app = FastAPI(lifespan=lifespan)
+    meter_provider = get_metric_provider()
+    meter = get_meter("unstructured_platform_plugins.etl_uvicorn", meter_provider=meter_provider)
 
+    # Middleware added last runs first: deadline check, then admission, then disconnect watching
+    cancellation_tracker = CancellationTracker()
+    cancellation_tracker.register_metrics(meter)
+    fastapi_app.state.cancellation_tracker = cancellation_tracker
+    if cancel_on_disconnect:
+        # Abandoned requests stop running the plugin instead of burning cpu for no one
+        fastapi_app.add_middleware(CancelOnDisconnectMiddleware, tracker=cancellation_tracker)
+
+    admission_controller = None
+    if admission_config is not None:
+        # Requests over the limit are turned away before their body is even read
+        admission_controller = AdmissionController(admission_config)
+        admission_controller.register_metrics(meter)
+        fastapi_app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+    fastapi_app.state.admission_controller = admission_controller
+
+    fastapi_app.add_middleware(DeadlineMiddleware, tracker=cancellation_tracker)
+
+    call_style = get_call_style(func)
     response_type = get_output_sig(func)
     filedata_meta_model = update_filedata_model(response_type)
 
@@ -149,68 +336,289 @@ def _wrap_in_fastapi(
         output: Optional[response_type] = None
         message_channels: MessageChannels = Field(default_factory=MessageChannels)
 
-    input_schema = get_input_schema(func, omit=["usage", "filedata_meta", "message_channels"])
+    def serialization_fallback(
+        response: InvokeResponse, error: PydanticSerializationError
+    ) -> InvokeResponse:
+        logger.error(f"failed to serialize plugin response: {error}", exc_info=True)
+        return InvokeResponse.model_construct(
+            usage=response.usage,
+            message_channels=response.message_channels,
+            filedata_meta=response.filedata_meta,
+            file_data=response.file_data,
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code_text=f"[{error.__class__.__name__}] {error}",
+        )
+
+    response_encoder = ResponseEncoder(InvokeResponse, fallback=serialization_fallback)
+    list_output_encoder = None
+    if stream_list_output:
+        element_type = get_list_element_type(response_type)
+        if element_type is None:
+            raise ValueError(f"incremental encoding needs a list output, found: {response_type}")
+        if encode_mode == "validated":
+            raise ValueError("incremental encoding is only supported with the trusted encode mode")
+        # Large lists are written out element by element instead of as one json string
+        list_output_encoder = ListOutputEncoder(response_encoder, element_type)
+
+    new_record_model = get_args(filedata_meta_model.model_fields["new_records"].annotation)[0]
+
+    def construct_filedata_meta(filedata_meta: FileDataMeta) -> FileDataMeta:
+        # Same values, but of the classes the response serializer was compiled for
+        new_records = [
+            new_record_model.model_construct(**vars(record)) for record in filedata_meta.new_records
+        ]
+        return filedata_meta_model.model_construct(
+            **{**vars(filedata_meta), "new_records": new_records}
+        )
+
+    def make_response(filedata_meta: FileDataMeta, **kwargs: Any) -> InvokeResponse:
+        if encode_mode == "validated":
+            return InvokeResponse(
+                filedata_meta=filedata_meta_model.model_validate(filedata_meta.model_dump()),
+                **kwargs,
+            )
+        # The plugin output is trusted to match its own signature, the compiled serializer is
+        # the only pass made over it.
+        return InvokeResponse.model_construct(
+            filedata_meta=construct_filedata_meta(filedata_meta), **kwargs
+        )
+
+    def encode_frame(response: InvokeResponse) -> bytes:
+        return response_encoder.to_json(response) + b"\n"
+
+    stream_prefetcher = None
+    if stream_prefetch is not None:
+        stream_prefetcher = StreamPrefetcher(size=stream_prefetch)
+        stream_prefetcher.register_metrics(meter)
+    fastapi_app.state.stream_prefetcher = stream_prefetcher
+
+    replay_store = None
+    if replay_config is not None and call_style in STREAMING_CALL_STYLES:
+        # Streams run to completion in the background and a client that lost its connection
+        # picks up from the last frame it received
+        replay_store = ReplayStore(replay_config)
+        replay_store.register_metrics(meter)
+        shutdown_callbacks.append(replay_store.shutdown)
+    fastapi_app.state.replay_store = replay_store
+
+    def stream_frames(frames: AsyncIterator[bytes], resumable: bool = False) -> StreamingResponse:
+        if resumable and replay_store is not None:
+            # The buffer already decouples the plugin from the client, it needs no prefetching
+            buffer = replay_store.start(frames)
+            frames = buffer.read()
+            if coalesce_config is not None:
+                frames = coalesce(frames, coalesce_config)
+            return StreamingResponse(
+                frames,
+                media_type="application/x-ndjson",
+                headers={STREAM_ID_HEADER: buffer.stream_id},
+            )
+        if stream_prefetcher is not None:
+            # Frames are encoded as they are produced, so each one still carries the metadata of
+            # its own point in the stream
+            frames = stream_prefetcher.prefetch(frames)
+        if coalesce_config is not None:
+            frames = coalesce(frames, coalesce_config)
+        return StreamingResponse(frames, media_type="application/x-ndjson")
+
+    def encode_response(response: Any) -> Any:
+        if encode_mode == "validated" or not isinstance(response, InvokeResponse):
+            return response
+        if list_output_encoder is not None:
+            return list_output_encoder.encode(response)
+        return response_encoder.encode(response)
+
+    input_schema = get_input_schema(func, omit=list(INJECTABLES))
     input_schema_model = schema_to_base_model(input_schema)
+    input_converters = compile_input_converters(func)
+    streamed_input = get_streamed_input(func, omit=list(INJECTABLES))
+    if streamed_input is not None and call_style not in (
+        CallStyle.COROUTINE,
+        CallStyle.ASYNC_GENERATOR,
+    ):
+        raise ValueError(f"streamed input {streamed_input.name} can only be read by async plugins")
+
+    result_cache = None
+    cacheable = is_cacheable(func)
+    if cacheable and result_cache_config is None:
+        result_cache_config = ResultCacheConfig()
+    if result_cache_config is not None and cacheable is not False:
+        if call_style in STREAMING_CALL_STYLES or streamed_input is not None:
+            logger.warning(
+                "result cache is not supported for streamed inputs or outputs, not caching"
+            )
+        else:
+            # Repeats of an invocation with the same inputs are answered without running the plugin
+            result_cache = ResultCache(plugin_id, result_cache_config)
+            result_cache.register_metrics(meter)
+            shutdown_callbacks.append(result_cache.clear)
+    fastapi_app.state.result_cache = result_cache
+
+    flights = None
+    if single_flight:
+        if streamed_input is not None:
+            logger.warning("single flight is not supported for streamed inputs, not coalescing")
+        else:
+            # Identical requests arriving while one is running wait for it instead of running too
+            flights = SingleFlight()
+            flights.register_metrics(meter)
+            shutdown_callbacks.append(flights.shutdown)
+    fastapi_app.state.single_flight = flights
+
+    idempotency_store = None
+    if idempotency_config is not None:
+        if call_style in STREAMING_CALL_STYLES or streamed_input is not None:
+            logger.warning(
+                "idempotency keys are not supported for streamed inputs or outputs, ignoring them"
+            )
+        else:
+            # Retries naming the invocation they repeat get its response, even after a restart
+            idempotency_store = IdempotencyStore(plugin_id, idempotency_config)
+            idempotency_store.register_metrics(meter)
+            shutdown_callbacks.append(idempotency_store.close)
+            fastapi_app.add_middleware(IdempotencyKeyMiddleware)
+    fastapi_app.state.idempotency_store = idempotency_store
+
+    incremental_index = None
+    if incremental_config is not None:
+        if call_style in STREAMING_CALL_STYLES or streamed_input is not None:
+            logger.warning("incremental mode is not supported for streamed inputs or outputs")
+        else:
+            # Files seen before at the same version aren't processed again
+            incremental_index = IncrementalIndex(plugin_id, incremental_config)
+            incremental_index.register_metrics(meter)
+            shutdown_callbacks.append(incremental_index.close)
+    fastapi_app.state.incremental_index = incremental_index
 
     logging.getLogger("etl_uvicorn.fastapi")
 
-    ResponseType = StreamingResponse if inspect.isasyncgenfunction(func) else InvokeResponse
+    ResponseType = StreamingResponse if call_style in STREAMING_CALL_STYLES else InvokeResponse
+
+    # Resolve everything about the wrapped functions up front so a request only runs the plan
+    executor = None
+    if process_pool_config is not None:
+        if executor_config is not None:
+            raise ValueError("a plugin can run on either a thread pool or a process pool, not both")
+        if call_style is not CallStyle.SYNC:
+            raise ValueError("process pool execution only supports sync, non-streaming plugins")
+        executor = PluginProcessPool(process_pool_config)
+        shutdown_callbacks.append(partial(executor.shutdown, wait=False))
+    elif executor_config is not None and call_style in (CallStyle.SYNC, CallStyle.SYNC_GENERATOR):
+        executor = PluginExecutor(executor_config)
+        executor.register_metrics(meter)
+        shutdown_callbacks.append(partial(executor.shutdown, wait=False))
+    fastapi_app.state.executor = executor
 
-    async def wrap_fn(func: Callable, kwargs: Optional[dict[str, Any]] = None) -> ResponseType:
+    batcher = None
+    if batch_func is not None:
+        if call_style in STREAMING_CALL_STYLES:
+            raise ValueError("batching is not supported for streaming plugins")
+        if streamed_input is not None:
+            raise ValueError("batching is not supported for plugins with a streamed input")
+        if process_pool_config is not None:
+            raise ValueError("batching is not supported with process pool execution")
+        batcher = MicroBatcher(batch_func, config=batch_config, executor=executor)
+        batcher.register_metrics(meter)
+    fastapi_app.state.batcher = batcher
+
+    plan = build_invocation_plan(func, executor=executor, batcher=batcher)
+    precheck_plan = build_invocation_plan(precheck_func) if precheck_func is not None else None
+
+    def record_latency(plan: InvocationPlan, start: float) -> None:
+        # Only successful plugin invocations tell the adaptive limit how long the plugin takes
+        if admission_controller is not None and plan is not precheck_plan:
+            admission_controller.record_latency(time.perf_counter() - start)
+
+    async def wrap_fn(
+        plan: InvocationPlan, kwargs: Optional[dict[str, Any]] = None, raw_stream: bool = False
+    ) -> ResponseType:
         usage: list[UsageData] = []
         filedata_meta = FileDataMeta()
         message_channels = MessageChannels()
+        cancellation_token = current_cancellation_token() or CancellationToken()
+        if plan.is_streaming and replay_store is not None:
+            # A resumable stream outlives its connection, a disconnect must not cancel it
+            cancellation_token = CancellationToken(deadline=cancellation_token.deadline)
         request_dict = kwargs if kwargs else {}
-        if "usage" in inspect.signature(func).parameters:
-            request_dict["usage"] = usage
-        else:
+        if not plan.accepts("usage"):
             logger.warning("usage data not an expected parameter, omitting")
-        if "message_channels" in inspect.signature(func).parameters:
-            request_dict["message_channels"] = message_channels
-        if "filedata_meta" in inspect.signature(func).parameters:
-            request_dict["filedata_meta"] = filedata_meta
+        plan.inject(
+            request_dict,
+            usage=usage,
+            message_channels=message_channels,
+            filedata_meta=filedata_meta,
+            cancellation_token=cancellation_token,
+        )
         try:
-            if inspect.isasyncgenfunction(func):
-                # Stream response if function is an async generator
+            if plan.is_streaming:
+                # Stream response if function is a generator, sync ones run on the executor
                 async def _stream_response():
+                    delta = MetadataDelta() if stream_protocol == "delta" else None
+                    start = time.perf_counter()
                     try:
-                        async for output in func(**(request_dict or {})):
-                            yield (
-                                InvokeResponse(
-                                    usage=usage,
-                                    message_channels=message_channels,
-                                    filedata_meta=filedata_meta_model.model_validate(
-                                        filedata_meta.model_dump()
-                                    ),
+                        async for output in plan.stream(request_dict):
+                            if delta is None:
+                                yield encode_frame(
+                                    make_response(
+                                        usage=usage,
+                                        message_channels=message_channels,
+                                        filedata_meta=filedata_meta,
+                                        status_code=status.HTTP_200_OK,
+                                        output=output,
+                                        file_data=request_dict.get("file_data", None),
+                                    )
+                                )
+                                continue
+                            new_usage, new_message_channels, new_filedata_meta = delta.take(
+                                usage, message_channels, filedata_meta
+                            )
+                            yield encode_frame(
+                                make_response(
+                                    usage=new_usage,
+                                    message_channels=new_message_channels,
+                                    filedata_meta=new_filedata_meta,
                                     status_code=status.HTTP_200_OK,
                                     output=output,
-                                    file_data=request_dict.get("file_data", None),
-                                ).model_dump_json()
-                                + "\n"
+                                )
                             )
                     except Exception as e:
                         logger.error(f"Failure streaming response: {e}", exc_info=True)
-                        yield (
-                            InvokeResponse(
+                        yield encode_frame(
+                            make_response(
                                 usage=usage,
                                 message_channels=message_channels,
-                                filedata_meta=filedata_meta_model.model_validate(
-                                    filedata_meta.model_dump()
-                                ),
+                                filedata_meta=filedata_meta,
                                 status_code=getattr(e, "status_code", None)
                                 or status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 status_code_text=f"[{e.__class__.__name__}] {e}",
-                            ).model_dump_json()
-                            + "\n"
+                            )
                         )
+                    else:
+                        record_latency(plan, start)
+                        if delta is not None:
+                            # Summary of everything the stream accumulated
+                            yield encode_frame(
+                                make_response(
+                                    usage=usage,
+                                    message_channels=message_channels,
+                                    filedata_meta=filedata_meta,
+                                    status_code=status.HTTP_200_OK,
+                                    file_data=request_dict.get("file_data", None),
+                                )
+                            )
 
-                return StreamingResponse(_stream_response(), media_type="application/x-ndjson")
+                if raw_stream:
+                    # The caller frames the stream itself
+                    return _stream_response()
+                return stream_frames(_stream_response(), resumable=True)
             else:
-                output = await invoke_func(func=func, kwargs=request_dict)
-                return InvokeResponse(
+                start = time.perf_counter()
+                output = await plan.invoke(request_dict)
+                record_latency(plan, start)
+                return make_response(
                     usage=usage,
                     message_channels=message_channels,
-                    filedata_meta=filedata_meta_model.model_validate(filedata_meta.model_dump()),
+                    filedata_meta=filedata_meta,
                     status_code=status.HTTP_200_OK,
                     output=output,
                     file_data=request_dict.get("file_data", None),
@@ -219,10 +627,10 @@ def _wrap_in_fastapi(
             logger.error(
                 f"HTTPException: {exc.detail} (status_code={exc.status_code})", exc_info=True
             )
-            return InvokeResponse(
+            return make_response(
                 usage=usage,
                 message_channels=message_channels,
-                filedata_meta=filedata_meta_model.model_validate(filedata_meta.model_dump()),
+                filedata_meta=filedata_meta,
                 status_code=exc.status_code,
                 status_code_text=json.dumps(exc.detail)
                 if isinstance(exc.detail, dict)
@@ -234,28 +642,27 @@ def _wrap_in_fastapi(
                 f"UnstructuredIngestError: {str(exc)} (status_code={exc.status_code})",
                 exc_info=True,
             )
-            return InvokeResponse(
+            return make_response(
                 usage=usage,
                 message_channels=message_channels,
-                filedata_meta=filedata_meta_model.model_validate(filedata_meta.model_dump()),
+                filedata_meta=filedata_meta,
                 status_code=exc.status_code or status.HTTP_500_INTERNAL_SERVER_ERROR,
                 status_code_text=str(exc),
                 file_data=request_dict.get("file_data", None),
             )
         except Exception as invoke_error:
             logger.error(f"failed to invoke plugin: {invoke_error}", exc_info=True)
-            return InvokeResponse(
+            return make_response(
                 usage=usage,
                 message_channels=message_channels,
-                filedata_meta=filedata_meta_model.model_validate(filedata_meta.model_dump()),
+                filedata_meta=filedata_meta,
                 status_code=getattr(invoke_error, "status_code", None)
                 or status.HTTP_500_INTERNAL_SERVER_ERROR,
                 status_code_text=f"[{invoke_error.__class__.__name__}] {invoke_error}",
                 file_data=request_dict.get("file_data", None),
             )
 
-    async def run_job_with_body(request: BaseModel) -> ResponseType:
-        log_func_and_body(func=func, body=request.json())
+    def request_to_kwargs(request: BaseModel) -> dict[str, Any]:
         # Create dictionary from pydantic model while preserving underlying types
         request_dict = {f: getattr(request, f) for f in request.model_fields}
         # Make sure nested classes get instantiated correctly. `file_data` can legitimately be None
@@ -265,10 +672,121 @@ def _wrap_in_fastapi(
         file_data = request_dict.get("file_data")
         if file_data is not None:
             request_dict["file_data"] = file_data_from_dict(file_data.model_dump())
-        map_inputs(func=func, raw_inputs=request_dict)
+        request_dict = input_converters.convert(request_dict)
         if logger.level == LOG_LEVELS.get("trace", logging.NOTSET):
             logger.log(level=logger.level, msg=f"passing inputs to function: {request_dict}")
-        return await wrap_fn(func=func, kwargs=request_dict)
+        return request_dict
+
+    async def run_job_with_body(request: BaseModel, raw_stream: bool = False) -> ResponseType:
+        log_func_and_body(func=func, body=request.json())
+        return await wrap_fn(plan=plan, kwargs=request_to_kwargs(request), raw_stream=raw_stream)
+
+    async def respond(kwargs: Optional[dict[str, Any]] = None) -> Any:
+        idempotency_key = current_idempotency_key() if idempotency_store is not None else None
+        if (
+            result_cache is None
+            and flights is None
+            and idempotency_key is None
+            and incremental_index is None
+        ):
+            return encode_response(await wrap_fn(plan=plan, kwargs=kwargs))
+        # Hashed before the invocation injects its own objects into the arguments
+        key = canonical_hash(plugin_id, kwargs or {})
+        if key is None:
+            # Inputs that can't be compared are never answered with another invocation's response
+            logger.debug("inputs have no json form, not caching or deduplicating the invocation")
+            return encode_response(await wrap_fn(plan=plan, kwargs=kwargs))
+        if idempotency_key is None:
+            return await respond_by_hash(key, kwargs)
+        try:
+            stored = await idempotency_store.get(idempotency_key, key)
+            if stored is not None:
+                return Response(
+                    stored,
+                    media_type="application/json",
+                    headers={IDEMPOTENT_REPLAYED_HEADER: "true"},
+                )
+            async with idempotency_store.claim(idempotency_key):
+                return await respond_by_hash(key, kwargs, idempotency_key=idempotency_key)
+        except (IdempotencyKeyConflictError, IdempotencyKeyReusedError) as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e)) from e
+
+    async def respond_by_hash(
+        key: str, kwargs: Optional[dict[str, Any]], idempotency_key: Optional[str] = None
+    ) -> Any:
+        file_version = None
+        if incremental_index is not None:
+            file_version = incremental_index.version_of(kwargs or {})
+        if file_version is not None:
+            previous = await incremental_index.lookup(file_version)
+            if previous is not None:
+                return respond_unchanged(previous, kwargs)
+        if result_cache is not None:
+            cached = result_cache.get(key)
+            if cached is not None:
+                return Response(
+                    cached, media_type="application/json", headers={CACHE_HEADER: "hit"}
+                )
+        if flights is None:
+            response = await wrap_fn(plan=plan, kwargs=kwargs)
+        elif plan.is_streaming:
+            frames = flights.stream(
+                key, partial(wrap_fn, plan=plan, kwargs=kwargs, raw_stream=True)
+            )
+            return stream_frames(frames, resumable=True)
+        else:
+            response, started = await flights.run(key, partial(wrap_fn, plan=plan, kwargs=kwargs))
+            if not started:
+                # Only the caller that ran the plugin reports its usage
+                response = response.model_copy(deep=True, update={"usage": []})
+        encoded = encode_response(response)
+        if response.status_code != status.HTTP_200_OK:
+            # Failures run again when retried
+            return encoded
+        body = None
+        if isinstance(encoded, Response) and not isinstance(encoded, StreamingResponse):
+            body = encoded.body
+        if result_cache is not None:
+            result_cache.put(key, replay_body(response, body))
+        if idempotency_key is None and file_version is None:
+            return encoded
+
+        async def store(body: bytes) -> None:
+            if idempotency_key is not None:
+                await idempotency_store.put(idempotency_key, key, body)
+            if file_version is not None:
+                await incremental_index.record(file_version, replay_body(response, body))
+
+        if isinstance(encoded, StreamingResponse):
+            # Kept as it is sent rather than serialized a second time
+            encoded.body_iterator = capture_body(encoded.body_iterator, store)
+            return encoded
+        await store(body if body is not None else response_encoder.to_json(response))
+        return encoded
+
+    def replay_body(response: InvokeResponse, body: Optional[bytes]) -> bytes:
+        # A response served again didn't run the plugin, so it carries none of the usage the
+        # original invocation reported. The body sent to the client is reused if it had none.
+        if body is not None and not response.usage:
+            return body
+        return response_encoder.to_json(response.model_copy(update={"usage": []}))
+
+    def respond_unchanged(previous: bytes, kwargs: dict[str, Any]) -> Any:
+        headers = {INCREMENTAL_HEADER: "unchanged"}
+        if previous:
+            return Response(previous, media_type="application/json", headers=headers)
+        # Nothing was kept for the file, only that it's unchanged
+        response = make_response(
+            usage=[],
+            message_channels=MessageChannels(),
+            filedata_meta=FileDataMeta(),
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            status_code_text="file unchanged since it was last processed",
+            file_data=kwargs["file_data"],
+        )
+        return Response(
+            response_encoder.to_json(response), media_type="application/json", headers=headers
+        )
 
     # A pydantic body parameter with no default is mandatory even when every field inside the model
     # is optional. So a plugin whose parameters are ALL optional would demand a body that no caller
@@ -283,29 +801,255 @@ def _wrap_in_fastapi(
         field.is_required() for field in input_schema_model.model_fields.values()
     )
 
-    if body_is_optional:
+    if decode_mode == "native" and input_schema_model.model_fields:
+        # Read the raw body once straight into the function's own argument types, skipping the
+        # rebuilt schema model and the conversions that follow it.
+        native_decoder = NativeDecoder(func, omit=list(INJECTABLES))
+        native_schemas = native_decoder.openapi_schemas()
+        native_ref = {"$ref": f"#/components/schemas/{native_decoder.model.__name__}"}
+        build_openapi = fastapi_app.openapi
+
+        def openapi() -> dict[str, Any]:
+            if fastapi_app.openapi_schema is None:
+                components = build_openapi().setdefault("components", {})
+                for name, schema in native_schemas.items():
+                    components.setdefault("schemas", {}).setdefault(name, schema)
+            return fastapi_app.openapi_schema
+
+        fastapi_app.openapi = openapi
+
+    if streamed_input is not None:
+        # An ndjson body feeds the streamed parameter as it arrives, any other body is handled by
+        # the regular /invoke route below, with the stream sent as a json array
+        native_head = decode_mode == "native"
+        head_model = streamed_input.head_model(
+            native_decoder.model if native_head else input_schema_model
+        )
+
+        async def run_streamed_job(request: Request) -> Any:
+            head, items = await streamed_input.open(request.stream())
+            log_func_and_body(func=func, body=head)
+            try:
+                inputs = head_model.model_validate_json(head or b"{}")
+            except ValidationError as e:
+                raise request_validation_error(e, head) from e
+            if native_head:
+                request_dict = {name: getattr(inputs, name) for name in head_model.model_fields}
+            else:
+                request_dict = request_to_kwargs(inputs)
+            request_dict[streamed_input.name] = items
+            response = encode_response(await wrap_fn(plan=plan, kwargs=request_dict))
+            if isinstance(response, StreamingResponse):
+                # The plugin is still reading the body while its output streams back
+                return DuplexStreamingResponse.from_response(response)
+            return response
+
+        fastapi_app.router.add_api_route(
+            "/invoke",
+            run_streamed_job,
+            methods=["POST"],
+            response_model=InvokeResponse,
+            include_in_schema=False,
+            route_class_override=NdjsonRoute,
+        )
+
+    if decode_mode == "native" and input_schema_model.model_fields:
+
+        @fastapi_app.post(
+            "/invoke",
+            response_model=InvokeResponse,
+            openapi_extra=json_request_body(
+                native_ref, required=not native_decoder.body_is_optional
+            ),
+        )
+        async def run_job(request: Request) -> ResponseType:
+            body = await request.body()
+            log_func_and_body(func=func, body=body)
+            request_dict = native_decoder.decode(body)
+            if logger.level == LOG_LEVELS.get("trace", logging.NOTSET):
+                logger.log(level=logger.level, msg=f"passing inputs to function: {request_dict}")
+            return await respond(request_dict)
+
+    elif body_is_optional:
 
         @fastapi_app.post("/invoke", response_model=InvokeResponse)
         async def run_job(request: Optional[input_schema_model] = None) -> ResponseType:
-            return await run_job_with_body(
-                request if request is not None else input_schema_model()
-            )
+            if request is None:
+                request = input_schema_model()
+            log_func_and_body(func=func, body=request.json())
+            return await respond(request_to_kwargs(request))
 
     elif input_schema_model.model_fields:
 
         @fastapi_app.post("/invoke", response_model=InvokeResponse)
         async def run_job(request: input_schema_model) -> ResponseType:
-            return await run_job_with_body(request)
+            log_func_and_body(func=func, body=request.json())
+            return await respond(request_to_kwargs(request))
 
     else:
 
         @fastapi_app.post("/invoke", response_model=InvokeResponse)
         async def run_job() -> ResponseType:
             log_func_and_body(func=func)
-            return await wrap_fn(
-                func=func,
+            return await respond()
+
+    async def run_invoke_batch(
+        jobs: list[Callable[[], Awaitable[InvokeResponse]]], stream: bool
+    ) -> Any:
+        semaphore = asyncio.Semaphore(invoke_batch_concurrency)
+
+        async def run_item(index: int, job: Callable[[], Awaitable[InvokeResponse]]):
+            async with semaphore:
+                try:
+                    return index, await job()
+                except Exception as e:
+                    # Inputs that fail to validate or convert only fail their own item
+                    logger.error(f"failed to run batch item {index}: {e}", exc_info=True)
+                    if isinstance(e, RequestValidationError):
+                        status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+                    else:
+                        status_code = (
+                            getattr(e, "status_code", None) or status.HTTP_500_INTERNAL_SERVER_ERROR
+                        )
+                    return index, make_response(
+                        usage=[],
+                        message_channels=MessageChannels(),
+                        filedata_meta=FileDataMeta(),
+                        status_code=status_code,
+                        status_code_text=f"[{e.__class__.__name__}] {e}",
+                    )
+
+        tasks = [asyncio.ensure_future(run_item(i, job)) for i, job in enumerate(jobs)]
+        if not stream:
+            responses = [response for _, response in await asyncio.gather(*tasks)]
+            if encode_mode == "validated":
+                return responses
+            return response_encoder.encode_many(responses)
+
+        async def _stream_items():
+            # Items are written as soon as they finish, tagged with their position in the request
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    index, response = await next_done
+                    yield b'{"index":%d,"response":%s}\n' % (
+                        index,
+                        response_encoder.to_json(response),
+                    )
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return stream_frames(_stream_items())
+
+    async def reject_batch_item(error: RequestValidationError) -> InvokeResponse:
+        raise error
+
+    if plan.is_streaming:
+        # Streaming plugins already answer with a stream per input, there is no list to return
+        logger.debug("streaming plugin, not adding /invoke/batch")
+    elif decode_mode == "native" and input_schema_model.model_fields:
+
+        @fastapi_app.post(
+            "/invoke/batch",
+            response_model=list[InvokeResponse],
+            openapi_extra=json_request_body({"type": "array", "items": native_ref}, required=True),
+        )
+        async def run_batch_job(request: Request, stream: bool = False) -> Any:
+            body = await request.body()
+            log_func_and_body(func=func, body=body)
+            return await run_invoke_batch(
+                jobs=[
+                    partial(reject_batch_item, request_dict)
+                    if isinstance(request_dict, RequestValidationError)
+                    else partial(wrap_fn, plan=plan, kwargs=request_dict)
+                    for request_dict in native_decoder.decode_batch(body)
+                ],
+                stream=stream,
+            )
+
+    elif input_schema_model.model_fields:
+        # The raw array is read so that each item is validated on its own, an invalid item only
+        # fails its own response. The model is in the components already, /invoke takes it.
+        @fastapi_app.post(
+            "/invoke/batch",
+            response_model=list[InvokeResponse],
+            openapi_extra=json_request_body(
+                {
+                    "type": "array",
+                    "items": {"$ref": f"#/components/schemas/{input_schema_model.__name__}"},
+                }
+            ),
+        )
+        async def run_batch_job(request: Request, stream: bool = False) -> Any:
+            batch = [
+                validate_batch_item(input_schema_model, index, item)
+                for index, item in enumerate(decode_json_array(await request.body()))
+            ]
+            return await run_invoke_batch(
+                jobs=[
+                    partial(reject_batch_item, inputs)
+                    if isinstance(inputs, RequestValidationError)
+                    else partial(run_job_with_body, inputs)
+                    for inputs in batch
+                ],
+                stream=stream,
+            )
+
+    else:
+
+        @fastapi_app.post("/invoke/batch", response_model=list[InvokeResponse])
+        async def run_batch_job(requests: list[dict[str, Any]], stream: bool = False) -> Any:
+            log_func_and_body(func=func)
+            return await run_invoke_batch(
+                jobs=[partial(wrap_fn, plan=plan) for _ in requests],
+                stream=stream,
+            )
+
+    if websocket:
+        # Chatty callers keep one connection open and multiplex their invocations over it
+        if decode_mode == "native" and input_schema_model.model_fields:
+            message_model = invocation_message_model(native_decoder.model)
+
+            async def invoke_message(body: Optional[BaseModel]) -> Any:
+                return await wrap_fn(
+                    plan=plan, kwargs=native_decoder.decode_inputs(body), raw_stream=True
+                )
+
+        elif input_schema_model.model_fields:
+            message_model = invocation_message_model(input_schema_model)
+
+            async def invoke_message(body: Optional[BaseModel]) -> Any:
+                if body is None:
+                    body = input_schema_model()
+                return await run_job_with_body(body, raw_stream=True)
+
+        else:
+            message_model = invocation_message_model(dict[str, Any])
+
+            async def invoke_message(body: Optional[dict[str, Any]]) -> Any:
+                return await wrap_fn(plan=plan, raw_stream=True)
+
+        def message_error(error: Exception, status_code: int) -> InvokeResponse:
+            return make_response(
+                usage=[],
+                message_channels=MessageChannels(),
+                filedata_meta=FileDataMeta(),
+                status_code=status_code,
+                status_code_text=f"[{error.__class__.__name__}] {error}",
             )
 
+        @fastapi_app.websocket("/invoke/ws")
+        async def run_websocket_session(websocket: WebSocket) -> None:
+            await WebSocketSession(
+                websocket,
+                message_model=message_model,
+                invoke=invoke_message,
+                encode=response_encoder.to_json,
+                error_response=message_error,
+                concurrency=invoke_batch_concurrency,
+                admission_controller=admission_controller,
+            ).run()
+
     class SchemaOutputResponse(BaseModel):
         inputs: dict[str, Any]
         outputs: dict[str, Any]
@@ -327,8 +1071,8 @@ def _wrap_in_fastapi(
 
     @fastapi_app.get("/precheck")
     async def run_precheck() -> InvokePrecheckResponse:
-        if precheck_func:
-            fn_response = await wrap_fn(func=precheck_func)
+        if precheck_plan:
+            fn_response = await wrap_fn(plan=precheck_plan)
             return InvokePrecheckResponse(
                 status_code=fn_response.status_code,
                 status_code_text=fn_response.status_code_text,
@@ -341,6 +1085,40 @@ def _wrap_in_fastapi(
     async def get_id() -> str:
         return plugin_id
 
+    if replay_store is not None:
+
+        @fastapi_app.get("/invoke/stream/{stream_id}")
+        async def resume_stream(
+            stream_id: str, request: Request, last_event_id: Optional[int] = None
+        ) -> StreamingResponse:
+            header = request.headers.get(LAST_EVENT_ID_HEADER)
+            if header is not None:
+                try:
+                    last_event_id = int(header)
+                except ValueError:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"invalid {LAST_EVENT_ID_HEADER} header: {header}",
+                    )
+            buffer = replay_store.resume(stream_id)
+            if buffer is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"stream {stream_id} is unknown or has expired",
+                )
+            after = -1 if last_event_id is None else last_event_id
+            if after + 1 < buffer.first_seq:
+                raise HTTPException(
+                    status_code=ReplayFramesLostError.status_code,
+                    detail=f"frames after {after} of stream {stream_id} are no longer available",
+                )
+            frames = buffer.read(after)
+            if coalesce_config is not None:
+                frames = coalesce(frames, coalesce_config)
+            return StreamingResponse(
+                frames, media_type="application/x-ndjson", headers={STREAM_ID_HEADER: stream_id}
+            )
+
     # Run initial schema validation
     try:
         asyncio.run(get_schema())
@@ -348,7 +1126,7 @@ def _wrap_in_fastapi(
         raise TypeError(f"failed to validate function schema: {e}") from e
 
     FastAPIInstrumentor.instrument_app(
-        fastapi_app, tracer_provider=get_trace_provider(), meter_provider=get_metric_provider()
+        fastapi_app, tracer_provider=get_trace_provider(), meter_provider=meter_provider
     )
 
     return fastapi_app
@@ -361,9 +1139,37 @@ def generate_fast_api(
     id_method: Optional[str] = None,
     precheck_str: Optional[str] = None,
     precheck_method: Optional[str] = None,
+    decode_mode: DecodeMode = "schema",
+    encode_mode: EncodeMode = "validated",
+    executor_config: Optional[ExecutorConfig] = None,
+    process_pool_config: Optional[ProcessPoolConfig] = None,
+    instance_pool_size: Optional[int] = None,
+    batch_str: Optional[str] = None,
+    batch_method: Optional[str] = None,
+    batch_config: Optional[MicroBatchConfig] = None,
+    invoke_batch_concurrency: int = 16,
+    admission_config: Optional[AdmissionConfig] = None,
+    cancel_on_disconnect: bool = False,
+    stream_protocol: StreamProtocol = "full",
+    coalesce_config: Optional[CoalesceConfig] = None,
+    stream_prefetch: Optional[int] = None,
+    stream_list_output: bool = False,
+    replay_config: Optional[ReplayConfig] = None,
+    websocket: bool = False,
+    result_cache_config: Optional[ResultCacheConfig] = None,
+    single_flight: bool = False,
+    idempotency_config: Optional[IdempotencyConfig] = None,
+    incremental_config: Optional[IncrementalConfig] = None,
 ) -> FastAPI:
     instance = import_from_string(app)
-    func = get_func(instance, method_name)
+    if process_pool_config is not None:
+        # Only the workers run the plugin, the parent reads its signature without instantiating it
+        func = get_func_reference(instance, method_name)
+        if not process_pool_config.app:
+            # Worker processes import the plugin themselves from the same reference
+            process_pool_config = replace(process_pool_config, app=app, method_name=method_name)
+    else:
+        func = get_func(instance, method_name, pool_size=instance_pool_size)
     if id_str:
         id_ref = import_from_string(id_str)
         plugin_id = get_plugin_id(instance=id_ref, method_name=id_method)
@@ -376,7 +1182,40 @@ def generate_fast_api(
     if precheck_str:
         precheck_instance = import_from_string(precheck_str)
         precheck_func = get_func(precheck_instance, precheck_method)
+    elif precheck_method and inspect.isclass(instance) and process_pool_config is None:
+        # The precheck shares the instance (or instance pool) of the plugin method
+        precheck_func = get_sibling_func(func, precheck_method)
     elif precheck_method:
         precheck_func = get_func(instance, precheck_method)
 
-    return wrap_in_fastapi(func=func, plugin_id=plugin_id, precheck_func=precheck_func)
+    batch_func = None
+    if batch_str:
+        batch_func = get_func(import_from_string(batch_str), batch_method)
+    elif batch_method:
+        # The batch method shares the instance (or instance pool) of the plugin method
+        batch_func = get_sibling_func(func, batch_method)
+
+    return wrap_in_fastapi(
+        func=func,
+        plugin_id=plugin_id,
+        precheck_func=precheck_func,
+        decode_mode=decode_mode,
+        encode_mode=encode_mode,
+        executor_config=executor_config,
+        process_pool_config=process_pool_config,
+        batch_func=batch_func,
+        batch_config=batch_config,
+        invoke_batch_concurrency=invoke_batch_concurrency,
+        admission_config=admission_config,
+        cancel_on_disconnect=cancel_on_disconnect,
+        stream_protocol=stream_protocol,
+        coalesce_config=coalesce_config,
+        stream_prefetch=stream_prefetch,
+        stream_list_output=stream_list_output,
+        replay_config=replay_config,
+        websocket=websocket,
+        result_cache_config=result_cache_config,
+        single_flight=single_flight,
+        idempotency_config=idempotency_config,
+        incremental_config=incremental_config,
+    )
@@ -0,0 +1,156 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+
+from unstructured_platform_plugins.etl_uvicorn.executors import PluginExecutor, run_sync
+
+
+@dataclass
+class MicroBatchConfig:
+    max_batch_size: int = 32
+    # How long the first request of a batch waits for others to join it
+    max_wait_ms: float = 5.0
+    # When set, the batch size is adapted to keep each batch call close to this latency
+    target_latency_ms: Optional[float] = None
+
+
+@dataclass
+class MicroBatchStats:
+    batch_size_limit: int
+    pending: int
+    batches: int
+    items: int
+
+
+class MicroBatcher:
+    """Collects concurrent invocations into calls of the plugin's batch function.
+
+    The batch function takes a list of keyword argument dicts, one per request and including the
+    request's own `usage`/`message_channels`/`filedata_meta` if the plugin accepts those, and
+    returns a list of outputs in the same order. An output that is an exception instance fails only
+    the request it belongs to.
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable,
+        config: Optional[MicroBatchConfig] = None,
+        executor: Optional[PluginExecutor] = None,
+    ):
+        self.batch_func = batch_func
+        self.config = config or MicroBatchConfig()
+        if self.config.max_batch_size < 1:
+            raise ValueError(f"max batch size must be at least 1, got {self.config.max_batch_size}")
+        self.executor = executor
+        self.is_async = inspect.iscoroutinefunction(batch_func)
+        self.batch_size_limit = self.config.max_batch_size
+        self._pending: list[tuple[dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._batches = 0
+        self._items = 0
+
+    async def submit(self, kwargs: dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((kwargs, future))
+        if len(self._pending) >= self.batch_size_limit:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.config.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.batch_size_limit]
+            del self._pending[: self.batch_size_limit]
+            # Requests that went away while waiting don't need to be computed
+            batch = [(kwargs, future) for kwargs, future in batch if not future.done()]
+            if not batch:
+                continue
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            # Whatever is left over waits for the next batch to fill or the timer to fire
+            if len(self._pending) < self.batch_size_limit:
+                break
+        if self._pending:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.config.max_wait_ms / 1000, self._flush)
+
+    async def _call(self, inputs: list[dict[str, Any]]) -> list[Any]:
+        if self.is_async:
+            return await self.batch_func(inputs)
+        # Like a single invocation, a pooled instance is leased before the call takes a thread, and
+        # the call sees the context variables of the request that flushed the batch
+        return await run_sync(self.executor, self.batch_func, inputs)
+
+    async def _run_batch(self, batch: list[tuple[dict[str, Any], asyncio.Future]]) -> None:
+        start = time.perf_counter()
+        try:
+            outputs = await self._call([kwargs for kwargs, _ in batch])
+            if len(outputs) != len(batch):
+                raise ValueError(
+                    f"batch function returned {len(outputs)} outputs for {len(batch)} inputs"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._batches += 1
+            self._items += len(batch)
+            self._adapt(latency_ms=(time.perf_counter() - start) * 1000, batch_size=len(batch))
+        for (_, future), output in zip(batch, outputs):
+            if future.done():
+                continue
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    def _adapt(self, latency_ms: float, batch_size: int) -> None:
+        # Additive increase while batches stay under the target, multiplicative decrease above it
+        target = self.config.target_latency_ms
+        if target is None:
+            return
+        if latency_ms > target:
+            self.batch_size_limit = max(1, int(self.batch_size_limit * 0.75))
+        elif batch_size >= self.batch_size_limit:
+            self.batch_size_limit = min(self.config.max_batch_size, self.batch_size_limit + 1)
+
+    def stats(self) -> MicroBatchStats:
+        return MicroBatchStats(
+            batch_size_limit=self.batch_size_limit,
+            pending=len(self._pending),
+            batches=self._batches,
+            items=self._items,
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.batching.batch_size_limit",
+            callbacks=[observe("batch_size_limit")],
+            description="Current maximum number of requests per batch call",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.batching.batches",
+            callbacks=[observe("batches")],
+            description="Batch calls made to the plugin",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.batching.items",
+            callbacks=[observe("items")],
+            description="Requests served through batch calls",
+        )
@@ -0,0 +1,198 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+from fastapi import status
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from unstructured_platform_plugins.etl_uvicorn.concurrency import PLUGIN_PATHS
+from unstructured_platform_plugins.schema.cancellation import (
+    CancellationToken,
+    DeadlineExceededError,
+)
+
+# Unix timestamp, or ISO 8601 datetime, after which the client no longer waits for the response
+DEADLINE_HEADER = "x-request-deadline"
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def current_cancellation_token() -> Optional[CancellationToken]:
+    """The token of the plugin request running in the current context, if any."""
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken) -> Iterator[CancellationToken]:
+    """Makes `token` the current cancellation token for the code run inside the block."""
+    context_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(context_token)
+
+
+def parse_deadline(value: str) -> float:
+    """Unix timestamp of a deadline sent as one, or as an ISO 8601 datetime (UTC if naive)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    deadline = datetime.fromisoformat(value)
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return deadline.timestamp()
+
+
+class CancellationTracker:
+    def __init__(self):
+        self.cancelled = 0
+        self.deadline_exceeded = 0
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self, attribute))]
+
+        meter.create_observable_counter(
+            "etl_plugin.invocations.cancelled",
+            callbacks=[observe("cancelled")],
+            description="Invocations cancelled because the client disconnected",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.invocations.deadline_exceeded",
+            callbacks=[observe("deadline_exceeded")],
+            description="Requests rejected because their deadline had already passed",
+        )
+
+
+class DeadlineMiddleware:
+    """Gives each plugin request its cancellation token, carrying the deadline the client sent.
+
+    Requests that arrive past their deadline are answered with a 504 before the plugin is called.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        tracker: Optional[CancellationTracker] = None,
+        paths: tuple[str, ...] = PLUGIN_PATHS,
+    ):
+        self.app = app
+        self.tracker = tracker or CancellationTracker()
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        token = CancellationToken()
+        header = Headers(scope=scope).get(DEADLINE_HEADER)
+        if header is not None:
+            try:
+                token.deadline = parse_deadline(header)
+            except ValueError:
+                response = JSONResponse(
+                    {"detail": f"invalid {DEADLINE_HEADER} header: {header}"},
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+                await response(scope, receive, send)
+                return
+        if token.expired:
+            self.tracker.deadline_exceeded += 1
+            error = DeadlineExceededError(f"request deadline {header} has already passed")
+            response = JSONResponse({"detail": str(error)}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+        context_token = _current_token.set(token)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_token.reset(context_token)
+
+
+class CancelOnDisconnectMiddleware:
+    """Cancels plugin requests whose client went away before the response was complete.
+
+    When the connection drops the handler task is cancelled, which stops coroutine plugins and
+    streams at their next await, and the request's `CancellationToken` is set for sync plugins
+    still running on a thread.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        tracker: Optional[CancellationTracker] = None,
+        paths: tuple[str, ...] = PLUGIN_PATHS,
+    ):
+        self.app = app
+        self.tracker = tracker or CancellationTracker()
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # The watcher owns the connection from the start and relays its messages to the app, so
+        # the two never compete for them. It only reads the next body chunk once the app took the
+        # previous one, a body the app reads slowly is left to the server's flow control rather
+        # than buffered here.
+        messages: asyncio.Queue[Message] = asyncio.Queue(maxsize=1)
+        disconnected = False
+        response_complete = False
+        handler_cancelled = False
+
+        async def receive_wrapper() -> Message:
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        # Normally DeadlineMiddleware already gave the request its token
+        token = current_cancellation_token() or CancellationToken()
+        context_token = _current_token.set(token)
+        try:
+            handler = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        finally:
+            _current_token.reset(context_token)
+
+        async def watch() -> None:
+            nonlocal disconnected, handler_cancelled
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    break
+                await messages.put(message)
+            disconnected = True
+            if messages.empty():
+                # Wakes up the app if it is waiting for a message, it is told later otherwise
+                messages.put_nowait(message)
+            if not response_complete and not handler.done():
+                token.cancel()
+                self.tracker.cancelled += 1
+                handler_cancelled = True
+                handler.cancel()
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not handler_cancelled:
+                # The server itself is cancelling the request, take the handler down with it
+                handler.cancel()
+                raise
+            # Cancelled by the watcher, there is no one left to send a response to
+        finally:
+            watcher.cancel()
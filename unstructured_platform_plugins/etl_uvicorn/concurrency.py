@@ -0,0 +1,321 @@
+import asyncio
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import status
+from opentelemetry.metrics import CallbackOptions, Histogram, Meter, Observation
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Routes that run the plugin, the ones admission control and cancellation apply to
+PLUGIN_PATHS = ("/invoke", "/invoke/batch")
+
+
+class AdmissionRejectedError(Exception):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdaptiveLimitConfig:
+    min_limit: int = 1
+    max_limit: int = 256
+    # Latency may grow to this multiple of its no-load baseline before the limit is lowered
+    latency_tolerance: float = 2.0
+    # How many of the latest successful invocations the baseline is taken from
+    baseline_window: int = 200
+    # Percentile of those latencies taken as the baseline, a low one approximates no load
+    baseline_percentile: float = 0.1
+    # Factor applied to the limit when latency or event loop lag is too high
+    backoff: float = 0.9
+    # Event loop lag above which the limit is lowered, whatever the plugin latency
+    max_event_loop_lag_ms: float = 50.0
+    # How often requests sample the event loop lag
+    lag_sample_interval_ms: float = 10.0
+
+
+@dataclass
+class AdmissionConfig:
+    # How many requests may run the plugin at the same time, the starting point if adaptive
+    max_in_flight: int
+    # How many requests may wait for one of those slots, the rest are rejected immediately
+    max_queue_size: int = 0
+    # Seconds a rejected client is asked to wait before retrying, sent as Retry-After
+    retry_after: float = 1.0
+    # When set, the in-flight limit follows the observed latency and event loop lag
+    adaptive: Optional[AdaptiveLimitConfig] = None
+
+
+@dataclass
+class AdmissionStats:
+    limit: int
+    in_flight: int
+    queued: int
+    admitted: int
+    rejected: int
+
+
+class AdaptiveLimit:
+    """An in-flight limit that follows observed latency, additive increase multiplicative decrease.
+
+    The baseline is a low percentile of the latest `baseline_window` latencies, so a single
+    unusually fast call doesn't set it and a plugin that became permanently slower isn't throttled
+    forever. Only successful invocations are sampled, errors are often much faster than real work.
+    While latency stays within `latency_tolerance` of the baseline and the limit is being used,
+    the limit grows by about one per round trip; when latency or event loop lag is too high it is
+    cut by `backoff`, at most once per round trip.
+    """
+
+    def __init__(self, config: AdaptiveLimitConfig, initial_limit: int):
+        self.config = config
+        self._limit = float(min(max(initial_limit, config.min_limit), config.max_limit))
+        self.event_loop_lag = 0.0
+        self._last_decrease = 0.0
+        self._last_lag_sample = 0.0
+        # The same window of latencies in arrival order, to evict, and sorted, to take percentiles
+        self._window: deque[float] = deque()
+        self._sorted_window: list[float] = []
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def baseline(self) -> Optional[float]:
+        if not self._sorted_window:
+            return None
+        index = int(len(self._sorted_window) * self.config.baseline_percentile)
+        return self._sorted_window[min(index, len(self._sorted_window) - 1)]
+
+    def _add_to_window(self, latency: float) -> None:
+        if len(self._window) >= self.config.baseline_window:
+            oldest = self._window.popleft()
+            del self._sorted_window[bisect.bisect_left(self._sorted_window, oldest)]
+        self._window.append(latency)
+        bisect.insort(self._sorted_window, latency)
+
+    def on_sample(self, latency: float, in_flight: int) -> None:
+        """Adapts the limit to a successful invocation that ran with `in_flight` others."""
+        self._add_to_window(latency)
+        now = time.monotonic()
+        overloaded = (
+            latency > self.baseline * self.config.latency_tolerance
+            or self.event_loop_lag * 1000 > self.config.max_event_loop_lag_ms
+        )
+        if overloaded:
+            if now - self._last_decrease >= latency:
+                self._limit = max(self.config.min_limit, self._limit * self.config.backoff)
+                self._last_decrease = now
+        elif in_flight + 1 >= self.limit:
+            self._limit = min(self.config.max_limit, self._limit + 1 / self._limit)
+
+    def sample_event_loop_lag(self) -> None:
+        # How long a ready callback waits for its turn, measured without a background task
+        now = time.perf_counter()
+        if (now - self._last_lag_sample) * 1000 < self.config.lag_sample_interval_ms:
+            return
+        self._last_lag_sample = now
+        asyncio.get_running_loop().call_soon(self._record_lag, now)
+
+    def _record_lag(self, scheduled: float) -> None:
+        lag = time.perf_counter() - scheduled
+        self.event_loop_lag += (lag - self.event_loop_lag) * 0.25
+
+
+@dataclass
+class _Waiter:
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+
+    def offer(self, controller: "AdmissionController") -> bool:
+        if self.future.done():
+            return False
+
+        def deliver():
+            # The waiter may have been cancelled since the slot was offered
+            if self.future.done():
+                controller.release()
+            else:
+                self.future.set_result(None)
+
+        self.loop.call_soon_threadsafe(deliver)
+        return True
+
+
+class AdmissionController:
+    """Bounds how many requests run the plugin at once and how many may wait for their turn.
+
+    Without a bound a burst piles up in the executor queue (or on downstream services for async
+    plugins) and latency grows until clients time out and retry, adding to the overload. Rejecting
+    what can't be served soon keeps the latency of admitted requests predictable.
+    """
+
+    def __init__(self, config: AdmissionConfig):
+        if config.max_in_flight < 1:
+            raise ValueError(f"max in flight must be at least 1, got {config.max_in_flight}")
+        self.config = config
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._admitted = 0
+        self._rejected = 0
+        self._queue_wait: Optional[Histogram] = None
+        self.adaptive = (
+            AdaptiveLimit(config.adaptive, initial_limit=config.max_in_flight)
+            if config.adaptive is not None
+            else None
+        )
+
+    @property
+    def limit(self) -> int:
+        if self.adaptive is not None:
+            return self.adaptive.limit
+        return self.config.max_in_flight
+
+    def _reject(self) -> AdmissionRejectedError:
+        self._rejected += 1
+        return AdmissionRejectedError(
+            f"too many requests ({self._in_flight} running, {len(self._waiters)} waiting)",
+            retry_after=self.config.retry_after,
+        )
+
+    async def acquire(self) -> None:
+        start = time.perf_counter()
+        if self.adaptive is not None:
+            self.adaptive.sample_event_loop_lag()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                self._admitted += 1
+                self._record_wait(0.0)
+                return
+            if len(self._waiters) >= self.config.max_queue_size:
+                raise self._reject()
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            # The slot was handed over just before the cancellation, pass it on
+            if not waiter.future.cancelled():
+                self.release()
+            raise
+        with self._lock:
+            self._admitted += 1
+        self._record_wait(time.perf_counter() - start)
+
+    def record_latency(self, latency: float) -> None:
+        """Samples how long a successful plugin invocation of an admitted request took."""
+        if self.adaptive is None:
+            return
+        with self._lock:
+            # The request sampled still holds its slot
+            self.adaptive.on_sample(latency, in_flight=max(self._in_flight - 1, 0))
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            # Slots pass straight to waiters so a new arrival can't jump the queue
+            while self._waiters and self._in_flight < self.limit:
+                if self._waiters.popleft().offer(self):
+                    self._in_flight += 1
+
+    def _record_wait(self, seconds: float) -> None:
+        if self._queue_wait is not None:
+            self._queue_wait.record(seconds)
+
+    def stats(self) -> AdmissionStats:
+        with self._lock:
+            return AdmissionStats(
+                limit=self.limit,
+                in_flight=self._in_flight,
+                queued=len(self._waiters),
+                admitted=self._admitted,
+                rejected=self._rejected,
+            )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.admission.limit",
+            callbacks=[observe("limit")],
+            description="Requests currently allowed to run the plugin at the same time",
+        )
+        meter.create_observable_gauge(
+            "etl_plugin.admission.in_flight",
+            callbacks=[observe("in_flight")],
+            description="Requests currently running the plugin",
+        )
+        meter.create_observable_gauge(
+            "etl_plugin.admission.queued",
+            callbacks=[observe("queued")],
+            description="Requests waiting to run the plugin",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.admission.rejected",
+            callbacks=[observe("rejected")],
+            description="Requests rejected because the admission queue was full",
+        )
+        if self.adaptive is not None:
+            meter.create_observable_gauge(
+                "etl_plugin.admission.event_loop_lag",
+                callbacks=[lambda options: [Observation(self.adaptive.event_loop_lag)]],
+                unit="s",
+                description="Smoothed delay of ready callbacks on the event loop",
+            )
+        self._queue_wait = meter.create_histogram(
+            "etl_plugin.admission.queue_wait",
+            unit="s",
+            description="Time requests waited before running the plugin",
+        )
+
+
+class AdmissionMiddleware:
+    """Admits requests to the plugin routes before their body is read.
+
+    A slot is held until the response is complete, so streamed responses count for as long as the
+    plugin is producing them.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        paths: tuple[str, ...] = PLUGIN_PATHS,
+    ):
+        self.app = app
+        self.controller = controller
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire()
+        except AdmissionRejectedError as e:
+            response = JSONResponse(
+                {"detail": str(e)},
+                status_code=e.status_code,
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -0,0 +1,197 @@
+import inspect
+from dataclasses import dataclass, fields, is_dataclass
+from enum import EnumMeta
+from types import GenericAlias, NoneType, UnionType
+from typing import Any, Callable, Optional, Union, get_args, get_origin
+
+from dataclasses_json import DataClassJsonMixin
+from pydantic import BaseModel
+
+from unstructured_platform_plugins.etl_uvicorn.stream_input import iterate
+from unstructured_platform_plugins.schema.utils import get_stream_item_type
+from unstructured_platform_plugins.type_hints import get_type_hints
+
+Converter = Callable[[Any], Any]
+
+
+def _as_dict(value: Any) -> Any:
+    # The request model rebuilt from json schema hands nested objects over as pydantic models,
+    # so normalize those back to a dict before building the declared type.
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return value
+
+
+class ConverterCompiler:
+    """Turns type hints into conversion callables, resolving each type only once.
+
+    A compiled converter of `None` means the value is passed through untouched, which lets
+    containers of plain types skip iterating over their contents entirely.
+    """
+
+    def __init__(self):
+        self._cache: dict[Any, Optional[Converter]] = {}
+
+    def compile(self, type_data: Any) -> Optional[Converter]:
+        try:
+            if type_data in self._cache:
+                return self._cache[type_data]
+        except TypeError:
+            # Unhashable annotation, compile without caching
+            return self._compile(type_data)
+
+        # Guard against self-referencing types by resolving lazily while compiling
+        def deferred(value: Any) -> Any:
+            converter = self._cache[type_data]
+            return value if converter is None else converter(value)
+
+        self._cache[type_data] = deferred
+        converter = self._compile(type_data)
+        self._cache[type_data] = converter
+        return converter
+
+    def _compile(self, type_data: Any) -> Optional[Converter]:
+        origin = get_origin(type_data)
+        if origin is Union or isinstance(type_data, UnionType):
+            return self._compile_union(type_data)
+        if origin is list:
+            return self._compile_list(type_data)
+        if origin is dict:
+            return self._compile_dict(type_data)
+        stream_item_type = get_stream_item_type(type_data)
+        if stream_item_type is not None:
+            return self._compile_stream(stream_item_type)
+        if isinstance(type_data, EnumMeta):
+            # Enum values are passed along as their raw value
+            return None
+        if not inspect.isclass(type_data) or isinstance(type_data, GenericAlias):
+            return None
+        if issubclass(type_data, DataClassJsonMixin):
+            return self._compile_dataclass_json(type_data)
+        if is_dataclass(type_data):
+            return self._compile_dataclass(type_data)
+        if issubclass(type_data, BaseModel):
+            return self._compile_base_model(type_data)
+        return None
+
+    def _compile_union(self, type_data: Any) -> Optional[Converter]:
+        args = [arg for arg in get_args(type_data) if arg is not NoneType]
+        if len(args) != 1:
+            # Ambiguous unions are left for the caller to resolve
+            return None
+        inner = self.compile(args[0])
+        if inner is None:
+            return None
+
+        def convert_optional(value: Any) -> Any:
+            return None if value is None else inner(value)
+
+        return convert_optional
+
+    def _compile_list(self, type_data: Any) -> Optional[Converter]:
+        args = get_args(type_data)
+        inner = self.compile(args[0]) if args else None
+        if inner is None:
+            return None
+
+        def convert_list(value: Any) -> Any:
+            if not isinstance(value, list):
+                return value
+            return [inner(v) for v in value]
+
+        return convert_list
+
+    def _compile_dict(self, type_data: Any) -> Optional[Converter]:
+        args = get_args(type_data)
+        inner = self.compile(args[1]) if len(args) == 2 else None
+        if inner is None:
+            return None
+
+        def convert_dict(value: Any) -> Any:
+            if not isinstance(value, dict):
+                return value
+            return {k: inner(v) for k, v in value.items()}
+
+        return convert_dict
+
+    def _compile_stream(self, item_type: Any) -> Converter:
+        inner = self.compile(item_type)
+
+        def convert_stream(value: Any) -> Any:
+            # Lists come from a regular json body, a streamed body is already an async iterator
+            if not isinstance(value, list):
+                return value
+            return iterate(value if inner is None else [inner(v) for v in value])
+
+        return convert_stream
+
+    def _compile_dataclass_json(self, type_data: type[DataClassJsonMixin]) -> Converter:
+        def convert_dataclass_json(value: Any) -> Any:
+            value = _as_dict(value)
+            if isinstance(value, dict):
+                return type_data.from_dict(value)
+            return value
+
+        return convert_dataclass_json
+
+    def _compile_dataclass(self, type_data: type) -> Converter:
+        type_hints = get_type_hints(type_data)
+        field_converters = {}
+        for f in fields(type_data):
+            converter = self.compile(type_hints.get(f.name, Any))
+            if converter is not None:
+                field_converters[f.name] = converter
+
+        def convert_dataclass(value: Any) -> Any:
+            value = _as_dict(value)
+            if not isinstance(value, dict):
+                return value
+            if field_converters:
+                value = {
+                    k: field_converters[k](v) if k in field_converters else v
+                    for k, v in value.items()
+                }
+            return type_data(**value)
+
+        return convert_dataclass
+
+    def _compile_base_model(self, type_data: type[BaseModel]) -> Converter:
+        def convert_base_model(value: Any) -> Any:
+            if isinstance(value, type_data):
+                return value
+            return type_data.model_validate(_as_dict(value))
+
+        return convert_base_model
+
+
+@dataclass(frozen=True)
+class InputConverters:
+    """Per-field conversion table for a function, compiled once when the function is wrapped."""
+
+    converters: dict[str, Converter]
+
+    def convert(self, raw_inputs: dict[str, Any]) -> dict[str, Any]:
+        # Converts in place, the caller owns the dictionary it passes in
+        for field_name, converter in self.converters.items():
+            if field_name not in raw_inputs:
+                continue
+            field_value = raw_inputs[field_name]
+            try:
+                raw_inputs[field_name] = converter(field_value)
+            except Exception as e:
+                raise ValueError(
+                    f"failed to map input for field {field_name}: {field_value}"
+                ) from e
+        return raw_inputs
+
+
+def compile_input_converters(func: Callable) -> InputConverters:
+    type_info = get_type_hints(func)
+    type_info.pop("return", None)
+    compiler = ConverterCompiler()
+    converters = {}
+    for field_name, type_data in type_info.items():
+        converter = compiler.compile(type_data)
+        if converter is not None:
+            converters[field_name] = converter
+    return InputConverters(converters=converters)
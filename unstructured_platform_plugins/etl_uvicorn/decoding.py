@@ -0,0 +1,178 @@
+from inspect import Parameter
+from types import NoneType, UnionType
+from typing import Annotated, Any, Callable, Literal, Optional, Union, get_args, get_origin
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Discriminator,
+    Tag,
+    TypeAdapter,
+    ValidationError,
+    create_model,
+)
+from pydantic.json_schema import GenerateJsonSchema, JsonSchemaValue
+from unstructured_ingest.data_types.file_data import BatchFileData, FileData
+
+from unstructured_platform_plugins.etl_uvicorn.stream_input import iterate
+from unstructured_platform_plugins.schema.utils import get_stream_item_type, get_typed_parameters
+
+# schema: validate into the model rebuilt from the json schema, then convert to the native types
+# native: decode the raw json bytes straight into the types declared by the function
+DecodeMode = Literal["schema", "native"]
+
+
+class _AnyForArbitraryTypes(GenerateJsonSchema):
+    # Arbitrary classes the function accepts have no json schema, any value is documented instead
+    def handle_invalid_for_json_schema(self, schema: Any, error_info: str) -> JsonSchemaValue:
+        return {}
+
+
+def _file_data_tag(value: Any) -> str:
+    if isinstance(value, dict):
+        return "batch" if "batch_items" in value else "file"
+    return "batch" if isinstance(value, BatchFileData) else "file"
+
+
+# Tagged so that pydantic validates against exactly one variant rather than trying both
+FileDataUnion = Annotated[
+    Union[Annotated[BatchFileData, Tag("batch")], Annotated[FileData, Tag("file")]],
+    Discriminator(_file_data_tag),
+]
+
+
+def _accept_batch_file_data(t: Any) -> Any:
+    # Mirrors `file_data_from_dict`, which always tries the batch variant first, so a plugin
+    # annotating a plain `FileData` still receives a `BatchFileData` when that is what was sent.
+    if t is FileData:
+        return FileDataUnion
+    if get_origin(t) is Union or isinstance(t, UnionType):
+        args = get_args(t)
+        non_null = {a for a in args if a is not NoneType}
+        if non_null in ({FileData}, {FileData, BatchFileData}):
+            return Optional[FileDataUnion] if NoneType in args else FileDataUnion
+    return t
+
+
+def request_validation_error(
+    error: ValidationError, body: Any, loc: tuple = ("body",)
+) -> RequestValidationError:
+    return RequestValidationError(
+        errors=[{**e, "loc": (*loc, *e["loc"])} for e in error.errors(include_url=False)],
+        body=body,
+    )
+
+
+_json_array_adapter = TypeAdapter(list[Any])
+
+
+def decode_json_array(body: bytes) -> list[Any]:
+    """Splits a json array body, as sent to `/invoke/batch`, into its undecoded items."""
+    try:
+        return _json_array_adapter.validate_json(body)
+    except ValidationError as e:
+        raise request_validation_error(e, body) from e
+
+
+def validate_batch_item(
+    model: type[BaseModel], index: int, item: Any
+) -> Union[BaseModel, RequestValidationError]:
+    """Validates one item of a batch, an invalid item is returned as the error it fails with."""
+    try:
+        return model.model_validate(item)
+    except ValidationError as e:
+        return request_validation_error(e, item, loc=("body", index))
+
+
+class NativeDecoder:
+    """Decodes a request body into the argument types the function declares in one pass.
+
+    The default decode path validates the body into the model rebuilt from json schema, dumps
+    `file_data` back to a dict to rebuild it and runs the input converters over the result, so a
+    large payload is parsed and copied several times over. Here pydantic validates the raw bytes
+    directly against the real annotations.
+    """
+
+    def __init__(self, func: Callable, omit: Optional[list[str]] = None):
+        omit = omit or []
+        fields = {}
+        self.stream_field_names = []
+        for p in get_typed_parameters(func):
+            if p.name in omit or (p.param_type is Parameter.empty and p.name == "self"):
+                continue
+            param_type = Any if p.param_type is Parameter.empty else p.param_type
+            if p.name == "file_data":
+                param_type = _accept_batch_file_data(param_type)
+            stream_item_type = get_stream_item_type(param_type)
+            if stream_item_type is not None:
+                # A stream sent in a json body arrives as a list
+                param_type = list[stream_item_type]
+                self.stream_field_names.append(p.name)
+            default = ... if p.default is Parameter.empty else p.default
+            fields[p.name] = (param_type, default)
+        self.field_names = list(fields)
+        self.model: type[BaseModel] = create_model(
+            f"{getattr(func, '__name__', 'plugin')}_native_inputs",
+            __config__=ConfigDict(arbitrary_types_allowed=True),
+            **fields,
+        )
+        self._batch_adapter = TypeAdapter(list[self.model])
+
+    @property
+    def body_is_optional(self) -> bool:
+        return not any(f.is_required() for f in self.model.model_fields.values())
+
+    def _as_kwargs(self, inputs: BaseModel) -> dict[str, Any]:
+        # Shallow read of the validated fields, the values themselves are not copied again
+        kwargs = {name: getattr(inputs, name) for name in self.field_names}
+        for name in self.stream_field_names:
+            kwargs[name] = iterate(kwargs[name])
+        return kwargs
+
+    def decode(self, body: bytes) -> dict[str, Any]:
+        if not body and self.body_is_optional:
+            body = b"{}"
+        try:
+            inputs = self.model.model_validate_json(body)
+        except ValidationError as e:
+            raise request_validation_error(e, body) from e
+        return self._as_kwargs(inputs)
+
+    def decode_inputs(self, inputs: Optional[BaseModel]) -> dict[str, Any]:
+        """Arguments from a body that was validated into `model` as part of a larger message."""
+        if inputs is None:
+            return self.decode(b"")
+        return self._as_kwargs(inputs)
+
+    def openapi_schemas(self) -> dict[str, dict[str, Any]]:
+        """The json schema of `model` and of every model it refers to, by OpenAPI component name.
+
+        The route reads the raw request, so FastAPI can't tell the body from its signature.
+        """
+        schema = self.model.model_json_schema(
+            ref_template="#/components/schemas/{model}", schema_generator=_AnyForArbitraryTypes
+        )
+        schemas = schema.pop("$defs", {})
+        schemas[self.model.__name__] = schema
+        return schemas
+
+    def decode_batch(self, body: bytes) -> list[Union[dict[str, Any], RequestValidationError]]:
+        """Decodes a json array of request bodies, as sent to `/invoke/batch`.
+
+        Each item is decoded on its own, one that doesn't validate is returned as its error so only
+        that item fails.
+        """
+        try:
+            return [self._as_kwargs(inputs) for inputs in self._batch_adapter.validate_json(body)]
+        except ValidationError:
+            # Only decoded item by item to tell the valid items from the invalid ones
+            pass
+        batch = [
+            validate_batch_item(self.model, index, item)
+            for index, item in enumerate(decode_json_array(body))
+        ]
+        return [
+            inputs if isinstance(inputs, RequestValidationError) else self._as_kwargs(inputs)
+            for inputs in batch
+        ]
@@ -0,0 +1,122 @@
+import logging
+from typing import Any, Callable, Iterable, Iterator, Literal, Optional, get_args, get_origin
+
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticSerializationError
+
+logger = logging.getLogger("uvicorn.error")
+
+# trusted: build the response without validation and serialize it once, straight to json bytes
+# validated: validate the plugin output into the response model, useful when debugging a plugin
+EncodeMode = Literal["trusted", "validated"]
+
+
+class ResponseEncoder:
+    """Serializes responses with the serializer pydantic compiled for the response model.
+
+    The response model is built from the function's output signature when the app is created, so
+    encoding a response is a single pass over the data rather than FastAPI's validate-then-encode
+    of `response_model`. A response that fails to serialize is replaced by whatever `fallback`
+    makes of it.
+    """
+
+    def __init__(
+        self,
+        response_model: type[BaseModel],
+        fallback: Optional[Callable[[BaseModel, PydanticSerializationError], BaseModel]] = None,
+    ):
+        self.response_model = response_model
+        self.fallback = fallback
+        self._serializer = response_model.__pydantic_serializer__
+
+    def to_json(self, response: BaseModel) -> bytes:
+        try:
+            return self._serializer.to_json(response)
+        except PydanticSerializationError as e:
+            if self.fallback is None:
+                raise
+            return self._serializer.to_json(self.fallback(response, e))
+
+    def encode(self, response: BaseModel) -> Response:
+        return Response(content=self.to_json(response), media_type="application/json")
+
+    def encode_many(self, responses: Iterable[BaseModel]) -> Response:
+        content = b"[" + b",".join(self.to_json(response) for response in responses) + b"]"
+        return Response(content=content, media_type="application/json")
+
+
+def get_list_element_type(output_type: Any) -> Optional[Any]:
+    """The element type of a `list[...]` output signature, None for any other output."""
+    if get_origin(output_type) is not list:
+        return None
+    args = get_args(output_type)
+    return args[0] if args else Any
+
+
+class ListOutputEncoder:
+    """Writes a response whose output is a list into the body one element at a time.
+
+    Encoding the whole response first means the output list, the response and its json string are
+    all in memory before the first byte goes out. Here the fields around `output` are serialized
+    on their own and the elements follow in chunks of about `chunk_size` bytes, on the threadpool
+    the response iterates in. The body is the same json `ResponseEncoder` would produce.
+
+    A failure to serialize the first chunk falls back to `ResponseEncoder.encode`. Once the body
+    has started there is no status left to change, so a later failure aborts the response.
+    """
+
+    def __init__(
+        self,
+        response_encoder: ResponseEncoder,
+        element_type: Any,
+        field: str = "output",
+        chunk_size: int = 64 * 1024,
+    ):
+        self.response_encoder = response_encoder
+        self.field = field
+        self.chunk_size = chunk_size
+        self._element_serializer = TypeAdapter(element_type).serializer
+        fields = list(response_encoder.response_model.model_fields)
+        index = fields.index(field)
+        self._head_fields = set(fields[:index])
+        self._tail_fields = set(fields[index + 1 :])
+
+    def _chunks(self, response: BaseModel) -> Iterator[bytes]:
+        serializer = self.response_encoder._serializer
+        head = serializer.to_json(response, include=self._head_fields)
+        tail = serializer.to_json(response, include=self._tail_fields)
+        # Either may be an empty object, which only leaves its brace to the body
+        buffer = [head[:-1], b"," if len(head) > 2 else b"", b'"%s":[' % self.field.encode()]
+        size = 0
+        for i, element in enumerate(getattr(response, self.field)):
+            if i:
+                buffer.append(b",")
+            encoded = self._element_serializer.to_json(element)
+            buffer.append(encoded)
+            size += len(encoded)
+            if size >= self.chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        buffer.append(b"]," + tail[1:] if len(tail) > 2 else b"]}")
+        yield b"".join(buffer)
+
+    def encode(self, response: BaseModel) -> Response:
+        if not isinstance(getattr(response, self.field), list):
+            return self.response_encoder.encode(response)
+        chunks = self._chunks(response)
+        try:
+            first = next(chunks)
+        except PydanticSerializationError:
+            return self.response_encoder.encode(response)
+
+        def body() -> Iterator[bytes]:
+            yield first
+            try:
+                yield from chunks
+            except PydanticSerializationError as e:
+                logger.error(f"failed to serialize list output mid-response: {e}", exc_info=True)
+                raise
+
+        return StreamingResponse(body(), media_type="application/json")
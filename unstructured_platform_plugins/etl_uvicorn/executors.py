@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Optional
+
+from fastapi import status
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+
+
+class ExecutorQueueFullError(Exception):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@dataclass
+class ExecutorConfig:
+    # None falls back to the ThreadPoolExecutor default of min(32, cpu + 4)
+    max_workers: Optional[int] = None
+    thread_name_prefix: str = "etl-plugin"
+    # How many calls may wait for a free thread, None leaves the queue unbounded
+    max_queue_size: Optional[int] = None
+
+
+@dataclass
+class ExecutorStats:
+    max_workers: int
+    active_threads: int
+    queue_depth: int
+    completed: int
+    rejected: int
+
+
+async def run_sync(
+    executor: Optional["PluginExecutor"], fn: Callable, *args: Any, **kwargs: Any
+) -> Any:
+    """Runs sync `fn` on `executor`, or the event loop's default one, in a copy of the context.
+
+    A method of an instance pool leases its instance here on the event loop first, so no executor
+    thread is held while waiting for one.
+    """
+    instance_pool = getattr(fn, "instance_pool", None)
+    if instance_pool is not None:
+        async with instance_pool.lease_async() as instance:
+            return await run_sync(executor, getattr(instance, fn.method_name), *args, **kwargs)
+    if executor is not None:
+        return await executor.run(fn, *args, **kwargs)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        None, partial(context.run, fn, *args, **kwargs)
+    )
+
+
+class PluginExecutor:
+    """A thread pool dedicated to the wrapped function.
+
+    Sync plugins otherwise run on the event loop's default executor, which is shared with
+    everything else in the process and can't be sized for the plugin's workload.
+    """
+
+    def __init__(self, config: Optional[ExecutorConfig] = None):
+        self.config = config or ExecutorConfig()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers,
+            thread_name_prefix=self.config.thread_name_prefix,
+        )
+        self.max_workers: int = self._executor._max_workers
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _run(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    def _on_done(self, future: Future) -> None:
+        # A call cancelled before a thread picked it up never reaches `_run`
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            max_queue_size = self.config.max_queue_size
+            if (
+                max_queue_size is not None
+                and self._queued + self._active >= self.max_workers + max_queue_size
+            ):
+                self._rejected += 1
+                raise ExecutorQueueFullError(
+                    f"executor queue is full ({max_queue_size} calls waiting for "
+                    f"{self.max_workers} threads)"
+                )
+            self._queued += 1
+        # Like asyncio.to_thread, the call sees the context variables of the caller
+        context = contextvars.copy_context()
+        future = self._executor.submit(self._run, partial(context.run, fn, *args, **kwargs))
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return ExecutorStats(
+                max_workers=self.max_workers,
+                active_threads=self._active,
+                queue_depth=max(self._queued, 0),
+                completed=self._completed,
+                rejected=self._rejected,
+            )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.executor.queue_depth",
+            callbacks=[observe("queue_depth")],
+            description="Calls waiting for a free executor thread",
+        )
+        meter.create_observable_gauge(
+            "etl_plugin.executor.active_threads",
+            callbacks=[observe("active_threads")],
+            description="Executor threads currently running the plugin",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.executor.rejected",
+            callbacks=[observe("rejected")],
+            description="Calls rejected because the executor queue was full",
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
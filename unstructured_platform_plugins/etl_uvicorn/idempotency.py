@@ -0,0 +1,230 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import status
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Request header naming an invocation, a retry with the same key gets the stored response back
+IDEMPOTENCY_KEY_HEADER = "idempotency-key"
+# Response header set when the response was stored by an earlier request with the same key
+IDEMPOTENT_REPLAYED_HEADER = "idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+_current_key: ContextVar[Optional[str]] = ContextVar("idempotency_key", default=None)
+
+
+def current_idempotency_key() -> Optional[str]:
+    """The idempotency key of the plugin request running in the current context, if any."""
+    return _current_key.get()
+
+
+class IdempotencyKeyConflictError(Exception):
+    status_code = status.HTTP_409_CONFLICT
+
+
+class IdempotencyKeyReusedError(Exception):
+    status_code = status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+@dataclass
+class IdempotencyConfig:
+    # SQLite database the responses are kept in, created if it doesn't exist
+    path: str
+    # Seconds a stored response is returned for retries of its key
+    ttl: float = 24 * 60 * 60.0
+    # Seconds between passes removing expired responses and returning their space to the disk
+    compact_interval: float = 60 * 60.0
+
+
+@dataclass
+class IdempotencyStats:
+    hits: int
+    misses: int
+    stored: int
+    conflicts: int
+    compacted: int
+
+
+class IdempotencyStore:
+    """Responses of completed invocations by idempotency key, kept on disk across restarts.
+
+    Responses are stored with a hash of the inputs they were produced for, a key sent again with
+    different inputs is rejected rather than answered with someone else's result. Expired responses
+    are deleted every `compact_interval` seconds, and the pages they used are handed back to the
+    file system. Database calls run on a thread, so a slow disk doesn't stall the event loop.
+    """
+
+    def __init__(self, plugin_id: str, config: IdempotencyConfig):
+        self.plugin_id = plugin_id
+        self.config = config
+        directory = os.path.dirname(config.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(config.path, check_same_thread=False)
+        # Must be set before the first table is created for the database to shrink on compaction
+        self._connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "plugin_id TEXT NOT NULL, key TEXT NOT NULL, request_hash TEXT NOT NULL, "
+            "body BLOB NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (plugin_id, key))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)"
+        )
+        self._connection.commit()
+        self._in_progress: set[str] = set()
+        self._last_compaction = 0.0
+        self._hits = 0
+        self._misses = 0
+        self._stored = 0
+        self._conflicts = 0
+        self._compacted = 0
+        self._compact()
+
+    def _get(self, key: str) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT request_hash, body FROM responses "
+                "WHERE plugin_id = ? AND key = ? AND expires_at > ?",
+                (self.plugin_id, key, time.time()),
+            ).fetchone()
+        return row
+
+    async def get(self, key: str, request_hash: str) -> Optional[bytes]:
+        """The response stored for `key`, which must have been produced for the same inputs."""
+        row = await asyncio.to_thread(self._get, key)
+        if row is None:
+            self._misses += 1
+            return None
+        stored_hash, body = row
+        if stored_hash != request_hash:
+            raise IdempotencyKeyReusedError(
+                f"idempotency key {key} was already used for a request with different inputs"
+            )
+        self._hits += 1
+        return body
+
+    @asynccontextmanager
+    async def claim(self, key: str) -> AsyncIterator[None]:
+        """Holds `key` while its invocation runs, a concurrent retry of it is rejected."""
+        if key in self._in_progress:
+            self._conflicts += 1
+            raise IdempotencyKeyConflictError(
+                f"a request with idempotency key {key} is already in progress"
+            )
+        self._in_progress.add(key)
+        try:
+            yield
+        finally:
+            self._in_progress.discard(key)
+
+    def _put(self, key: str, request_hash: str, body: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (self.plugin_id, key, request_hash, body, now + self.config.ttl),
+            )
+            self._connection.commit()
+        if now - self._last_compaction >= self.config.compact_interval:
+            self._compact()
+
+    async def put(self, key: str, request_hash: str, body: bytes) -> None:
+        await asyncio.to_thread(self._put, key, request_hash, body)
+        self._stored += 1
+
+    def _compact(self) -> None:
+        now = time.time()
+        with self._lock:
+            self._last_compaction = now
+            deleted = self._connection.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (now,)
+            ).rowcount
+            self._connection.commit()
+            if deleted:
+                # Frees one page per row stepped through, so read it to the end
+                self._connection.execute("PRAGMA incremental_vacuum").fetchall()
+                self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._compacted += deleted
+
+    def stats(self) -> IdempotencyStats:
+        return IdempotencyStats(
+            hits=self._hits,
+            misses=self._misses,
+            stored=self._stored,
+            conflicts=self._conflicts,
+            compacted=self._compacted,
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_counter(
+            "etl_plugin.idempotency.hits",
+            callbacks=[observe("hits")],
+            description="Requests answered with the response stored for their idempotency key",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.idempotency.misses",
+            callbacks=[observe("misses")],
+            description="Requests with an idempotency key that had no stored response",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.idempotency.stored",
+            callbacks=[observe("stored")],
+            description="Responses stored for their idempotency key",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.idempotency.conflicts",
+            callbacks=[observe("conflicts")],
+            description="Requests rejected while another with the same key was in progress",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.idempotency.compacted",
+            callbacks=[observe("compacted")],
+            description="Expired responses removed from the store",
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class IdempotencyKeyMiddleware:
+    """Makes the `Idempotency-Key` header of a request to `/invoke` available to its handler."""
+
+    def __init__(self, app: ASGIApp, paths: tuple[str, ...] = ("/invoke",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_KEY_HEADER)
+        if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+            detail = f"{IDEMPOTENCY_KEY_HEADER} header must be 1 to {MAX_KEY_LENGTH} characters"
+            response = JSONResponse(
+                {"detail": detail},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+            await response(scope, receive, send)
+            return
+        context_token = _current_key.set(key)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_key.reset(context_token)
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional
+
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+from unstructured_ingest.data_types.file_data import BatchFileData, FileData
+
+from unstructured_platform_plugins.etl_uvicorn.result_cache import canonical_hash
+
+# Response header set when the plugin was skipped because the file hasn't changed
+INCREMENTAL_HEADER = "x-incremental"
+
+# previous: answer an unchanged file with the response stored when it was last processed
+# status: answer it with a response carrying only a 304 status, nothing is stored
+UnchangedResponse = Literal["previous", "status"]
+
+
+@dataclass
+class IncrementalConfig:
+    # SQLite database the index is kept in, created if it doesn't exist
+    path: str
+    unchanged_response: UnchangedResponse = "previous"
+
+
+@dataclass
+class IncrementalStats:
+    unchanged: int
+    processed: int
+    untracked: int
+
+
+@dataclass(frozen=True)
+class FileVersion:
+    identifier: str
+    # The source version of the file, or its modification date when the source has no versions
+    tag: str
+    # Hash of every other input, a file processed with different settings isn't unchanged
+    inputs_hash: str
+
+
+def get_file_version(plugin_id: str, kwargs: dict[str, Any]) -> Optional[FileVersion]:
+    """The file of an invocation at its current version, None if that can't be told."""
+    file_data = kwargs.get("file_data")
+    # A batch has no single identity
+    if not isinstance(file_data, FileData) or isinstance(file_data, BatchFileData):
+        return None
+    # A reprocess request asks for the plugin to run anyway
+    if file_data.reprocess:
+        return None
+    metadata = file_data.metadata
+    if metadata.version is not None:
+        tag = f"version:{metadata.version}"
+    elif metadata.date_modified is not None:
+        tag = f"date_modified:{metadata.date_modified}"
+    else:
+        return None
+    others = {name: value for name, value in kwargs.items() if name != "file_data"}
+    inputs_hash = canonical_hash(plugin_id, others)
+    # Other inputs that can't be compared, whether they changed can't be told either
+    if inputs_hash is None:
+        return None
+    return FileVersion(identifier=file_data.identifier, tag=tag, inputs_hash=inputs_hash)
+
+
+class IncrementalIndex:
+    """The last version of each file a plugin processed, and the response it produced for it.
+
+    Kept on disk keyed on `(plugin id, file_data.identifier)`, so a re-ingest run after a restart
+    only runs the plugin for the files whose version or modification date changed since.
+    """
+
+    def __init__(self, plugin_id: str, config: IncrementalConfig):
+        self.plugin_id = plugin_id
+        self.config = config
+        directory = os.path.dirname(config.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(config.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "plugin_id TEXT NOT NULL, identifier TEXT NOT NULL, tag TEXT NOT NULL, "
+            "inputs_hash TEXT NOT NULL, body BLOB NOT NULL, PRIMARY KEY (plugin_id, identifier))"
+        )
+        self._connection.commit()
+        self._unchanged = 0
+        self._processed = 0
+        self._untracked = 0
+
+    def version_of(self, kwargs: dict[str, Any]) -> Optional[FileVersion]:
+        version = get_file_version(self.plugin_id, kwargs)
+        if version is None:
+            self._untracked += 1
+        return version
+
+    def _lookup(self, version: FileVersion) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body FROM files "
+                "WHERE plugin_id = ? AND identifier = ? AND tag = ? AND inputs_hash = ?",
+                (self.plugin_id, version.identifier, version.tag, version.inputs_hash),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    async def lookup(self, version: FileVersion) -> Optional[bytes]:
+        """What was stored when the file was processed at this version, None if it wasn't."""
+        body = await asyncio.to_thread(self._lookup, version)
+        if body is None:
+            self._processed += 1
+        else:
+            self._unchanged += 1
+        return body
+
+    def _record(self, version: FileVersion, body: bytes) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (self.plugin_id, version.identifier, version.tag, version.inputs_hash, body),
+            )
+            self._connection.commit()
+
+    async def record(self, version: FileVersion, body: bytes) -> None:
+        if self.config.unchanged_response == "status":
+            body = b""
+        await asyncio.to_thread(self._record, version, body)
+
+    def stats(self) -> IncrementalStats:
+        return IncrementalStats(
+            unchanged=self._unchanged, processed=self._processed, untracked=self._untracked
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_counter(
+            "etl_plugin.incremental.unchanged",
+            callbacks=[observe("unchanged")],
+            description="Invocations skipped because their file hadn't changed",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.incremental.processed",
+            callbacks=[observe("processed")],
+            description="Invocations for a new or changed file",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.incremental.untracked",
+            callbacks=[observe("untracked")],
+            description="Invocations whose file has no version or modification date to compare",
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
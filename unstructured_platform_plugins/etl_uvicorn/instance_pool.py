@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Union
+
+from unstructured_platform_plugins.etl_uvicorn.invocation import CallStyle, get_call_style
+
+# Class attributes a plugin can set to have the wrapper pool its instances
+THREAD_SAFE_ATTRIBUTE = "thread_safe"
+POOL_SIZE_ATTRIBUTE = "instance_pool_size"
+
+
+@dataclass
+class _ThreadWaiter:
+    event: threading.Event = field(default_factory=threading.Event)
+    instance: Any = None
+
+    def offer(self, pool: "InstancePool", instance: Any) -> bool:
+        self.instance = instance
+        self.event.set()
+        return True
+
+
+@dataclass
+class _AsyncWaiter:
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+
+    def offer(self, pool: "InstancePool", instance: Any) -> bool:
+        if self.future.done():
+            return False
+
+        def deliver():
+            # The waiter may have been cancelled since the offer was made
+            if self.future.done():
+                pool.release(instance)
+            else:
+                self.future.set_result(instance)
+
+        self.loop.call_soon_threadsafe(deliver)
+        return True
+
+
+@dataclass
+class InstancePoolStats:
+    size: int
+    available: int
+    waiting: int
+
+
+class InstancePool:
+    """A fixed set of plugin instances, each leased to one invocation at a time.
+
+    Invocations wait for an instance on the event loop, a sync plugin is only handed to an executor
+    thread once it has one, so waiting for an instance doesn't tie up a thread. Calling a pooled
+    sync method directly leases from the calling thread instead.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int):
+        if size < 1:
+            raise ValueError(f"instance pool size must be at least 1, got {size}")
+        self.size = size
+        self._lock = threading.Lock()
+        self._available = deque(factory() for _ in range(size))
+        self._waiters: deque[Union[_ThreadWaiter, _AsyncWaiter]] = deque()
+        self._sample = self._available[0]
+
+    def release(self, instance: Any) -> None:
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft().offer(self, instance):
+                    return
+            self._available.append(instance)
+
+    def acquire(self) -> Any:
+        with self._lock:
+            if self._available:
+                return self._available.popleft()
+            waiter = _ThreadWaiter()
+            self._waiters.append(waiter)
+        waiter.event.wait()
+        return waiter.instance
+
+    async def acquire_async(self) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._available:
+                return self._available.popleft()
+            waiter = _AsyncWaiter(loop=loop, future=loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.future.result())
+            raise
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        instance = self.acquire()
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+    @asynccontextmanager
+    async def lease_async(self) -> AsyncIterator[Any]:
+        instance = await self.acquire_async()
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+    def stats(self) -> InstancePoolStats:
+        with self._lock:
+            return InstancePoolStats(
+                size=self.size, available=len(self._available), waiting=len(self._waiters)
+            )
+
+    def method(self, method_name: str) -> Callable:
+        """Builds a callable that leases an instance for each call of `method_name`.
+
+        It carries the bound method's signature and type hints, so it can be wrapped like the
+        method itself.
+        """
+        sample = getattr(self._sample, method_name)
+        call_style = get_call_style(sample)
+
+        if call_style is CallStyle.ASYNC_GENERATOR:
+
+            @wraps(sample)
+            async def pooled(**kwargs):
+                async with self.lease_async() as instance:
+                    async for item in getattr(instance, method_name)(**kwargs):
+                        yield item
+
+        elif call_style is CallStyle.SYNC_GENERATOR:
+
+            @wraps(sample)
+            def pooled(**kwargs):
+                # Iterated on an executor thread, the instance is held until the stream ends
+                with self.lease() as instance:
+                    yield from getattr(instance, method_name)(**kwargs)
+
+        elif call_style is CallStyle.COROUTINE:
+
+            @wraps(sample)
+            async def pooled(**kwargs):
+                async with self.lease_async() as instance:
+                    return await getattr(instance, method_name)(**kwargs)
+
+        else:
+
+            @wraps(sample)
+            def pooled(**kwargs):
+                with self.lease() as instance:
+                    return getattr(instance, method_name)(**kwargs)
+
+        pooled.instance_pool = self
+        pooled.method_name = method_name
+        return pooled
+
+
+def get_pool_size(cls: type, pool_size: Optional[int] = None) -> Optional[int]:
+    """How many instances of a plugin class to pool, None if one shared instance is fine."""
+    if pool_size is not None:
+        return pool_size
+    if getattr(cls, THREAD_SAFE_ATTRIBUTE, True):
+        return None
+    # Not thread safe and no size given, one instance serializes calls safely
+    return getattr(cls, POOL_SIZE_ATTRIBUTE, 1)
@@ -0,0 +1,154 @@
+import inspect
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, Optional, Union
+
+from unstructured_platform_plugins.etl_uvicorn.batching import MicroBatcher
+from unstructured_platform_plugins.etl_uvicorn.executors import PluginExecutor, run_sync
+from unstructured_platform_plugins.etl_uvicorn.streaming import (
+    MetadataDelta,
+    extend_metadata,
+    iterate_in_thread,
+)
+from unstructured_platform_plugins.schema import FileDataMeta, MessageChannels
+
+if TYPE_CHECKING:
+    from unstructured_platform_plugins.etl_uvicorn.process_pool import PluginProcessPool
+
+# Parameters the wrapper populates itself rather than reading from the request body
+INJECTABLES = ("usage", "message_channels", "filedata_meta", "cancellation_token")
+
+
+class CallStyle(str, Enum):
+    SYNC = "sync"
+    COROUTINE = "coroutine"
+    ASYNC_GENERATOR = "async_generator"
+    SYNC_GENERATOR = "sync_generator"
+
+
+# Call styles answered with a stream of frames rather than a single response
+STREAMING_CALL_STYLES = frozenset({CallStyle.ASYNC_GENERATOR, CallStyle.SYNC_GENERATOR})
+
+
+def get_call_style(func: Callable) -> CallStyle:
+    if inspect.isasyncgenfunction(func):
+        return CallStyle.ASYNC_GENERATOR
+    if inspect.isgeneratorfunction(func):
+        return CallStyle.SYNC_GENERATOR
+    if inspect.iscoroutinefunction(func):
+        return CallStyle.COROUTINE
+    return CallStyle.SYNC
+
+
+@dataclass(frozen=True)
+class InvocationPlan:
+    """Everything `wrap_fn` needs to know about a function, resolved once when the app is built.
+
+    Reflecting on the function (`inspect.signature`, `iscoroutinefunction`, ...) on every request
+    is measurable on hot plugins, so the results are captured here and each request only runs the
+    plan.
+    """
+
+    func: Callable
+    call_style: CallStyle
+    injectables: frozenset[str]
+    # Where a sync function runs, the event loop's default executor if not set
+    executor: Optional[Union[PluginExecutor, "PluginProcessPool"]] = None
+    # Collects concurrent invocations into calls of the plugin's batch function
+    batcher: Optional[MicroBatcher] = None
+    # How many items of a sync generator may wait for the event loop before it is paused
+    stream_buffer_size: int = 16
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.call_style in STREAMING_CALL_STYLES
+
+    def accepts(self, name: str) -> bool:
+        return name in self.injectables
+
+    def inject(self, kwargs: dict[str, Any], **injectables: Any) -> dict[str, Any]:
+        for name, value in injectables.items():
+            if name in self.injectables:
+                kwargs[name] = value
+        return kwargs
+
+    async def invoke(self, kwargs: Optional[dict[str, Any]] = None) -> Any:
+        kwargs = kwargs or {}
+        if self.batcher is not None:
+            return await self.batcher.submit(kwargs)
+        if self.call_style is CallStyle.COROUTINE:
+            return await self.func(**kwargs)
+        return await run_sync(self.executor, self.func, **kwargs)
+
+    async def _run_in_thread(self, fn: Callable[[], Any]) -> Any:
+        return await run_sync(self.executor, fn)
+
+    def stream(self, kwargs: Optional[dict[str, Any]] = None) -> AsyncIterator[Any]:
+        kwargs = kwargs or {}
+        if self.call_style is CallStyle.SYNC_GENERATOR:
+            return self._stream_in_thread(kwargs)
+        return self.func(**kwargs)
+
+    async def _stream_in_thread(self, kwargs: dict[str, Any]) -> AsyncIterator[Any]:
+        instance_pool = getattr(self.func, "instance_pool", None)
+        if instance_pool is None:
+            async for item in self._iterate_in_thread(self.func, kwargs):
+                yield item
+            return
+        # The instance is leased on the event loop and held until the stream ends
+        async with instance_pool.lease_async() as instance:
+            func = getattr(instance, self.func.method_name)
+            async for item in self._iterate_in_thread(func, kwargs):
+                yield item
+
+    async def _iterate_in_thread(
+        self, func: Callable, kwargs: dict[str, Any]
+    ) -> AsyncIterator[Any]:
+        # The generator runs ahead of the response on a thread for as long as the stream lasts. It
+        # gets metadata objects of its own and hands over what it added along with each item, so
+        # every frame sees the metadata of its own point in the stream and only this side touches
+        # the request's objects.
+        shared = (
+            kwargs.get("usage", []),
+            kwargs.get("message_channels", MessageChannels()),
+            kwargs.get("filedata_meta", FileDataMeta()),
+        )
+        private = ([], MessageChannels(), FileDataMeta())
+        delta = MetadataDelta()
+        call_kwargs = self.inject(
+            dict(kwargs),
+            usage=private[0],
+            message_channels=private[1],
+            filedata_meta=private[2],
+        )
+
+        def items() -> Iterator[tuple[Any, tuple]]:
+            for item in func(**call_kwargs):
+                yield item, delta.take(*private)
+
+        try:
+            async for item, new_metadata in iterate_in_thread(
+                items, run=self._run_in_thread, buffer_size=self.stream_buffer_size
+            ):
+                extend_metadata(*shared, new_metadata)
+                yield item
+        except Exception:
+            # The thread is done, whatever it added after its last item is kept too
+            extend_metadata(*shared, delta.take(*private))
+            raise
+        extend_metadata(*shared, delta.take(*private))
+
+
+def build_invocation_plan(
+    func: Callable,
+    executor: Optional[Union[PluginExecutor, "PluginProcessPool"]] = None,
+    batcher: Optional[MicroBatcher] = None,
+) -> InvocationPlan:
+    parameters = inspect.signature(func).parameters
+    return InvocationPlan(
+        func=func,
+        call_style=get_call_style(func),
+        injectables=frozenset(name for name in INJECTABLES if name in parameters),
+        executor=executor,
+        batcher=batcher,
+    )
@@ -10,6 +10,21 @@ from uvicorn.config import LOGGING_CONFIG, Config, RawConfigParser
 from uvicorn.main import main, run
 
 from unstructured_platform_plugins.etl_uvicorn.api_generator import generate_fast_api
+from unstructured_platform_plugins.etl_uvicorn.batching import MicroBatchConfig
+from unstructured_platform_plugins.etl_uvicorn.concurrency import (
+    AdaptiveLimitConfig,
+    AdmissionConfig,
+)
+from unstructured_platform_plugins.etl_uvicorn.executors import ExecutorConfig
+from unstructured_platform_plugins.etl_uvicorn.idempotency import IdempotencyConfig
+from unstructured_platform_plugins.etl_uvicorn.incremental import (
+    IncrementalConfig,
+    UnchangedResponse,
+)
+from unstructured_platform_plugins.etl_uvicorn.process_pool import ProcessPoolConfig
+from unstructured_platform_plugins.etl_uvicorn.replay import ReplayConfig
+from unstructured_platform_plugins.etl_uvicorn.result_cache import ResultCacheConfig
+from unstructured_platform_plugins.etl_uvicorn.streaming import CoalesceConfig
 
 
 def _install_signal_handlers_ignoring_sigterm(self: uvicorn.Server) -> None:
@@ -56,6 +71,51 @@ def get_command() -> click.Command:
         plugin_id_method: Optional[str] = None,
         precheck_app: Optional[str] = None,
         precheck_app_method: Optional[str] = None,
+        decode_mode: str = "schema",
+        encode_mode: str = "validated",
+        executor_workers: Optional[int] = None,
+        executor_thread_name_prefix: Optional[str] = None,
+        executor_queue_size: Optional[int] = None,
+        execution_mode: str = "thread",
+        process_workers: Optional[int] = None,
+        shared_memory_threshold: Optional[int] = None,
+        instance_pool_size: Optional[int] = None,
+        batch_app: Optional[str] = None,
+        batch_app_method: Optional[str] = None,
+        max_batch_size: int = 32,
+        max_batch_wait_ms: float = 5.0,
+        batch_target_latency_ms: Optional[float] = None,
+        invoke_batch_concurrency: int = 16,
+        max_in_flight: Optional[int] = None,
+        max_queued: int = 0,
+        retry_after: float = 1.0,
+        adaptive_concurrency: bool = False,
+        adaptive_max_in_flight: int = 256,
+        latency_tolerance: float = 2.0,
+        max_event_loop_lag_ms: float = 50.0,
+        cancel_on_disconnect: bool = False,
+        stream_protocol: str = "full",
+        stream_coalesce_bytes: Optional[int] = None,
+        stream_coalesce_items: Optional[int] = None,
+        stream_flush_interval_ms: Optional[float] = None,
+        stream_prefetch: Optional[int] = None,
+        stream_list_output: bool = False,
+        resumable_streams: bool = False,
+        replay_memory_bytes: int = 8 * 1024 * 1024,
+        replay_total_memory_bytes: int = 256 * 1024 * 1024,
+        replay_spill_dir: Optional[str] = None,
+        replay_retention: float = 300.0,
+        websocket: bool = False,
+        result_cache: bool = False,
+        result_cache_entries: int = 1024,
+        result_cache_ttl: float = 300.0,
+        result_cache_memory_bytes: int = 64 * 1024 * 1024,
+        single_flight: bool = False,
+        idempotency_store: Optional[str] = None,
+        idempotency_ttl: float = 24 * 60 * 60.0,
+        idempotency_compact_interval: float = 60 * 60.0,
+        incremental_index: Optional[str] = None,
+        incremental_unchanged: UnchangedResponse = "previous",
         **kwargs,
     ):
         # Make sure logging is configured before the call to run() so any setup has the same format
@@ -66,6 +126,77 @@ def get_command() -> click.Command:
             access_log=kwargs["access_log"],
         )
         config.configure_logging()
+        executor_config = None
+        if any(
+            option is not None
+            for option in [executor_workers, executor_thread_name_prefix, executor_queue_size]
+        ):
+            executor_config = ExecutorConfig(
+                max_workers=executor_workers,
+                max_queue_size=executor_queue_size,
+            )
+            if executor_thread_name_prefix:
+                executor_config.thread_name_prefix = executor_thread_name_prefix
+        process_pool_config = None
+        if execution_mode == "process":
+            process_pool_config = ProcessPoolConfig(max_workers=process_workers)
+            if shared_memory_threshold is not None:
+                process_pool_config.shared_memory_threshold = shared_memory_threshold
+        batch_config = MicroBatchConfig(
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_batch_wait_ms,
+            target_latency_ms=batch_target_latency_ms,
+        )
+        admission_config = None
+        if max_in_flight is not None or adaptive_concurrency:
+            admission_config = AdmissionConfig(
+                max_in_flight=max_in_flight or 16,
+                max_queue_size=max_queued,
+                retry_after=retry_after,
+            )
+            if adaptive_concurrency:
+                admission_config.adaptive = AdaptiveLimitConfig(
+                    max_limit=adaptive_max_in_flight,
+                    latency_tolerance=latency_tolerance,
+                    max_event_loop_lag_ms=max_event_loop_lag_ms,
+                )
+        coalesce_config = None
+        coalesce_options = {
+            "max_bytes": stream_coalesce_bytes,
+            "max_items": stream_coalesce_items,
+            "flush_interval_ms": stream_flush_interval_ms,
+        }
+        if any(option is not None for option in coalesce_options.values()):
+            coalesce_config = CoalesceConfig(
+                **{name: value for name, value in coalesce_options.items() if value is not None}
+            )
+        replay_config = None
+        if resumable_streams:
+            replay_config = ReplayConfig(
+                max_memory_bytes=replay_memory_bytes,
+                max_total_memory_bytes=replay_total_memory_bytes,
+                spill_dir=replay_spill_dir,
+                retention=replay_retention,
+            )
+        result_cache_config = None
+        if result_cache:
+            result_cache_config = ResultCacheConfig(
+                max_entries=result_cache_entries,
+                ttl=result_cache_ttl,
+                max_memory_bytes=result_cache_memory_bytes,
+            )
+        idempotency_config = None
+        if idempotency_store is not None:
+            idempotency_config = IdempotencyConfig(
+                path=idempotency_store,
+                ttl=idempotency_ttl,
+                compact_interval=idempotency_compact_interval,
+            )
+        incremental_config = None
+        if incremental_index is not None:
+            incremental_config = IncrementalConfig(
+                path=incremental_index, unchanged_response=incremental_unchanged
+            )
         fastapi_app = generate_fast_api(
             app=app,
             method_name=method_name,
@@ -73,6 +204,27 @@ def get_command() -> click.Command:
             id_method=plugin_id_method,
             precheck_str=precheck_app,
             precheck_method=precheck_app_method,
+            decode_mode=decode_mode,
+            encode_mode=encode_mode,
+            executor_config=executor_config,
+            process_pool_config=process_pool_config,
+            instance_pool_size=instance_pool_size,
+            batch_str=batch_app,
+            batch_method=batch_app_method,
+            batch_config=batch_config,
+            invoke_batch_concurrency=invoke_batch_concurrency,
+            admission_config=admission_config,
+            cancel_on_disconnect=cancel_on_disconnect,
+            stream_protocol=stream_protocol,
+            coalesce_config=coalesce_config,
+            stream_prefetch=stream_prefetch,
+            stream_list_output=stream_list_output,
+            replay_config=replay_config,
+            websocket=websocket,
+            result_cache_config=result_cache_config,
+            single_flight=single_flight,
+            idempotency_config=idempotency_config,
+            incremental_config=incremental_config,
         )
         # Explicitly map values that are manipulated in the original
         # call to run(), preventing **kwargs reference
@@ -130,6 +282,357 @@ def get_command() -> click.Command:
                 "If precheck-app not provided, assumes method "
                 "lives on main class passes in.",
             ),
+            click.Option(
+                ["--decode-mode"],
+                required=False,
+                type=click.Choice(["schema", "native"]),
+                default="schema",
+                help="How request bodies are decoded. 'native' reads the raw body once straight "
+                "into the argument types the function declares instead of going through the "
+                "model rebuilt from the json schema.",
+            ),
+            click.Option(
+                ["--encode-mode"],
+                required=False,
+                type=click.Choice(["trusted", "validated"]),
+                default="validated",
+                help="How responses are encoded. 'validated' checks the plugin output against its "
+                "output signature, coercing values and filling in defaults. 'trusted' serializes "
+                "the output once as returned, for plugins that already return exactly the "
+                "declared types.",
+            ),
+            click.Option(
+                ["--executor-workers"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="Run a sync plugin on its own thread pool with this many workers "
+                "instead of the event loop's shared default executor.",
+            ),
+            click.Option(
+                ["--executor-thread-name-prefix"],
+                required=False,
+                type=str,
+                default=None,
+                help="Thread name prefix for the plugin's own thread pool.",
+            ),
+            click.Option(
+                ["--executor-queue-size"],
+                required=False,
+                type=click.IntRange(min=0),
+                default=None,
+                help="How many calls may wait for a free thread in the plugin's own thread "
+                "pool. Calls beyond that are answered with a 503. Unbounded if not set.",
+            ),
+            click.Option(
+                ["--execution-mode"],
+                required=False,
+                type=click.Choice(["thread", "process"]),
+                default="thread",
+                help="Where a sync plugin runs. 'process' runs it in a pool of worker "
+                "processes, each importing the plugin once, for CPU-bound plugins that "
+                "hold the GIL.",
+            ),
+            click.Option(
+                ["--process-workers"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="Number of worker processes when --execution-mode is 'process'. "
+                "Defaults to the cpu count.",
+            ),
+            click.Option(
+                ["--shared-memory-threshold"],
+                required=False,
+                type=click.IntRange(min=0),
+                default=None,
+                help="Size in bytes from which arguments and results passed to worker "
+                "processes travel through shared memory. Defaults to 1 MiB.",
+            ),
+            click.Option(
+                ["--instance-pool-size"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="If the app is a class, create this many instances and lease one to each "
+                "invocation. Overrides the instance_pool_size a class declares, by default only "
+                "classes declaring thread_safe = False are pooled.",
+            ),
+            click.Option(
+                ["--batch-app"],
+                required=False,
+                type=str,
+                default=None,
+                help="If provided, must point to a function taking a list of inputs and "
+                "returning a list of outputs. Concurrent invocations are collected into "
+                "calls of it.",
+            ),
+            click.Option(
+                ["--batch-app-method"],
+                required=False,
+                type=str,
+                default=None,
+                help="If provided, points to the batch method to call on a class. "
+                "If batch-app not provided, assumes method lives on the same "
+                "instance as the wrapped method.",
+            ),
+            click.Option(
+                ["--max-batch-size"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=32,
+                help="Maximum number of invocations passed to one call of the batch method.",
+            ),
+            click.Option(
+                ["--max-batch-wait-ms"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=5.0,
+                help="How long the first invocation of a batch waits for others to join it.",
+            ),
+            click.Option(
+                ["--batch-target-latency-ms"],
+                required=False,
+                type=click.FloatRange(min=0, min_open=True),
+                default=None,
+                help="If provided, the batch size adapts to keep each call of the batch "
+                "method close to this latency, never exceeding --max-batch-size.",
+            ),
+            click.Option(
+                ["--invoke-batch-concurrency"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=16,
+                help="How many inputs of one /invoke/batch request are run at the same time.",
+            ),
+            click.Option(
+                ["--max-in-flight"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="If provided, at most this many /invoke and /invoke/batch requests run "
+                "at the same time. Unlimited if not set.",
+            ),
+            click.Option(
+                ["--max-queued"],
+                required=False,
+                type=click.IntRange(min=0),
+                default=0,
+                help="How many requests may wait for one of the --max-in-flight slots. "
+                "Requests beyond that are answered with a 429 right away.",
+            ),
+            click.Option(
+                ["--retry-after"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=1.0,
+                help="Seconds sent in the Retry-After header of rejected requests.",
+            ),
+            click.Option(
+                ["--adaptive-concurrency"],
+                is_flag=True,
+                default=False,
+                help="Adapt the in-flight limit to keep /invoke latency near its no-load "
+                "baseline, starting from --max-in-flight (16 if not set).",
+            ),
+            click.Option(
+                ["--adaptive-max-in-flight"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=256,
+                help="Highest in-flight limit --adaptive-concurrency may reach.",
+            ),
+            click.Option(
+                ["--latency-tolerance"],
+                required=False,
+                type=click.FloatRange(min=1),
+                default=2.0,
+                help="Multiple of the baseline latency above which --adaptive-concurrency "
+                "lowers the limit.",
+            ),
+            click.Option(
+                ["--max-event-loop-lag-ms"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=50.0,
+                help="Event loop lag above which --adaptive-concurrency lowers the limit.",
+            ),
+            click.Option(
+                ["--cancel-on-disconnect"],
+                is_flag=True,
+                default=False,
+                help="Cancel an invocation when its client disconnects. Sync plugins are "
+                "signalled through the invocation's cancellation token.",
+            ),
+            click.Option(
+                ["--stream-protocol"],
+                required=False,
+                type=click.Choice(["full", "delta"]),
+                default="full",
+                help="How streaming plugins' NDJSON frames are built. 'full' repeats all the "
+                "metadata accumulated so far in every frame, 'delta' only sends what was added "
+                "since the previous frame and ends with a summary frame.",
+            ),
+            click.Option(
+                ["--stream-coalesce-bytes"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="Buffer streamed frames and write them as one chunk once they reach this "
+                "many bytes. Setting this, --stream-coalesce-items or --stream-flush-interval-ms "
+                "enables coalescing, with defaults of 64 KiB, 256 frames and 50 ms.",
+            ),
+            click.Option(
+                ["--stream-coalesce-items"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="Write buffered frames as one chunk once this many are waiting.",
+            ),
+            click.Option(
+                ["--stream-flush-interval-ms"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=None,
+                help="Longest a streamed frame waits in the coalescing buffer.",
+            ),
+            click.Option(
+                ["--stream-prefetch"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=None,
+                help="Run streaming plugins ahead of the client, producing up to this many "
+                "frames before waiting for them to be sent.",
+            ),
+            click.Option(
+                ["--stream-list-output"],
+                is_flag=True,
+                default=False,
+                help="Write a plugin's list output into the response body one element at a time "
+                "instead of encoding the whole response first. Requires a list output signature "
+                "and the trusted encode mode.",
+            ),
+            click.Option(
+                ["--resumable-streams"],
+                is_flag=True,
+                default=False,
+                help="Run streams to completion in the background, numbering their frames so a "
+                "client that lost its connection can resume from GET /invoke/stream/{id}.",
+            ),
+            click.Option(
+                ["--replay-memory-bytes"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=8 * 1024 * 1024,
+                help="Bytes of frames each resumable stream keeps in memory.",
+            ),
+            click.Option(
+                ["--replay-total-memory-bytes"],
+                required=False,
+                type=click.IntRange(min=0),
+                default=256 * 1024 * 1024,
+                help="Bytes of frames all resumable streams keep in memory together, the oldest "
+                "streams spill or drop frames past it.",
+            ),
+            click.Option(
+                ["--replay-spill-dir"],
+                required=False,
+                type=click.Path(file_okay=False),
+                default=None,
+                help="Directory older frames of resumable streams are spilled to. Without it "
+                "they are dropped and can no longer be replayed.",
+            ),
+            click.Option(
+                ["--replay-retention"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=300.0,
+                help="Seconds a finished stream can still be resumed.",
+            ),
+            click.Option(
+                ["--websocket"],
+                is_flag=True,
+                default=False,
+                help="Add a /invoke/ws WebSocket endpoint running many invocations, tagged with "
+                "correlation ids, concurrently over one connection.",
+            ),
+            click.Option(
+                ["--result-cache"],
+                is_flag=True,
+                default=False,
+                help="Answer /invoke requests with the same inputs as an earlier successful one "
+                "from a cache instead of running the plugin again. Plugins setting "
+                "cacheable = False are never cached.",
+            ),
+            click.Option(
+                ["--result-cache-entries"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=1024,
+                help="Results the cache holds before evicting the least recently used.",
+            ),
+            click.Option(
+                ["--result-cache-ttl"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=300.0,
+                help="Seconds a result is served from the cache.",
+            ),
+            click.Option(
+                ["--result-cache-memory-bytes"],
+                required=False,
+                type=click.IntRange(min=1),
+                default=64 * 1024 * 1024,
+                help="Bytes of encoded responses the cache holds before evicting the least "
+                "recently used.",
+            ),
+            click.Option(
+                ["--single-flight"],
+                is_flag=True,
+                default=False,
+                help="Run identical /invoke requests that arrive while one is already running "
+                "only once, sharing its response or stream with every caller.",
+            ),
+            click.Option(
+                ["--idempotency-store"],
+                required=False,
+                type=click.Path(dir_okay=False),
+                default=None,
+                help="SQLite database storing the responses of /invoke requests sent with an "
+                "Idempotency-Key header, so a retry with the same key gets the stored response "
+                "back, also after a restart.",
+            ),
+            click.Option(
+                ["--idempotency-ttl"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=24 * 60 * 60.0,
+                help="Seconds a response is returned for retries of its idempotency key.",
+            ),
+            click.Option(
+                ["--idempotency-compact-interval"],
+                required=False,
+                type=click.FloatRange(min=0),
+                default=60 * 60.0,
+                help="Seconds between passes removing expired responses from the idempotency "
+                "store.",
+            ),
+            click.Option(
+                ["--incremental-index"],
+                required=False,
+                type=click.Path(dir_okay=False),
+                default=None,
+                help="SQLite database recording the version of each file the plugin processed, "
+                "an /invoke request for a file whose version or modification date hasn't changed "
+                "since is answered without running the plugin.",
+            ),
+            click.Option(
+                ["--incremental-unchanged"],
+                type=click.Choice(["previous", "status"]),
+                default="previous",
+                help="What an unchanged file is answered with: the response from when it was "
+                "last processed, or only a 304 status code, which stores nothing per file.",
+            ),
         ]
     )
     return cmd
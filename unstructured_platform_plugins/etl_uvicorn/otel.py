@@ -1,7 +1,9 @@
 import os
 from typing import Literal, TypedDict
 
+from opentelemetry import metrics
 from opentelemetry.environment_variables import OTEL_METRICS_EXPORTER, OTEL_TRACES_EXPORTER
+from opentelemetry.metrics import Meter
 from opentelemetry.sdk.environment_variables import OTEL_SERVICE_NAME
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.metrics.export import (
@@ -68,6 +70,13 @@ def get_metric_provider() -> MeterProvider | None:
     )
 
 
+def get_meter(name: str, meter_provider: MeterProvider | None = None) -> Meter:
+    # Falls back to the global provider, which is a no-op unless one was configured elsewhere
+    if meter_provider is None:
+        return metrics.get_meter(name)
+    return meter_provider.get_meter(name)
+
+
 def _add_trace_exporter(exporter_type: TraceExporterType, provider: TracerProvider):
     if exporter_type == "otlp":
         _add_traces_otlp_exporter(
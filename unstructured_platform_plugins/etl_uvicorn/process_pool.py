@@ -0,0 +1,198 @@
+import asyncio
+import multiprocessing
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Optional
+
+from uvicorn.importer import import_from_string
+
+from unstructured_platform_plugins.etl_uvicorn.utils import get_func
+from unstructured_platform_plugins.schema import FileDataMeta, MessageChannels
+
+
+class RemotePluginError(Exception):
+    """Stands in for an exception raised in a worker process that could not be pickled."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ProcessPoolConfig:
+    # Import string and method of the plugin, every worker resolves its own copy of the function
+    app: Optional[str] = None
+    method_name: Optional[str] = None
+    # None falls back to the ProcessPoolExecutor default of the cpu count
+    max_workers: Optional[int] = None
+    # Pickled arguments and results at least this large travel through shared memory
+    shared_memory_threshold: int = 1024 * 1024
+    mp_context: str = "spawn"
+
+
+@dataclass
+class SharedPayload:
+    """A pickled object, either inline or parked in a shared memory block.
+
+    Whichever process loads a shared memory payload owns the block and unlinks it.
+    """
+
+    data: Optional[bytes] = None
+    shm_name: Optional[str] = None
+    size: int = 0
+
+    @classmethod
+    def dump(cls, obj: Any, threshold: int) -> "SharedPayload":
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) < threshold:
+            return cls(data=data)
+        shm = SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[: len(data)] = data
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        shm.close()
+        return cls(shm_name=shm.name, size=len(data))
+
+    def load(self) -> Any:
+        if self.shm_name is None:
+            return pickle.loads(self.data)
+        shm = SharedMemory(name=self.shm_name)
+        view = shm.buf[: self.size]
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+            shm.close()
+            shm.unlink()
+
+    def discard(self) -> None:
+        if self.shm_name is None:
+            return
+        try:
+            shm = SharedMemory(name=self.shm_name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+# Injectables the plugin mutates, the worker sends its copies back to be applied to the parent's.
+# The cancellation token travels with the other arguments, only its deadline makes it across.
+RETURNED_INJECTABLES = ("usage", "message_channels", "filedata_meta")
+
+_worker_func: Optional[Callable] = None
+
+
+def _initialize_worker(app: str, method_name: Optional[str]) -> None:
+    # Runs once per worker process, so the plugin module is only imported once per worker
+    global _worker_func
+    _worker_func = get_func(import_from_string(app), method_name)
+
+
+def _picklable_error(error: Exception) -> Exception:
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RemotePluginError(
+            f"[{error.__class__.__name__}] {error}", status_code=getattr(error, "status_code", None)
+        )
+
+
+def _invoke_in_worker(
+    payload: SharedPayload, injectables: frozenset[str], threshold: int
+) -> SharedPayload:
+    kwargs = payload.load()
+    usage = []
+    message_channels = MessageChannels()
+    filedata_meta = FileDataMeta()
+    injected = {
+        "usage": usage,
+        "message_channels": message_channels,
+        "filedata_meta": filedata_meta,
+    }
+    kwargs.update({name: value for name, value in injected.items() if name in injectables})
+    result = {"output": None, "error": None}
+    try:
+        result["output"] = _worker_func(**kwargs)
+    except Exception as e:
+        result["error"] = _picklable_error(e)
+    # The injectables were mutated in this process, send them back so the parent can apply them
+    result.update(injected)
+    return SharedPayload.dump(result, threshold)
+
+
+def _discard_leftovers(future: Future, payload: SharedPayload) -> None:
+    if future.cancelled() or future.exception() is not None:
+        payload.discard()
+    else:
+        future.result().discard()
+
+
+class PluginProcessPool:
+    """Runs a sync plugin in a pool of worker processes instead of threads.
+
+    CPU-bound plugins hold the GIL, so threads do not scale past a single core per server process.
+    Mutations a worker makes to `usage`, `message_channels` and `filedata_meta` are applied back
+    to the parent's objects, so the response looks the same as when the plugin runs in a thread.
+    """
+
+    def __init__(self, config: ProcessPoolConfig):
+        if not config.app:
+            raise ValueError("process pool execution requires an import string for the plugin")
+        self.config = config
+        self._executor = ProcessPoolExecutor(
+            max_workers=config.max_workers,
+            mp_context=multiprocessing.get_context(config.mp_context),
+            initializer=_initialize_worker,
+            initargs=(config.app, config.method_name),
+        )
+
+    @staticmethod
+    def _apply(injected: dict[str, Any], result: dict[str, Any]) -> None:
+        if "usage" in injected:
+            injected["usage"].extend(result["usage"])
+        if "message_channels" in injected:
+            injected["message_channels"].infos.extend(result["message_channels"].infos)
+            injected["message_channels"].warnings.extend(result["message_channels"].warnings)
+        if "filedata_meta" in injected:
+            filedata_meta = injected["filedata_meta"]
+            filedata_meta.terminate_current = result["filedata_meta"].terminate_current
+            filedata_meta.new_records.extend(result["filedata_meta"].new_records)
+
+    async def run(self, fn: Callable, **kwargs: Any) -> Any:
+        # `fn` only stands for the plugin in the parent, the workers call the one they imported
+        injected = {name: kwargs.pop(name) for name in RETURNED_INJECTABLES if name in kwargs}
+        threshold = self.config.shared_memory_threshold
+        payload = SharedPayload.dump(kwargs, threshold)
+        try:
+            future = self._executor.submit(
+                _invoke_in_worker, payload, frozenset(injected), threshold
+            )
+        except BaseException:
+            payload.discard()
+            raise
+        try:
+            result_payload = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Nobody is left to load whatever the call leaves behind in shared memory
+            future.add_done_callback(partial(_discard_leftovers, payload=payload))
+            raise
+        except BaseException:
+            # A worker that died or a broken pool may never have loaded the arguments
+            payload.discard()
+            raise
+        result = result_payload.load()
+        self._apply(injected, result)
+        if result["error"] is not None:
+            raise result["error"]
+        return result["output"]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
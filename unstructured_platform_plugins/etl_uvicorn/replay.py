@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+
+from fastapi import status
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+
+logger = logging.getLogger("uvicorn.error")
+
+# Response header carrying the id a client resumes an interrupted stream with
+STREAM_ID_HEADER = "x-stream-id"
+# Request header with the sequence number of the last frame the client received
+LAST_EVENT_ID_HEADER = "last-event-id"
+
+
+class ReplayFramesLostError(Exception):
+    status_code = status.HTTP_410_GONE
+
+
+@dataclass
+class ReplayConfig:
+    # Bytes of frames each stream keeps in memory, older frames are spilled or dropped
+    max_memory_bytes: int = 8 * 1024 * 1024
+    # Bytes of frames all streams keep in memory together, past it the oldest streams give way
+    max_total_memory_bytes: int = 256 * 1024 * 1024
+    # Directory older frames are spilled to, they are dropped if not set
+    spill_dir: Optional[str] = None
+    # How long a finished stream can still be resumed, in seconds
+    retention: float = 300.0
+    # Finished streams kept for resuming at once, the oldest is dropped to make room
+    max_retained_streams: int = 1024
+
+
+@dataclass
+class ReplayStats:
+    streams: int
+    resumed: int
+    memory_bytes: int
+    spilled_bytes: int
+    dropped_frames: int
+
+
+class ReplayBuffer:
+    """Every frame of one stream, numbered from 0, for as long as they can be replayed.
+
+    The newest frames are kept in memory up to `max_memory_bytes`, less when the store is over
+    its total budget. Older ones are appended to a temporary file when a spill directory is
+    configured and forgotten otherwise. The file is written and read on a worker thread, an
+    evicted frame stays in memory until it is on disk.
+    """
+
+    def __init__(self, stream_id: str, config: ReplayConfig, store: "ReplayStore"):
+        self.stream_id = stream_id
+        self.config = config
+        self.done = False
+        # Lowest sequence number that can still be read
+        self.first_seq = 0
+        self.next_seq = 0
+        self.readers = 0
+        self._store = store
+        self._prefix = b'{"stream_id":"%s","seq":' % stream_id.encode()
+        self._memory: deque[bytes] = deque()
+        self._memory_bytes = 0
+        self._spill = None
+        self._spill_size = 0
+        self._spilled: list[tuple[int, int]] = []
+        # Evictions of one buffer run one at a time, the spill file is only closed once idle
+        self._evict_lock = asyncio.Lock()
+        self._pending_io = 0
+        self._closed = False
+        self._changed = asyncio.Event()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    async def append(self, frame: bytes) -> None:
+        # Frames are json objects, the stream id and sequence number become their first keys
+        frame = self._prefix + b"%d," % self.next_seq + frame[1:]
+        self._memory.append(frame)
+        self._memory_bytes += len(frame)
+        self._store.memory_bytes += len(frame)
+        self.next_seq += 1
+        self._notify()
+        if self._memory_bytes > self.config.max_memory_bytes:
+            await self.evict(until_bytes=self.config.max_memory_bytes, keep=1)
+        await self._store.enforce_memory_budget()
+
+    async def evict(self, until_bytes: int, keep: int = 0) -> None:
+        """Moves the oldest frames out of memory until at most `until_bytes` of it are used.
+
+        The newest `keep` frames stay whatever their size.
+        """
+        async with self._evict_lock:
+            count = size = 0
+            for frame in self._memory:
+                if self._memory_bytes - size <= until_bytes or len(self._memory) - count <= keep:
+                    break
+                count += 1
+                size += len(frame)
+            if count == 0:
+                return
+            if self.config.spill_dir is None:
+                self.first_seq += count
+                self._store.dropped_frames += count
+            else:
+                frames = [self._memory[i] for i in range(count)]
+                await self._run_io(self._write_spill, b"".join(frames))
+                if self._closed:
+                    return
+                for frame in frames:
+                    self._spilled.append((self._spill_size, len(frame)))
+                    self._spill_size += len(frame)
+                self._store.spilled_bytes += size
+            for _ in range(count):
+                self._memory.popleft()
+            self._memory_bytes -= size
+            self._store.memory_bytes -= size
+
+    def _write_spill(self, data: bytes) -> None:
+        if self._spill is None:
+            # Closed with the buffer, the file has no name and disappears with it
+            self._spill = tempfile.TemporaryFile(dir=self.config.spill_dir)  # noqa: SIM115
+        self._spill.write(data)
+        # Read back with pread, which doesn't see what is still in the file object's buffer
+        self._spill.flush()
+
+    async def _run_io(self, fn: Callable, *args: Any) -> Any:
+        self._pending_io += 1
+        try:
+            return await asyncio.to_thread(fn, *args)
+        finally:
+            self._pending_io -= 1
+            self._close_spill_if_idle()
+
+    def finish(self) -> None:
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _get(self, seq: int) -> bytes:
+        memory_start = self.next_seq - len(self._memory)
+        if seq >= memory_start:
+            return self._memory[seq - memory_start]
+        offset, length = self._spilled[seq - self.first_seq]
+        return await self._run_io(os.pread, self._spill.fileno(), length, offset)
+
+    async def read(self, after: int = -1) -> AsyncIterator[bytes]:
+        """Frames numbered after `after`, waiting for new ones until the stream is done."""
+        seq = after + 1
+        self.readers += 1
+        try:
+            while True:
+                if seq < self.first_seq:
+                    raise ReplayFramesLostError(
+                        f"frames {seq} to {self.first_seq - 1} of stream {self.stream_id} "
+                        "are no longer available"
+                    )
+                if seq < self.next_seq:
+                    frame = await self._get(seq)
+                    if seq < self.first_seq:
+                        # Closed while the frame was read from disk
+                        continue
+                    yield frame
+                    seq += 1
+                elif self.done:
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.readers -= 1
+
+    def close(self) -> None:
+        # Readers still attached find the frames gone rather than an empty buffer
+        self._closed = True
+        self.first_seq = self.next_seq
+        self.finish()
+        self._memory.clear()
+        self._store.memory_bytes -= self._memory_bytes
+        self._memory_bytes = 0
+        self._close_spill_if_idle()
+
+    def _close_spill_if_idle(self) -> None:
+        # A worker thread may still be reading or writing the file
+        if self._closed and self._pending_io == 0 and self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+class ReplayStore:
+    """Runs resumable streams in the background and keeps their frames for clients that reconnect.
+
+    A stream is produced into its `ReplayBuffer` by a task of its own, so it keeps going when the
+    connection drops and a client resuming it only gets the frames it missed instead of starting
+    the plugin over. Finished streams are kept for `retention` seconds.
+    """
+
+    def __init__(self, config: Optional[ReplayConfig] = None):
+        self.config = config or ReplayConfig()
+        if self.config.spill_dir is not None:
+            os.makedirs(self.config.spill_dir, exist_ok=True)
+        self._buffers: dict[str, ReplayBuffer] = {}
+        self._retained: OrderedDict[str, asyncio.TimerHandle] = OrderedDict()
+        self._producers: set[asyncio.Task] = set()
+        self._resumed = 0
+        self._reclaim_lock = asyncio.Lock()
+        # Counted by the buffers as they append and evict frames
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.dropped_frames = 0
+
+    def start(self, frames: AsyncIterator[bytes]) -> ReplayBuffer:
+        buffer = ReplayBuffer(uuid.uuid4().hex, self.config, store=self)
+        self._buffers[buffer.stream_id] = buffer
+
+        async def produce() -> None:
+            try:
+                async for frame in frames:
+                    await buffer.append(frame)
+            except Exception as e:
+                logger.error(f"resumable stream {buffer.stream_id} failed: {e}", exc_info=True)
+            finally:
+                buffer.finish()
+                self._retain(buffer)
+
+        producer = asyncio.ensure_future(produce())
+        self._producers.add(producer)
+        producer.add_done_callback(self._producers.discard)
+        return buffer
+
+    async def enforce_memory_budget(self) -> None:
+        """Evicts frames of the oldest streams while all of them hold more than the total budget.
+
+        Finished streams give way first, a client is less likely to come back to them.
+        """
+        if self.memory_bytes <= self.config.max_total_memory_bytes:
+            return
+        async with self._reclaim_lock:
+            for buffer in sorted(self._buffers.values(), key=lambda b: not b.done):
+                excess = self.memory_bytes - self.config.max_total_memory_bytes
+                if excess <= 0:
+                    break
+                await buffer.evict(until_bytes=max(buffer.memory_bytes - excess, 0))
+
+    def resume(self, stream_id: str) -> Optional[ReplayBuffer]:
+        buffer = self._buffers.get(stream_id)
+        if buffer is not None:
+            self._resumed += 1
+        return buffer
+
+    def _retain(self, buffer: ReplayBuffer) -> None:
+        while len(self._retained) >= self.config.max_retained_streams:
+            stream_id, timer = self._retained.popitem(last=False)
+            timer.cancel()
+            self._drop(stream_id)
+        timer = asyncio.get_running_loop().call_later(
+            self.config.retention, self._expire, buffer.stream_id
+        )
+        self._retained[buffer.stream_id] = timer
+
+    def _expire(self, stream_id: str) -> None:
+        buffer = self._buffers.get(stream_id)
+        if buffer is not None and buffer.readers:
+            # Still being replayed, look again later
+            self._retained[stream_id] = asyncio.get_running_loop().call_later(
+                self.config.retention, self._expire, stream_id
+            )
+            return
+        self._retained.pop(stream_id, None)
+        self._drop(stream_id)
+
+    def _drop(self, stream_id: str) -> None:
+        buffer = self._buffers.pop(stream_id, None)
+        if buffer is not None:
+            buffer.close()
+
+    def stats(self) -> ReplayStats:
+        return ReplayStats(
+            streams=len(self._buffers),
+            resumed=self._resumed,
+            memory_bytes=self.memory_bytes,
+            spilled_bytes=self.spilled_bytes,
+            dropped_frames=self.dropped_frames,
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.replay.streams",
+            callbacks=[observe("streams")],
+            description="Streams currently running or kept for resuming",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.replay.resumed",
+            callbacks=[observe("resumed")],
+            description="Streams a client reconnected to",
+        )
+        meter.create_observable_gauge(
+            "etl_plugin.replay.memory_bytes",
+            unit="By",
+            callbacks=[observe("memory_bytes")],
+            description="Bytes of streamed frames all resumable streams keep in memory",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.replay.spilled_bytes",
+            unit="By",
+            callbacks=[observe("spilled_bytes")],
+            description="Bytes of streamed frames spilled to disk",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.replay.dropped_frames",
+            callbacks=[observe("dropped_frames")],
+            description="Streamed frames that can no longer be replayed",
+        )
+
+    async def shutdown(self) -> None:
+        for producer in self._producers:
+            producer.cancel()
+        await asyncio.gather(*self._producers, return_exceptions=True)
+        for timer in self._retained.values():
+            timer.cancel()
+        self._retained.clear()
+        for stream_id in list(self._buffers):
+            self._drop(stream_id)
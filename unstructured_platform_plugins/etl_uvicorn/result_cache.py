@@ -0,0 +1,155 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+from pydantic_core import PydanticSerializationError, to_jsonable_python
+
+# Attribute a plugin function or class can set to opt in to (True) or out of (False) caching
+CACHEABLE_ATTRIBUTE = "cacheable"
+# Response header telling a client its response came from the cache
+CACHE_HEADER = "x-cache"
+
+
+@dataclass
+class ResultCacheConfig:
+    max_entries: int = 1024
+    # Seconds a result is served from the cache after the plugin produced it
+    ttl: float = 300.0
+    # Bytes of encoded responses kept at once, the least recently used are evicted to make room
+    max_memory_bytes: int = 64 * 1024 * 1024
+
+
+@dataclass
+class ResultCacheStats:
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+def is_cacheable(func: Callable) -> Optional[bool]:
+    """Whether the plugin marked itself cacheable, None if it doesn't say."""
+    # Set on the function itself, or on the class of a method, pooled ones included
+    owners = [
+        func,
+        getattr(func, "__self__", None),
+        getattr(getattr(func, "__wrapped__", None), "__self__", None),
+    ]
+    for owner in owners:
+        cacheable = getattr(owner, CACHEABLE_ATTRIBUTE, None)
+        if cacheable is not None:
+            return bool(cacheable)
+    return None
+
+
+def canonical_hash(plugin_id: str, inputs: dict[str, Any]) -> Optional[str]:
+    """A hash of the decoded inputs that doesn't depend on how the request body was written.
+
+    None if an input has no json form, such as an arbitrary class or a stream. Its repr can't tell
+    two different values apart, so such inputs are never considered equal to anything.
+    """
+    try:
+        jsonable = to_jsonable_python(inputs)
+    except PydanticSerializationError:
+        return None
+    canonical = json.dumps(jsonable, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{plugin_id}\n{canonical}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Encoded responses of successful invocations, keyed by a hash of the plugin id and inputs.
+
+    Entries expire `ttl` seconds after they were stored. Past `max_entries` entries or
+    `max_memory_bytes` of responses the least recently used entries are evicted.
+    """
+
+    def __init__(self, plugin_id: str, config: Optional[ResultCacheConfig] = None):
+        self.plugin_id = plugin_id
+        self.config = config or ResultCacheConfig()
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def key(self, inputs: dict[str, Any]) -> Optional[str]:
+        return canonical_hash(self.plugin_id, inputs)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def put(self, key: str, body: bytes) -> None:
+        if len(body) > self.config.max_memory_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.config.ttl, body)
+        self._bytes += len(body)
+        while (
+            len(self._entries) > self.config.max_entries
+            or self._bytes > self.config.max_memory_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+            self._evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> ResultCacheStats:
+        return ResultCacheStats(
+            entries=len(self._entries),
+            bytes=self._bytes,
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.result_cache.entries",
+            callbacks=[observe("entries")],
+            description="Results currently cached",
+        )
+        meter.create_observable_gauge(
+            "etl_plugin.result_cache.bytes",
+            unit="By",
+            callbacks=[observe("bytes")],
+            description="Bytes of encoded responses currently cached",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.result_cache.hits",
+            callbacks=[observe("hits")],
+            description="Invocations answered from the cache",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.result_cache.misses",
+            callbacks=[observe("misses")],
+            description="Invocations that had to run the plugin",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.result_cache.evictions",
+            callbacks=[observe("evictions")],
+            description="Results evicted to stay within the entry or memory limit",
+        )
@@ -0,0 +1,178 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from opentelemetry.metrics import CallbackOptions, Meter, Observation
+
+from unstructured_platform_plugins.etl_uvicorn.cancellation import (
+    cancellation_scope,
+    current_cancellation_token,
+)
+from unstructured_platform_plugins.schema.cancellation import CancellationToken
+
+
+@dataclass
+class SingleFlightStats:
+    in_flight: int
+    started: int
+    coalesced: int
+
+
+@dataclass
+class _Flight:
+    key: str
+    task: asyncio.Task
+    token: CancellationToken
+    waiters: int = 0
+    # The frames of a shared stream not yet read by every caller, `frames[0]` being frame `first`.
+    # While the stream is still joinable they are all kept, so a late caller gets all of them.
+    frames: list[bytes] = field(default_factory=list)
+    first: int = 0
+    buffered_bytes: int = 0
+    joinable: bool = True
+    # The index of the next frame each caller reading the stream will get
+    cursors: dict[object, int] = field(default_factory=dict)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def trim(self) -> None:
+        if self.joinable:
+            return
+        keep = min(self.cursors.values(), default=self.first + len(self.frames))
+        dropped = self.frames[: keep - self.first]
+        if dropped:
+            del self.frames[: len(dropped)]
+            self.first = keep
+            self.buffered_bytes -= sum(len(frame) for frame in dropped)
+
+
+class SingleFlight:
+    """Runs identical invocations that overlap in time once, sharing the outcome with each caller.
+
+    The first caller for a key starts the execution as a task of its own and later callers wait on
+    the same task. It runs under a cancellation token of its own carrying the deadline of the first
+    caller, and is only cancelled once every caller waiting on it has gone away. A shared stream
+    keeps its frames so that each caller reads them from the start at its own pace. Once they add
+    up to more than `max_shared_bytes` the stream stops taking new callers, who start one of their
+    own instead, and each frame is dropped as soon as every caller has read it.
+    """
+
+    def __init__(self, max_shared_bytes: int = 16 * 1024 * 1024):
+        self.max_shared_bytes = max_shared_bytes
+        self._flights: dict[str, _Flight] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    def _join(self, key: str, start: Callable[[_Flight], Awaitable[Any]]) -> tuple[_Flight, bool]:
+        flight = self._flights.get(key)
+        started = flight is None
+        if flight is not None:
+            self._coalesced += 1
+        else:
+            current = current_cancellation_token()
+            token = CancellationToken(deadline=current.deadline if current else None)
+
+            async def run() -> Any:
+                with cancellation_scope(token):
+                    return await start(flight)
+
+            flight = _Flight(key=key, task=asyncio.ensure_future(run()), token=token)
+            self._flights[key] = flight
+            self._started += 1
+
+            def finished(task: asyncio.Task) -> None:
+                self._forget(flight)
+                flight.notify()
+
+            flight.task.add_done_callback(finished)
+        flight.waiters += 1
+        return flight, started
+
+    def _forget(self, flight: _Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def _leave(self, flight: _Flight) -> None:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # No one is left to use the outcome, and a new caller must not join a cancelled one
+            self._forget(flight)
+            flight.token.cancel()
+            flight.task.cancel()
+
+    async def run(self, key: str, invoke: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """The outcome of `invoke`, and whether this caller is the one that started it."""
+        flight, started = self._join(key, lambda flight: invoke())
+        try:
+            return await asyncio.shield(flight.task), started
+        finally:
+            self._leave(flight)
+
+    async def stream(
+        self, key: str, invoke: Callable[[], Awaitable[AsyncIterator[bytes]]]
+    ) -> AsyncIterator[bytes]:
+        """The frames of the stream `invoke` returns, shared with every caller of the same key."""
+
+        async def produce(flight: _Flight) -> None:
+            async for frame in await invoke():
+                flight.frames.append(frame)
+                flight.buffered_bytes += len(frame)
+                if flight.joinable and flight.buffered_bytes > self.max_shared_bytes:
+                    # A caller joining now would need frames that are about to be dropped
+                    flight.joinable = False
+                    self._forget(flight)
+                    flight.trim()
+                flight.notify()
+
+        # Joined on the first read, so a stream that is never read doesn't hold on to the flight
+        flight, _ = self._join(key, produce)
+        reader = object()
+        flight.cursors[reader] = index = flight.first
+        try:
+            while True:
+                if index < flight.first + len(flight.frames):
+                    frame = flight.frames[index - flight.first]
+                    index += 1
+                    flight.cursors[reader] = index
+                    flight.trim()
+                    yield frame
+                elif flight.task.done():
+                    # Raises whatever ended the stream early
+                    flight.task.result()
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            del flight.cursors[reader]
+            flight.trim()
+            self._leave(flight)
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(
+            in_flight=len(self._flights), started=self._started, coalesced=self._coalesced
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_gauge(
+            "etl_plugin.single_flight.in_flight",
+            callbacks=[observe("in_flight")],
+            description="Distinct invocations currently running",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.single_flight.coalesced",
+            callbacks=[observe("coalesced")],
+            description="Invocations that waited on an identical one instead of running",
+        )
+
+    async def shutdown(self) -> None:
+        flights = list(self._flights.values())
+        for flight in flights:
+            flight.token.cancel()
+            flight.task.cancel()
+        await asyncio.gather(*(flight.task for flight in flights), return_exceptions=True)
@@ -0,0 +1,161 @@
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+from fastapi import status
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
+from starlette.datastructures import Headers
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.routing import Match
+from starlette.types import Receive, Scope, Send
+
+from unstructured_platform_plugins.schema.utils import get_stream_item_type, get_typed_parameters
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Longest line of a streamed body, the only part of it that is ever held in memory at once
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class StreamedInputError(ValueError):
+    status_code = status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+class StreamedLineTooLongError(StreamedInputError):
+    status_code = status.HTTP_413_CONTENT_TOO_LARGE
+
+
+def is_ndjson(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return content_type.split(";", 1)[0].strip().lower() == NDJSON_MEDIA_TYPE
+
+
+async def iterate(values: Iterable[Any]) -> AsyncIterator[Any]:
+    """Feeds the items of a list sent in a regular json body to a parameter expecting a stream."""
+    for value in values:
+        yield value
+
+
+async def read_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES
+) -> AsyncIterator[bytes]:
+    """Splits a body into its non-empty lines as the chunks of it arrive."""
+    pending = bytearray()
+    async for chunk in chunks:
+        pending += chunk
+        start = 0
+        while (end := pending.find(b"\n", start)) != -1:
+            if end - start > max_line_bytes:
+                raise StreamedLineTooLongError(f"line longer than {max_line_bytes} bytes")
+            line = bytes(pending[start:end]).strip()
+            start = end + 1
+            if line:
+                yield line
+        del pending[:start]
+        if len(pending) > max_line_bytes:
+            raise StreamedLineTooLongError(f"line longer than {max_line_bytes} bytes")
+    line = bytes(pending).strip()
+    if line:
+        yield line
+
+
+class StreamedInput:
+    """A plugin parameter annotated as an async iterator, fed from an NDJSON body as it arrives.
+
+    The first line of the body is a json object with the other inputs, every line after it is one
+    item of the stream. Items are validated one at a time as the plugin asks for them, so the
+    request is never held in memory as a whole and the plugin can start on the first items while
+    the client is still sending the rest.
+    """
+
+    def __init__(self, name: str, item_type: Any, max_line_bytes: int = MAX_LINE_BYTES):
+        self.name = name
+        self.item_type = item_type
+        self.max_line_bytes = max_line_bytes
+        self._adapter = TypeAdapter(item_type)
+
+    def head_model(self, inputs_model: type[BaseModel]) -> type[BaseModel]:
+        """The model of the first line, `inputs_model` without the streamed parameter."""
+        return create_model(
+            f"{inputs_model.__name__}_head",
+            __config__=inputs_model.model_config,
+            **{
+                name: (field.annotation, field)
+                for name, field in inputs_model.model_fields.items()
+                if name != self.name
+            },
+        )
+
+    async def open(self, chunks: AsyncIterator[bytes]) -> tuple[bytes, AsyncIterator[Any]]:
+        """The first line of the body, and the items following it as they arrive."""
+        lines = read_lines(chunks, self.max_line_bytes)
+        head = await anext(lines, b"")
+        return head, self._items(lines)
+
+    async def _items(self, lines: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+        index = 0
+        try:
+            async for line in lines:
+                try:
+                    item = self._adapter.validate_json(line)
+                except ValidationError as e:
+                    raise StreamedInputError(f"invalid item {index} of {self.name}: {e}") from e
+                index += 1
+                yield item
+        finally:
+            await lines.aclose()
+
+
+def get_streamed_input(func: Callable, omit: Optional[list[str]] = None) -> Optional[StreamedInput]:
+    omit = omit or []
+    streamed = [
+        (p.name, item_type)
+        for p in get_typed_parameters(func)
+        if p.name not in omit and (item_type := get_stream_item_type(p.param_type)) is not None
+    ]
+    if not streamed:
+        return None
+    if len(streamed) > 1:
+        raise ValueError(
+            "only one parameter can be streamed, found: {}".format(
+                ", ".join(name for name, _ in streamed)
+            )
+        )
+    name, item_type = streamed[0]
+    return StreamedInput(name, item_type)
+
+
+class NdjsonRoute(APIRoute):
+    """A route only matching requests with an NDJSON body, others fall through to the next one."""
+
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        match, child_scope = super().matches(scope)
+        if match is not Match.NONE and not is_ndjson(Headers(scope=scope)):
+            return Match.NONE, {}
+        return match, child_scope
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Streams a response while the request body is still being read.
+
+    `StreamingResponse` watches the connection for a disconnect while streaming, which would take
+    the messages carrying the rest of the body away from the plugin reading it. A disconnect still
+    surfaces, either to the plugin reading the body or when sending the next frame fails.
+    """
+
+    @classmethod
+    def from_response(cls, response: StreamingResponse) -> "DuplexStreamingResponse":
+        return cls(
+            response.body_iterator,
+            status_code=response.status_code,
+            headers=response.headers,
+            media_type=response.media_type,
+            background=response.background,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,334 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Literal, Optional
+
+from opentelemetry.metrics import CallbackOptions, Histogram, Meter, Observation
+
+from unstructured_platform_plugins.schema import FileDataMeta, MessageChannels, UsageData
+
+# full: every frame is a complete response, repeating all metadata accumulated so far
+# delta: frames carry the new output and only the metadata added since the previous frame, a
+#   final summary frame without output carries the complete metadata and status
+StreamProtocol = Literal["full", "delta"]
+
+
+class MetadataDelta:
+    """Tracks how much of a stream's accumulated metadata has already been sent.
+
+    Plugins only ever append to `usage`, `message_channels` and `filedata_meta.new_records`, so
+    remembering the lengths sent so far is enough to slice off what is new.
+    """
+
+    def __init__(self):
+        self._usage = 0
+        self._infos = 0
+        self._warnings = 0
+        self._new_records = 0
+
+    def take(
+        self,
+        usage: list[UsageData],
+        message_channels: MessageChannels,
+        filedata_meta: FileDataMeta,
+    ) -> tuple[list[UsageData], MessageChannels, FileDataMeta]:
+        new_usage = usage[self._usage :]
+        new_message_channels = MessageChannels.model_construct(
+            infos=message_channels.infos[self._infos :],
+            warnings=message_channels.warnings[self._warnings :],
+        )
+        new_filedata_meta = FileDataMeta.model_construct(
+            terminate_current=filedata_meta.terminate_current,
+            new_records=filedata_meta.new_records[self._new_records :],
+        )
+        self._usage = len(usage)
+        self._infos = len(message_channels.infos)
+        self._warnings = len(message_channels.warnings)
+        self._new_records = len(filedata_meta.new_records)
+        return new_usage, new_message_channels, new_filedata_meta
+
+
+def extend_metadata(
+    usage: list[UsageData],
+    message_channels: MessageChannels,
+    filedata_meta: FileDataMeta,
+    delta: tuple[list[UsageData], MessageChannels, FileDataMeta],
+) -> None:
+    """Appends metadata taken with `MetadataDelta.take` to a request's own accumulators."""
+    new_usage, new_message_channels, new_filedata_meta = delta
+    usage.extend(new_usage)
+    message_channels.infos.extend(new_message_channels.infos)
+    message_channels.warnings.extend(new_message_channels.warnings)
+    filedata_meta.new_records.extend(new_filedata_meta.new_records)
+    filedata_meta.terminate_current = new_filedata_meta.terminate_current
+
+
+@dataclass
+class CoalesceConfig:
+    # Buffered frames are written as one chunk once they reach this many bytes or items
+    max_bytes: int = 64 * 1024
+    max_items: int = 256
+    # Longest a frame waits in the buffer, which bounds the time to first byte
+    flush_interval_ms: float = 50.0
+
+
+async def coalesce(frames: AsyncIterator[bytes], config: CoalesceConfig) -> AsyncIterator[bytes]:
+    """Joins frames into fewer, larger chunks of the response body.
+
+    One task reads the frames into the buffer for the whole stream, so the buffer can be flushed
+    when the interval passes while the plugin is still working on the next frame, without
+    interrupting it. The response is only woken once per chunk: when the buffer is full, when its
+    first frame has waited for the interval or when the stream ends. A full buffer holds the
+    reader back until the response takes it.
+    """
+    loop = asyncio.get_running_loop()
+    buffer: list[bytes] = []
+    size = 0
+    # Set once the first frame of the buffer has waited for the flush interval
+    due = False
+    timer: Optional[asyncio.TimerHandle] = None
+    end: Optional[_StreamEnd] = None
+    # What the response waits on for its next chunk, and the reader on while the buffer is full
+    wake: Optional[asyncio.Future] = None
+    taken: Optional[asyncio.Future] = None
+
+    def is_full() -> bool:
+        return size >= config.max_bytes or len(buffer) >= config.max_items
+
+    def wake_up() -> None:
+        if wake is not None and not wake.done():
+            wake.set_result(None)
+
+    def on_interval() -> None:
+        nonlocal due
+        due = True
+        wake_up()
+
+    async def read() -> None:
+        nonlocal size, timer, end, taken
+        stream_end = _StreamEnd()
+        try:
+            async for frame in frames:
+                if not buffer:
+                    timer = loop.call_later(config.flush_interval_ms / 1000, on_interval)
+                buffer.append(frame)
+                size += len(frame)
+                if is_full():
+                    taken = loop.create_future()
+                    wake_up()
+                    await taken
+        except Exception as e:
+            stream_end.error = e
+        end = stream_end
+        wake_up()
+
+    reader = asyncio.ensure_future(read())
+    try:
+        while True:
+            if end is None and not (buffer and (due or is_full())):
+                wake = loop.create_future()
+                await wake
+                wake = None
+            if buffer:
+                chunk = b"".join(buffer)
+                buffer, size, due = [], 0, False
+                if timer is not None:
+                    timer.cancel()
+                if taken is not None and not taken.done():
+                    taken.set_result(None)
+                yield chunk
+            elif end is not None:
+                if end.error is not None:
+                    raise end.error
+                break
+    finally:
+        if timer is not None:
+            timer.cancel()
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        if hasattr(frames, "aclose"):
+            await frames.aclose()
+
+
+async def capture_body(
+    chunks: AsyncIterator[bytes], on_complete: Callable[[bytes], Awaitable[None]]
+) -> AsyncIterator[bytes]:
+    """Passes `chunks` through, then hands the whole body to `on_complete` once all were sent.
+
+    Nothing is handed over for a body that wasn't sent in full.
+    """
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    await on_complete(b"".join(parts))
+
+
+@dataclass
+class _StreamEnd:
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class PrefetchStats:
+    size: int
+    items: int
+    # Puts that found the queue full, the client is slower than the plugin
+    producer_blocked: int
+    # Gets that found the queue empty, the plugin is slower than the client
+    consumer_starved: int
+
+
+class StreamPrefetcher:
+    """Runs a stream as its own producer task, feeding a bounded queue the response reads from.
+
+    Without it the plugin only advances when the server pulls the next chunk, so its work and the
+    writes to the client happen one after the other. Frames are produced ahead up to `size`, then
+    a full queue holds the producer back.
+    """
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f"prefetch size must be at least 1, got {size}")
+        self.size = size
+        self._items = 0
+        self._producer_blocked = 0
+        self._consumer_starved = 0
+        self._occupancy: Optional[Histogram] = None
+
+    async def prefetch(self, items: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.size)
+
+        async def produce() -> None:
+            end = _StreamEnd()
+            try:
+                async for item in items:
+                    if queue.full():
+                        self._producer_blocked += 1
+                    await queue.put(item)
+            except Exception as e:
+                end.error = e
+            await queue.put(end)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                if queue.empty():
+                    self._consumer_starved += 1
+                elif self._occupancy is not None:
+                    self._occupancy.record(queue.qsize())
+                item = await queue.get()
+                if isinstance(item, _StreamEnd):
+                    if item.error is not None:
+                        raise item.error
+                    break
+                self._items += 1
+                yield item
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            if hasattr(items, "aclose"):
+                await items.aclose()
+
+    def stats(self) -> PrefetchStats:
+        return PrefetchStats(
+            size=self.size,
+            items=self._items,
+            producer_blocked=self._producer_blocked,
+            consumer_starved=self._consumer_starved,
+        )
+
+    def register_metrics(self, meter: Meter) -> None:
+        def observe(attribute: str) -> Callable[[CallbackOptions], list[Observation]]:
+            return lambda options: [Observation(getattr(self.stats(), attribute))]
+
+        meter.create_observable_counter(
+            "etl_plugin.stream.producer_blocked",
+            callbacks=[observe("producer_blocked")],
+            description="Streamed frames the plugin produced while the prefetch queue was full",
+        )
+        meter.create_observable_counter(
+            "etl_plugin.stream.consumer_starved",
+            callbacks=[observe("consumer_starved")],
+            description="Times the response waited on an empty prefetch queue",
+        )
+        self._occupancy = meter.create_histogram(
+            "etl_plugin.stream.prefetch_occupancy",
+            description="Frames waiting in the prefetch queue when the response took one",
+        )
+
+
+class _ThreadChannel:
+    """Hands items from a thread to the event loop, blocking the thread while `size` are waiting."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, size: int):
+        self._loop = loop
+        self._slots = threading.Semaphore(size)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def put(self, item: Any) -> bool:
+        self._slots.acquire()
+        if self.closed:
+            return False
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        return True
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if not self.closed:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, _StreamEnd(error))
+
+    async def get(self) -> Any:
+        item = await self._queue.get()
+        self._slots.release()
+        return item
+
+    def close(self) -> None:
+        self.closed = True
+        # Wakes a producer blocked on a full channel so it sees the channel is gone
+        self._slots.release()
+
+
+async def iterate_in_thread(
+    gen_func: Callable[[], Iterator[Any]],
+    run: Callable[[Callable[[], None]], Awaitable[None]],
+    buffer_size: int = 16,
+) -> AsyncIterator[Any]:
+    """Iterates a sync generator on a thread started by `run`, yielding its items on the loop.
+
+    At most `buffer_size` items wait to be consumed, the generator is paused past that so a slow
+    client doesn't make the whole output pile up in memory. Closing the iterator closes the
+    generator once it yields its next item.
+    """
+    channel = _ThreadChannel(asyncio.get_running_loop(), size=buffer_size)
+
+    def produce() -> None:
+        generator = gen_func()
+        error = None
+        try:
+            for item in generator:
+                if not channel.put(item):
+                    break
+        except Exception as e:
+            error = e
+        # The end is only signalled once the generator is done touching anything it shares
+        generator.close()
+        channel.finish(error)
+
+    def on_done(future: asyncio.Future) -> None:
+        # The thread never started, e.g. the executor queue was full
+        if not future.cancelled() and future.exception() is not None:
+            channel.finish(future.exception())
+
+    producer = asyncio.ensure_future(run(produce))
+    producer.add_done_callback(on_done)
+    try:
+        while True:
+            item = await channel.get()
+            if isinstance(item, _StreamEnd):
+                if item.error is not None:
+                    raise item.error
+                break
+            yield item
+    finally:
+        channel.close()
@@ -1,13 +1,10 @@
 import inspect
-from dataclasses import is_dataclass
-from enum import EnumMeta
 from inspect import Parameter
-from types import GenericAlias, NoneType
-from typing import Any, Callable, Optional
-
-from dataclasses_json import DataClassJsonMixin
-from pydantic import BaseModel
+from types import MethodType, NoneType
+from typing import Any, Callable, Optional, get_args
 
+from unstructured_platform_plugins.etl_uvicorn.converters import compile_input_converters
+from unstructured_platform_plugins.etl_uvicorn.instance_pool import InstancePool, get_pool_size
 from unstructured_platform_plugins.schema.json_schema import (
     parameters_to_json_schema,
     response_to_json_schema,
@@ -20,11 +17,17 @@ def is_optional(t: Any) -> bool:
     return hasattr(t, "__origin__") and t.__origin__ is not None
 
 
-def get_func(instance: Any, method_name: Optional[str] = None) -> Callable:
+def get_func(
+    instance: Any, method_name: Optional[str] = None, pool_size: Optional[int] = None
+) -> Callable:
     method_name = method_name or "__call__"
     if inspect.isfunction(instance):
         return instance
     elif inspect.isclass(instance):
+        # Classes that are not thread safe get one instance per concurrent invocation
+        size = get_pool_size(instance, pool_size=pool_size)
+        if size is not None:
+            return InstancePool(factory=instance, size=size).method(method_name)
         i = instance()
         return getattr(i, method_name)
     elif isinstance(instance, object) and hasattr(instance, method_name):
@@ -34,6 +37,27 @@ def get_func(instance: Any, method_name: Optional[str] = None) -> Callable:
     raise ValueError(f"type of instance not recognized: {type(instance)}")
 
 
+def get_func_reference(instance: Any, method_name: Optional[str] = None) -> Callable:
+    """The plugin function for its signature only, a class is not instantiated for it.
+
+    For plugins that run elsewhere, such as in worker processes. The method of a class is bound to
+    the class itself, so it can't be called but reads like the method of an instance.
+    """
+    if inspect.isclass(instance):
+        return MethodType(getattr(instance, method_name or "__call__"), instance)
+    return get_func(instance, method_name)
+
+
+def get_sibling_func(func: Callable, method_name: str) -> Callable:
+    """Another method of the instance (or instance pool) `func` was resolved from."""
+    instance_pool = getattr(func, "instance_pool", None)
+    if instance_pool is not None:
+        return instance_pool.method(method_name)
+    if inspect.ismethod(func):
+        return getattr(func.__self__, method_name)
+    raise ValueError(f"{func} is not a method, no instance to look up {method_name} on")
+
+
 def get_plugin_id(instance: Any, method_name: Optional[str] = None) -> str:
     method_name = method_name or "__call__"
     ref_id = None
@@ -73,6 +97,12 @@ def get_output_sig(func: Callable) -> Optional[Any]:
     inspect.signature(func)
     type_hints = get_type_hints(func)
     return_typing = type_hints.get("return")
+    if return_typing is not None and (
+        inspect.isasyncgenfunction(func) or inspect.isgeneratorfunction(func)
+    ):
+        # Each item a generator yields is the output of one frame of the stream
+        args = get_args(return_typing)
+        return_typing = args[0] if args else None
     outputs = return_typing if return_typing is not NoneType else None
     return outputs
 
@@ -81,7 +111,7 @@ def get_output_schema(func: Callable) -> dict:
     return response_to_json_schema(get_output_sig(func))
 
 
-def get_schema_dict(func, omit: list[str] = ["usage"]) -> dict:
+def get_schema_dict(func, omit: list[str] = ["usage", "cancellation_token"]) -> dict:
     return {
         "inputs": get_input_schema(func, omit=omit),
         "outputs": get_output_schema(func),
@@ -90,42 +120,7 @@ def get_schema_dict(func, omit: list[str] = ["usage"]) -> dict:
 
 def map_inputs(func: Callable, raw_inputs: dict[str, Any]) -> dict[str, Any]:
     # deserializes the raw dictionary coming in from the api into the underlying data
-    # types expected by the function when being invoked
-    raw_inputs = raw_inputs.copy()
-    type_info = get_type_hints(func)
-    type_info.pop("return", None)
-    for field_name, type_data in type_info.items():
-        if field_name not in raw_inputs:
-            continue
-        field_value = raw_inputs[field_name]
-        try:
-            if (
-                hasattr(type_data, "__origin__")
-                and type_data.__origin__ is dict
-                and isinstance(raw_inputs[field_name], dict)
-            ):
-                # Expects a dict and value is already a dict
-                continue
-            elif (
-                inspect.isclass(type_data)
-                and issubclass(type_data, DataClassJsonMixin)
-                and isinstance(field_value, dict)
-            ):
-                raw_inputs[field_name] = type_data.from_dict(raw_inputs[field_name])
-
-            elif is_dataclass(type_data) and isinstance(field_value, dict):
-                raw_inputs[field_name] = type_data(**raw_inputs[field_name])
-            elif isinstance(type_data, EnumMeta):
-                raw_inputs[field_name] = raw_inputs[field_name]
-            elif (
-                inspect.isclass(type_data)
-                and not isinstance(type_data, GenericAlias)
-                and issubclass(type_data, BaseModel)
-            ):
-                field_value = raw_inputs[field_name]
-                if isinstance(field_value, BaseModel):
-                    field_value = field_value.model_dump()
-                raw_inputs[field_name] = type_data.model_validate(field_value)
-        except Exception as e:
-            raise ValueError(f"failed to map input for field {field_name}: {field_value}") from e
-    return raw_inputs
+    # types expected by the function when being invoked. This resolves the type hints on every
+    # call, callers invoking the same function repeatedly should hold on to the result of
+    # `compile_input_converters` instead.
+    return compile_input_converters(func).convert(raw_inputs.copy())
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError, create_model
+
+from unstructured_platform_plugins.etl_uvicorn.cancellation import cancellation_scope
+from unstructured_platform_plugins.etl_uvicorn.concurrency import (
+    AdmissionController,
+    AdmissionRejectedError,
+)
+from unstructured_platform_plugins.schema.cancellation import CancellationToken
+
+logger = logging.getLogger("uvicorn.error")
+
+CorrelationId = Union[str, int]
+# Status of a message that fails validation, the one FastAPI answers an invalid body with
+INVALID_MESSAGE_STATUS = 422
+
+
+def invocation_message_model(body_model: Any) -> type[BaseModel]:
+    """The model of a message sent to `/invoke/ws`, wrapping an `/invoke` body.
+
+    `{"id": ..., "body": {...}}` starts an invocation and `{"id": ..., "cancel": true}` cancels the
+    one running under that id.
+    """
+    return create_model(
+        "InvocationMessage",
+        id=(CorrelationId, ...),
+        body=(Optional[body_model], None),
+        cancel=(bool, False),
+    )
+
+
+class WebSocketSession:
+    """Runs the invocations sent over one WebSocket connection, up to `concurrency` at a time.
+
+    Every reply carries the id of the invocation it belongs to, as
+    `{"id": ..., "done": <bool>, "response": <InvokeResponse>}`, and is sent as soon as it is
+    ready, so replies of different invocations interleave. A plain invocation gets a single reply.
+    A streaming one gets a reply per frame and a final `{"id": ..., "done": true}`. Reading the
+    next message waits while `concurrency` invocations are running, which holds back a client
+    that sends faster than the plugin keeps up.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        message_model: type[BaseModel],
+        invoke: Callable[[Any], Awaitable[Union[BaseModel, AsyncIterator[bytes]]]],
+        encode: Callable[[BaseModel], bytes],
+        error_response: Callable[[Exception, int], BaseModel],
+        concurrency: int = 16,
+        admission_controller: Optional[AdmissionController] = None,
+    ):
+        self.websocket = websocket
+        self.message_model = message_model
+        self.invoke = invoke
+        self.encode = encode
+        self.error_response = error_response
+        self.admission_controller = admission_controller
+        self._slots = asyncio.Semaphore(concurrency)
+        self._send_lock = asyncio.Lock()
+        self._running: dict[CorrelationId, tuple[asyncio.Task, CancellationToken]] = {}
+
+    async def _send(self, message_id: Optional[CorrelationId], done: bool, response: bytes) -> None:
+        message = b'{"id":%s,"done":%s' % (
+            json.dumps(message_id).encode(),
+            b"true" if done else b"false",
+        )
+        message += b',"response":%s}' % response if response else b"}"
+        async with self._send_lock:
+            await self.websocket.send_text(message.decode())
+
+    async def _send_error(
+        self, message_id: Optional[CorrelationId], error: Exception, status_code: int
+    ) -> None:
+        await self._send(message_id, True, self.encode(self.error_response(error, status_code)))
+
+    async def run(self) -> None:
+        await self.websocket.accept()
+        try:
+            while True:
+                received = await self.websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    break
+                data = received.get("text") or received.get("bytes") or b""
+                try:
+                    message = self.message_model.model_validate_json(data)
+                except ValidationError as e:
+                    await self._send_error(_guess_id(data), e, INVALID_MESSAGE_STATUS)
+                    continue
+                if message.cancel:
+                    self.cancel(message.id)
+                    continue
+                if message.id in self._running:
+                    error = ValueError(f"invocation {message.id!r} is already running")
+                    await self._send_error(message.id, error, status.HTTP_409_CONFLICT)
+                    continue
+                await self._slots.acquire()
+                token = CancellationToken()
+                task = asyncio.ensure_future(self._run_invocation(message, token))
+                # A task cancelled before it starts never runs its own cleanup
+                task.add_done_callback(partial(self._finished, message.id))
+                self._running[message.id] = (task, token)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # No one is left to read the results
+            for message_id in list(self._running):
+                self.cancel(message_id)
+            await asyncio.gather(
+                *(task for task, _ in self._running.values()), return_exceptions=True
+            )
+
+    def _finished(self, message_id: CorrelationId, task: asyncio.Task) -> None:
+        self._running.pop(message_id, None)
+        self._slots.release()
+
+    def cancel(self, message_id: CorrelationId) -> None:
+        running = self._running.get(message_id)
+        if running is not None:
+            task, token = running
+            token.cancel()
+            task.cancel()
+
+    async def _run_invocation(self, message: BaseModel, token: CancellationToken) -> None:
+        try:
+            with cancellation_scope(token):
+                if self.admission_controller is not None:
+                    try:
+                        await self.admission_controller.acquire()
+                    except AdmissionRejectedError as e:
+                        await self._send_error(message.id, e, e.status_code)
+                        return
+                try:
+                    await self._respond(message)
+                finally:
+                    if self.admission_controller is not None:
+                        self.admission_controller.release()
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            pass
+        except (ValidationError, RequestValidationError) as e:
+            await self._send_error(message.id, e, INVALID_MESSAGE_STATUS)
+        except Exception as e:
+            # The invocation itself reports its failures, this is the body failing to convert
+            logger.error(f"failed to run invocation {message.id!r}: {e}", exc_info=True)
+            await self._send_error(
+                message.id,
+                e,
+                getattr(e, "status_code", None) or status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    async def _respond(self, message: BaseModel) -> None:
+        result = await self.invoke(message.body)
+        if isinstance(result, BaseModel):
+            await self._send(message.id, True, self.encode(result))
+            return
+        async for frame in result:
+            await self._send(message.id, False, frame.rstrip(b"\n"))
+        await self._send(message.id, True, b"")
+
+
+def _guess_id(data: Union[str, bytes]) -> Optional[CorrelationId]:
+    # The id of a message that failed validation, if it can be found, to correlate the error
+    try:
+        message_id = json.loads(data).get("id")
+    except (ValueError, AttributeError):
+        return None
+    return message_id if isinstance(message_id, (str, int)) else None
@@ -1,4 +1,6 @@
+from .cancellation import CancellationToken
 from .filedata_meta import FileDataMeta, NewRecord
+from .message_channels import MessageChannels
 from .usage import UsageData
 
-__all__ = ["UsageData", "FileDataMeta", "NewRecord"]
+__all__ = ["UsageData", "FileDataMeta", "NewRecord", "MessageChannels", "CancellationToken"]
@@ -0,0 +1,67 @@
+import threading
+import time
+from typing import Optional
+
+from fastapi import status
+
+# Status nginx made common for a request the client closed before the response was ready
+CLIENT_CLOSED_REQUEST = 499
+
+
+class InvocationCancelledError(Exception):
+    status_code = CLIENT_CLOSED_REQUEST
+
+
+class DeadlineExceededError(InvocationCancelledError):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+
+
+class CancellationToken:
+    """Signals plugin code that nobody is waiting for its result anymore.
+
+    The token is cancelled when the client disconnects, and counts as cancelled once the request
+    deadline (a unix timestamp) has passed. Coroutines and async generators are cancelled outright
+    on a disconnect, but a sync plugin running on an executor thread can't be interrupted, so it
+    is expected to check the token between units of work and stop early.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def __reduce__(self):
+        # Worker processes get a copy that only knows the deadline
+        return self.__class__, (self.deadline,)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, None if the request has none."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or self.expired
+
+    def cancel(self, reason: str = "client disconnected") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the token is cancelled or `timeout` passes, returns whether it was."""
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return self._event.wait(max(timeout, 0) if timeout is not None else None) or self.expired
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise InvocationCancelledError(f"invocation cancelled: {self.reason}")
+        if self.expired:
+            raise DeadlineExceededError(f"request deadline {self.deadline} has passed")
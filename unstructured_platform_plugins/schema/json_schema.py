@@ -10,7 +10,7 @@ from pydantic import BaseModel, create_model
 from pydantic.fields import FieldInfo, PydanticUndefined
 from unstructured_ingest.data_types.file_data import BatchFileData, FileData
 
-from unstructured_platform_plugins.schema.utils import TypedParameter
+from unstructured_platform_plugins.schema.utils import TypedParameter, get_stream_item_type
 from unstructured_platform_plugins.type_hints import get_type_hints
 
 # https://json-schema.org/understanding-json-schema/reference/type
@@ -85,9 +85,17 @@ def generic_alias_to_json_schema(t: GenericAlias) -> dict:
             return to_json_schema(types[0])
         else:
             return {"anyOf": [to_json_schema(t) for t in types]}
+    stream_item_type = get_stream_item_type(t)
+    if stream_item_type is not None:
+        return stream_to_json_schema(item_type=stream_item_type)
     return type_to_json_schema(t=origin, args=t.__args__)
 
 
+def stream_to_json_schema(item_type: Any) -> dict:
+    # Sent as a regular json array, or as ndjson lines following the other inputs
+    return {"type": "array", "items": to_json_schema(item_type), "is_stream": True}
+
+
 def union_type_to_json_schema(t: UnionType) -> dict:
     types = t.__args__
     if len(types) == 1:
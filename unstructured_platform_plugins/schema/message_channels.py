@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+
+class MessageChannels(BaseModel):
+    infos: list[str] = Field(default_factory=list)
+    warnings: list[str] = Field(default_factory=list)
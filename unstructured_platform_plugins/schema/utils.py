@@ -1,9 +1,25 @@
+import collections.abc
 import inspect
 from inspect import Parameter, _empty
-from typing import Callable
+from typing import Any, Callable, Optional, get_args, get_origin
 
 from unstructured_platform_plugins.type_hints import get_type_hints
 
+# Parameters annotated with one of these are fed one item at a time rather than as a whole list
+STREAM_ORIGINS = (
+    collections.abc.AsyncIterator,
+    collections.abc.AsyncIterable,
+    collections.abc.AsyncGenerator,
+)
+
+
+def get_stream_item_type(t: Any) -> Optional[Any]:
+    """The item type of an async iterator annotation, `None` for any other annotation."""
+    if get_origin(t) not in STREAM_ORIGINS:
+        return None
+    args = get_args(t)
+    return args[0] if args else Any
+
 
 class TypedParameter(Parameter):
     def __init__(self, *args, param_type=_empty, **kwargs):